@@ -6,6 +6,9 @@ The CephCollector collects utilization info from the Ceph storage system.
 Documentation for ceph perf counters:
 http://ceph.com/docs/master/dev/perf_counters/
 
+The counters are read straight from the admin socket of every daemon, all the
+daemons being queried concurrently.
+
 #### Dependencies
 
  * ceph [http://ceph.com/]
@@ -19,7 +22,8 @@ except ImportError:
 
 import glob
 import os
-import subprocess
+import socket
+import struct
 
 import diamond.collector
 
@@ -37,13 +41,18 @@ def flatten_dictionary(input, sep='.', prefix=None):
 
       [('a.b', 10), ('c', 20)]
     """
-    for name, value in sorted(input.items()):
-        fullname = sep.join(filter(None, [prefix, name]))
-        if isinstance(value, dict):
-            for result in flatten_dictionary(value, sep, fullname):
-                yield result
-        else:
+    # Walk the nested dictionaries depth first without recursing
+    stack = [(prefix, iter(sorted(input.items())))]
+    while stack:
+        prefix, items = stack[-1]
+        for name, value in items:
+            fullname = sep.join(filter(None, [prefix, name]))
+            if isinstance(value, dict):
+                stack.append((fullname, iter(sorted(value.items()))))
+                break
             yield (fullname, value)
+        else:
+            stack.pop()
 
 
 class CephCollector(diamond.collector.Collector):
@@ -57,8 +66,8 @@ class CephCollector(diamond.collector.Collector):
                              ' Defaults to "ceph-"',
             'socket_ext': 'Extension for socket filenames.'
                           ' Defaults to "asok"',
-            'ceph_binary': 'Path to "ceph" executable. '
-                           'Defaults to /usr/bin/ceph.',
+            'timeout': 'Seconds to wait for a daemon to answer.'
+                       ' Defaults to 10',
         })
         return config_help
 
@@ -71,7 +80,7 @@ class CephCollector(diamond.collector.Collector):
             'socket_path': '/var/run/ceph',
             'socket_prefix': 'ceph-',
             'socket_ext': 'asok',
-            'ceph_binary': '/usr/bin/ceph',
+            'timeout': 10,
         })
         return config
 
@@ -93,6 +102,36 @@ class CephCollector(diamond.collector.Collector):
             base = base[len(self.config['socket_prefix']):]
         return 'ceph.' + base
 
+    def _admin_socket_command(self, name, command):
+        """Send a command to the admin socket of a daemon and return
+        its raw response. The command is sent as a NUL terminated
+        JSON document, the response is prefixed by its length as a
+        32 bit big endian integer.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(float(self.config['timeout']))
+            sock.connect(name)
+            sock.sendall(json.dumps(command) + '\0')
+
+            header = self._recv(sock, 4)
+            length = struct.unpack('>I', header)[0]
+            return self._recv(sock, length)
+        finally:
+            sock.close()
+
+    def _recv(self, sock, size):
+        """Read exactly size bytes from a socket
+        """
+        chunks = []
+        while size > 0:
+            chunk = sock.recv(min(size, 65536))
+            if not chunk:
+                raise socket.error('Connection closed by the daemon')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return ''.join(chunks)
+
     def _get_stats_from_socket(self, name):
         """Return the parsed JSON data returned when ceph is told to
         dump the stats from the named socket.
@@ -101,14 +140,9 @@ class CephCollector(diamond.collector.Collector):
         an empty result set is returned.
         """
         try:
-            json_blob = subprocess.check_output(
-                [self.config['ceph_binary'],
-                 '--admin-daemon',
-                 name,
-                 'perf',
-                 'dump',
-                 ])
-        except subprocess.CalledProcessError, err:
+            json_blob = self._admin_socket_command(name,
+                                                   {'prefix': 'perf dump'})
+        except (socket.error, struct.error), err:
             self.log.info('Could not get stats from %s: %s',
                           name, err)
             self.log.exception('Could not get stats from %s' % name)
@@ -138,9 +172,14 @@ class CephCollector(diamond.collector.Collector):
         """
         Collect stats
         """
-        for path in self._get_socket_paths():
-            self.log.debug('checking %s', path)
-            counter_prefix = self._get_counter_prefix_from_socket_name(path)
-            stats = self._get_stats_from_socket(path)
-            self._publish_stats(counter_prefix, stats)
-        return
+        self.run_concurrently(self._collect_socket,
+                              [(path,) for path in self._get_socket_paths()])
+
+    def _collect_socket(self, path):
+        """
+        Collect the stats of a single daemon
+        """
+        self.log.debug('checking %s', path)
+        counter_prefix = self._get_counter_prefix_from_socket_name(path)
+        stats = self._get_stats_from_socket(path)
+        self._publish_stats(counter_prefix, stats)
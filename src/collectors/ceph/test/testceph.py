@@ -6,7 +6,12 @@ try:
 except ImportError:
     import simplejson as json
 
-import subprocess
+import os
+import shutil
+import socket
+import struct
+import tempfile
+import threading
 
 from test import CollectorTestCase
 from test import get_collector_config
@@ -23,11 +28,6 @@ def run_only_if_assertSequenceEqual_is_available(func):
     return run_only(func, pred)
 
 
-def run_only_if_subprocess_check_output_is_available(func):
-    pred = lambda: 'check_output' in dir(subprocess)
-    return run_only(func, pred)
-
-
 class TestCounterIterator(unittest.TestCase):
 
     @run_only_if_assertSequenceEqual_is_available
@@ -131,60 +131,74 @@ class TestCephCollectorGettingStats(CollectorTestCase):
             'interval': 10,
         })
         self.collector = ceph.CephCollector(config, None)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.socket_name = os.path.join(self.tmpdir, 'ceph-osd.0.asok')
 
     def test_import(self):
         self.assertTrue(ceph.CephCollector)
 
-    @run_only_if_subprocess_check_output_is_available
-    @patch('subprocess.check_output')
-    def test_load_works(self, check_output):
+    def _serve(self, response):
+        """Answer a single admin socket command with response
+        """
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_name)
+        server.listen(1)
+        server.settimeout(5)
+        self.requests = []
+
+        def serve():
+            try:
+                client, _ = server.accept()
+                client.settimeout(5)
+                request = ''
+                while not request.endswith('\0'):
+                    chunk = client.recv(4096)
+                    if not chunk:
+                        break
+                    request += chunk
+                self.requests.append(request)
+                client.sendall(struct.pack('>I', len(response)) + response)
+                client.close()
+            finally:
+                server.close()
+
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def test_load_works(self):
         expected = {'a': 1,
-                    'b': 2,
+                    'b': {'c': 2},
                     }
-        check_output.return_value = json.dumps(expected)
-        actual = self.collector._get_stats_from_socket('a_socket_name')
-        check_output.assert_called_with(['/usr/bin/ceph',
-                                         '--admin-daemon',
-                                         'a_socket_name',
-                                         'perf',
-                                         'dump',
-                                         ])
+        thread = self._serve(json.dumps(expected))
+        actual = self.collector._get_stats_from_socket(self.socket_name)
+        thread.join(5)
+        self.assertEqual(self.requests,
+                         [json.dumps({'prefix': 'perf dump'}) + '\0'])
         self.assertEqual(actual, expected)
 
-    @run_only_if_subprocess_check_output_is_available
-    @patch('subprocess.check_output')
-    def test_ceph_command_fails(self, check_output):
-        check_output.side_effect = subprocess.CalledProcessError(
-            255, ['/usr/bin/ceph'], 'error!',
-        )
-        actual = self.collector._get_stats_from_socket('a_socket_name')
-        check_output.assert_called_with(['/usr/bin/ceph',
-                                         '--admin-daemon',
-                                         'a_socket_name',
-                                         'perf',
-                                         'dump',
-                                         ])
+    def test_daemon_not_running(self):
+        actual = self.collector._get_stats_from_socket(self.socket_name)
         self.assertEqual(actual, {})
 
-    @run_only_if_subprocess_check_output_is_available
-    @patch('json.loads')
-    @patch('subprocess.check_output')
-    def test_json_decode_fails(self, check_output, loads):
-        input = {'a': 1,
-                 'b': 2,
-                 }
-        check_output.return_value = json.dumps(input)
-        loads.side_effect = ValueError('bad data')
-        actual = self.collector._get_stats_from_socket('a_socket_name')
-        check_output.assert_called_with(['/usr/bin/ceph',
-                                         '--admin-daemon',
-                                         'a_socket_name',
-                                         'perf',
-                                         'dump',
-                                         ])
-        loads.assert_called_with(json.dumps(input))
+    def test_json_decode_fails(self):
+        thread = self._serve('{"a": ')
+        actual = self.collector._get_stats_from_socket(self.socket_name)
+        thread.join(5)
         self.assertEqual(actual, {})
 
+    @patch.object(Collector, 'publish')
+    def test_collect(self, publish_mock):
+        self.collector.config['socket_path'] = self.tmpdir
+        thread = self._serve(json.dumps({'a': 1}))
+        self.collector.collect()
+        thread.join(5)
+        publish_mock.assert_called_with('ceph.osd.0.a', 1,
+                                        metric_type='GAUGE', instance=None,
+                                        precision=0)
+
 
 class TestCephCollectorPublish(CollectorTestCase):
 
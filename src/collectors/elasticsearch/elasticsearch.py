@@ -377,6 +377,8 @@ class ElasticSearchCollector(diamond.collector.Collector):
             self.log.error('Unable to import json')
             return {}
 
+        args_list = []
         for alias in sorted(self.instances):
             (host, port) = self.instances[alias]
-            self.collect_instance(alias, host, port)
+            args_list.append((alias, host, port))
+        self.run_concurrently(self.collect_instance, args_list)
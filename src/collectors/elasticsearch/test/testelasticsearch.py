@@ -229,21 +229,26 @@ class TestElasticSearchCollector(CollectorTestCase):
         self.collector = ElasticSearchCollector(config, None)
         self.assertEqual(len(self.collector.instances), 2)
 
-        returns = [
-            self.getFixture('stats'),
-            self.getFixture('indices_stats'),
-            self.getFixture('stats2'),
-            self.getFixture('indices_stats2'),
-        ]
+        # The instances are collected concurrently, answer by host
+        returns = {
+            '10.10.10.201': [
+                self.getFixture('stats'),
+                self.getFixture('indices_stats'),
+            ],
+            '10.10.10.202': [
+                self.getFixture('stats2'),
+                self.getFixture('indices_stats2'),
+            ],
+        }
         urlopen_mock = patch('urllib2.urlopen', Mock(
-            side_effect=lambda *args: returns.pop(0)))
+            side_effect=lambda url: returns[url.split('/')[2][:-5]].pop(0)))
 
         urlopen_mock.start()
         self.collector.collect()
         urlopen_mock.stop()
 
-        # check how many fixtures were consumed
-        self.assertEqual(urlopen_mock.new.call_count, 4)
+        # check all the fixtures were consumed
+        self.assertEqual(returns, {'10.10.10.201': [], '10.10.10.202': []})
 
         metrics = {
             'esprodata01.http.current': 1,
@@ -200,6 +200,7 @@ class MemcachedCollector(diamond.collector.Collector):
         if isinstance(hosts, basestring):
             hosts = [hosts]
 
+        args_list = []
         for host in hosts:
             matches = re.search('((.+)\@)?([^:]+)(:(\d+))?', host)
             alias = matches.group(2)
@@ -209,28 +210,33 @@ class MemcachedCollector(diamond.collector.Collector):
             if alias is None:
                 alias = hostname
 
-            stats = self.get_stats(hostname, port)
+            args_list.append((alias, hostname, port))
 
-            # figure out what we're configured to get, defaulting to everything
-            desired = self.config.get('publish', stats.keys())
+        self.run_concurrently(self.collect_instance, args_list)
 
-            slabs, slabs_overall = self.get_slabs(hostname, port)
-            self.publish_overall(slabs_overall)
-            self.publish_slabs(slabs)
+    def collect_instance(self, alias, hostname, port):
+        stats = self.get_stats(hostname, port)
 
-            # for everything we want
-            for stat in desired:
-                if stat in stats:
+        # figure out what we're configured to get, defaulting to everything
+        desired = self.config.get('publish', stats.keys())
 
-                    # we have it
-                    if stat in self.GAUGES:
-                        self.publish_gauge(alias + "." + stat, stats[stat])
-                    else:
-                        self.publish_counter(alias + "." + stat, stats[stat])
+        slabs, slabs_overall = self.get_slabs(hostname, port)
+        self.publish_overall(slabs_overall)
+        self.publish_slabs(slabs)
 
+        # for everything we want
+        for stat in desired:
+            if stat in stats:
+
+                # we have it
+                if stat in self.GAUGES:
+                    self.publish_gauge(alias + "." + stat, stats[stat])
                 else:
+                    self.publish_counter(alias + "." + stat, stats[stat])
+
+            else:
 
-                    # we don't, must be somehting configured in publish so we
-                    # should log an error about it
-                    self.log.error("No such key '%s' available, issue 'stats' "
-                                   "for a full list", stat)
+                # we don't, must be somehting configured in publish so we
+                # should log an error about it
+                self.log.error("No such key '%s' available, issue 'stats' "
+                               "for a full list", stat)
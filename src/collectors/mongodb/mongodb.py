@@ -127,6 +127,11 @@ class MongoDBCollector(diamond.collector.Collector):
         else:
             passwd = None
 
+        # Ensure that the SSL option is a boolean.
+        if type(self.config['ssl']) is str:
+            self.config['ssl'] = str_to_bool(self.config['ssl'])
+
+        args_list = []
         for host in hosts:
             matches = re.search('((.+)\@)?(.+)?', host)
             alias = matches.group(2)
@@ -141,69 +146,71 @@ class MongoDBCollector(diamond.collector.Collector):
             else:
                 base_prefix = [alias]
 
+            args_list.append((host, base_prefix, user, passwd))
+
+        self.run_concurrently(self.collect_instance, args_list)
+
+    def collect_instance(self, host, base_prefix, user, passwd):
+        """Collect the stats of a single mongodb server"""
+        try:
+            if ReadPreference is None:
+                conn = pymongo.Connection(
+                    host,
+                    network_timeout=self.config['network_timeout'],
+                    ssl=self.config['ssl'],
+                    slave_okay=True
+                )
+            else:
+                conn = pymongo.Connection(
+                    host,
+                    network_timeout=self.config['network_timeout'],
+                    ssl=self.config['ssl'],
+                    read_preference=ReadPreference.SECONDARY,
+                )
+        except Exception, e:
+            self.log.error('Couldnt connect to mongodb: %s', e)
+            return
+
+        # try auth
+        if user:
             try:
-                # Ensure that the SSL option is a boolean.
-                if type(self.config['ssl']) is str:
-                    self.config['ssl'] = str_to_bool(self.config['ssl'])
-
-                if ReadPreference is None:
-                    conn = pymongo.Connection(
-                        host,
-                        network_timeout=self.config['network_timeout'],
-                        ssl=self.config['ssl'],
-                        slave_okay=True
-                    )
-                else:
-                    conn = pymongo.Connection(
-                        host,
-                        network_timeout=self.config['network_timeout'],
-                        ssl=self.config['ssl'],
-                        read_preference=ReadPreference.SECONDARY,
-                    )
+                conn.admin.authenticate(user, passwd)
             except Exception, e:
-                self.log.error('Couldnt connect to mongodb: %s', e)
+                self.log.error('User auth given, but could not autheticate'
+                               + ' with host: %s, err: %s' % (host, e))
+                return
+
+        data = conn.db.command('serverStatus')
+        self._publish_transformed(data, base_prefix)
+        if str_to_bool(self.config['simple']):
+            data = self._extract_simple_data(data)
+
+        self._publish_dict_with_prefix(data, base_prefix)
+        db_name_filter = re.compile(self.config['databases'])
+        ignored_collections = re.compile(self.config['ignore_collections'])
+        sample_threshold = self.MAX_CRC32 * self.config[
+            'collection_sample_rate']
+        for db_name in conn.database_names():
+            if not db_name_filter.search(db_name):
                 continue
-
-            # try auth
-            if user:
-                try:
-                    conn.admin.authenticate(user, passwd)
-                except Exception, e:
-                    self.log.error('User auth given, but could not autheticate'
-                                   + ' with host: %s, err: %s' % (host, e))
-                    return{}
-
-            data = conn.db.command('serverStatus')
-            self._publish_transformed(data, base_prefix)
-            if str_to_bool(self.config['simple']):
-                data = self._extract_simple_data(data)
-
-            self._publish_dict_with_prefix(data, base_prefix)
-            db_name_filter = re.compile(self.config['databases'])
-            ignored_collections = re.compile(self.config['ignore_collections'])
-            sample_threshold = self.MAX_CRC32 * self.config[
-                'collection_sample_rate']
-            for db_name in conn.database_names():
-                if not db_name_filter.search(db_name):
+            db_stats = conn[db_name].command('dbStats')
+            db_prefix = base_prefix + ['databases', db_name]
+            self._publish_dict_with_prefix(db_stats, db_prefix)
+            for collection_name in conn[db_name].collection_names():
+                if ignored_collections.search(collection_name):
+                    continue
+                if (self.config['collection_sample_rate'] < 1 and (
+                        zlib.crc32(collection_name) & 0xffffffff
+                        ) > sample_threshold):
                     continue
-                db_stats = conn[db_name].command('dbStats')
-                db_prefix = base_prefix + ['databases', db_name]
-                self._publish_dict_with_prefix(db_stats, db_prefix)
-                for collection_name in conn[db_name].collection_names():
-                    if ignored_collections.search(collection_name):
-                        continue
-                    if (self.config['collection_sample_rate'] < 1 and (
-                            zlib.crc32(collection_name) & 0xffffffff
-                            ) > sample_threshold):
-                        continue
-
-                    collection_stats = conn[db_name].command('collstats',
-                                                             collection_name)
-                    if str_to_bool(self.config['translate_collections']):
-                        collection_name = collection_name.replace('.', '_')
-                    collection_prefix = db_prefix + [collection_name]
-                    self._publish_dict_with_prefix(collection_stats,
-                                                   collection_prefix)
+
+                collection_stats = conn[db_name].command('collstats',
+                                                         collection_name)
+                if str_to_bool(self.config['translate_collections']):
+                    collection_name = collection_name.replace('.', '_')
+                collection_prefix = db_prefix + [collection_name]
+                self._publish_dict_with_prefix(collection_stats,
+                                               collection_prefix)
 
     def _publish_transformed(self, data, base_prefix):
         """ Publish values of type: counter or percent """
@@ -258,6 +258,10 @@ class TestMongoMultiHostDBCollector(CollectorTestCase):
         connector_mock.return_value = self.connection
         self.connection.db.command.return_value = data
         self.connection.database_names.return_value = ['db1', 'baddb']
+        # The hosts are collected concurrently, create the mocks of the
+        # database before the threads use them
+        self.connection['db1'].command
+        self.connection['db1'].collection_names
 
 
 ################################################################################
@@ -31,6 +31,7 @@ GRANT PROCESS ON *.* TO 'user'@'hostname' IDENTIFIED BY
 import diamond.collector
 from diamond.collector import str_to_bool
 import re
+import threading
 import time
 
 try:
@@ -216,6 +217,9 @@ class MySQLCollector(diamond.collector.Collector):
     innodb_status_match = {}
 
     def __init__(self, *args, **kwargs):
+        # The hosts are collected concurrently, each thread has its own
+        # connection
+        self._connections = threading.local()
         super(MySQLCollector, self).__init__(*args, **kwargs)
         for key in self.innodb_status_keys:
             self.innodb_status_keys[key] = re.compile(
@@ -244,6 +248,14 @@ class MySQLCollector(diamond.collector.Collector):
 
         self.db = None
 
+    def _get_db(self):
+        return getattr(self._connections, 'db', None)
+
+    def _set_db(self, db):
+        self._connections.db = db
+
+    db = property(_get_db, _set_db)
+
     def get_default_config_help(self):
         config_help = super(MySQLCollector, self).get_default_config_help()
         config_help.update({
@@ -432,6 +444,7 @@ class MySQLCollector(diamond.collector.Collector):
             self.log.error('Unable to import MySQLdb')
             return False
 
+        args_list = []
         for host in self.config['hosts']:
             matches = re.search(
                 '^([^:]*):([^@]*)@([^:]*):?([^/]*)/([^/]*)/?(.*)', host)
@@ -460,21 +473,26 @@ class MySQLCollector(diamond.collector.Collector):
             if params['db'] == 'None':
                 del params['db']
 
-            try:
-                metrics = self.get_stats(params=params)
-            except Exception, e:
-                try:
-                    self.disconnect()
-                except MySQLdb.ProgrammingError:
-                    pass
-                self.log.error('Collection failed for %s %s', nickname, e)
-                continue
+            args_list.append((nickname, params))
 
-            # Warn if publish contains an unknown variable
-            if 'publish' in self.config and metrics['status']:
-                    for k in self.config['publish'].split():
-                        if k not in metrics['status']:
-                            self.log.error("No such key '%s' available, issue"
-                                           + " 'show global status' for a full"
-                                           + " list", k)
-            self._publish_stats(nickname, metrics)
+        self.run_concurrently(self.collect_instance, args_list)
+
+    def collect_instance(self, nickname, params):
+        try:
+            metrics = self.get_stats(params=params)
+        except Exception, e:
+            try:
+                self.disconnect()
+            except MySQLdb.ProgrammingError:
+                pass
+            self.log.error('Collection failed for %s %s', nickname, e)
+            return
+
+        # Warn if publish contains an unknown variable
+        if 'publish' in self.config and metrics['status']:
+            for k in self.config['publish'].split():
+                if k not in metrics['status']:
+                    self.log.error("No such key '%s' available, issue"
+                                   + " 'show global status' for a full"
+                                   + " list", k)
+        self._publish_stats(nickname, metrics)
@@ -106,15 +106,17 @@ class NetworkCollector(diamond.collector.Collector):
                 results[device]['tx_packets'] = network_stat.packets_sent
 
         for device in results:
-            stats = results[device]
-            for s, v in stats.items():
-                # Get Metric Name
-                metric_name = '.'.join([device, s])
-                # Get Metric Value
-                metric_value = self.derivative(metric_name,
-                                               long(v),
-                                               diamond.collector.MAX_COUNTER)
-
+            stats = results[device].items()
+            # Get Metric Names
+            metric_names = ['.'.join([device, s]) for s, v in stats]
+            # Get Metric Values
+            metric_values = self.derivative_many(
+                metric_names,
+                [long(v) for s, v in stats],
+                diamond.collector.MAX_COUNTER)
+
+            for (s, v), metric_name, metric_value in zip(stats, metric_names,
+                                                         metric_values):
                 # Convert rx_bytes and tx_bytes
                 if s == 'rx_bytes' or s == 'tx_bytes':
                     convertor = diamond.convertor.binary(value=metric_value,
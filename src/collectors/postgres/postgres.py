@@ -3,6 +3,10 @@
 """
 Collect metrics from postgresql
 
+One connection per database is kept open across collections. Stats shared by
+all databases are fetched once, the per database stats over the connection to
+each database.
+
 #### Dependencies
 
  * psycopg2
@@ -24,6 +28,13 @@ class PostgresqlCollector(diamond.collector.Collector):
     PostgreSQL collector class
     """
 
+    def __init__(self, *args, **kwargs):
+        # Connections kept open across collections, by database name
+        self.connections = {}
+        # Databases whose connection was checked during this collection
+        self.checked = set()
+        super(PostgresqlCollector, self).__init__(*args, **kwargs)
+
     def get_default_config_help(self):
         """
         Return help text for collector
@@ -75,6 +86,8 @@ class PostgresqlCollector(diamond.collector.Collector):
             self.log.error('Unable to import module psycopg2')
             return {}
 
+        self.checked = set()
+
         # Get list of databases
         dbs = self._get_db_names()
         if len(dbs) == 0:
@@ -92,34 +105,63 @@ class PostgresqlCollector(diamond.collector.Collector):
         else:
             metrics = registry['basic']
 
-        # Iterate every QueryStats class
-        for metric_name in set(metrics):
+        # Shared stats hit views like pg_database which are the same in every
+        # database, they are fetched once over the session of the first
+        # database. The other stats are fetched from every database, one
+        # session per database.
+        shared = []
+        per_db = []
+        for metric_name in sorted(set(metrics)):
             if metric_name not in metrics_registry:
                 self.log.error(
                     'metric_name %s not found in metric registry' % metric_name)
                 continue
 
-            for dbase in dbs:
-                conn = self._connect(database=dbase)
-                try:
-                    klass = metrics_registry[metric_name]
-                    stat = klass(dbase, conn,
-                                 underscore=self.config['underscore'])
-                    stat.fetch(self.config['pg_version'])
-                    for metric, value in stat:
-                        if value is not None:
-                            self.publish(metric, value)
-
-                    # Setting multi_db to True will run this query on all known
-                    # databases. This is bad for queries that hit views like
-                    # pg_database, which are shared across databases.
-                    #
-                    # If multi_db is False, bail early after the first query
-                    # iteration. Otherwise, continue to remaining databases.
-                    if stat.multi_db is False:
-                        break
-                finally:
-                    conn.close()
+            klass = metrics_registry[metric_name]
+            if klass.multi_db:
+                per_db.append(klass)
+            else:
+                shared.append(klass)
+
+        for dbase in dbs:
+            conn = self._get_connection(dbase)
+            if conn is None:
+                continue
+
+            if dbase == dbs[0]:
+                klasses = shared + per_db
+            else:
+                klasses = per_db
+
+            for klass in klasses:
+                if not self._collect_stat(klass, dbase, conn):
+                    break
+
+        # Close the sessions of databases that went away
+        for dbase in self.connections.keys():
+            if dbase not in dbs and dbase != self.config['dbname']:
+                self._close_connection(dbase)
+
+    def _collect_stat(self, klass, dbase, conn):
+        """
+        Fetch and publish a QueryStats class. Returns False if the connection
+        was lost.
+        """
+        stat = klass(dbase, conn, underscore=self.config['underscore'])
+        try:
+            stat.fetch(self.config['pg_version'])
+        except psycopg2.Error, e:
+            self.log.error('Failed to fetch %s from %s: %s',
+                           klass.__name__, dbase, e)
+            if conn.closed:
+                self._close_connection(dbase)
+                return False
+            return True
+
+        for metric, value in stat:
+            if value is not None:
+                self.publish(metric, value)
+        return True
 
     def _get_db_names(self):
         """
@@ -130,11 +172,20 @@ class PostgresqlCollector(diamond.collector.Collector):
             WHERE datallowconn AND NOT datistemplate
             AND NOT datname='postgres' ORDER BY 1
         """
-        conn = self._connect(self.config['dbname'])
+        conn = self._get_connection(self.config['dbname'])
+        if conn is None:
+            return []
+
         cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        cursor.execute(query)
-        datnames = [d['datname'] for d in cursor.fetchall()]
-        conn.close()
+        try:
+            cursor.execute(query)
+            datnames = [d['datname'] for d in cursor.fetchall()]
+        except psycopg2.Error, e:
+            self.log.error('Failed to list databases: %s', e)
+            self._close_connection(self.config['dbname'])
+            return []
+        finally:
+            cursor.close()
 
         # Exclude `postgres` database list, unless it is the
         # only database available (required for querying pg_stat_database)
@@ -143,6 +194,59 @@ class PostgresqlCollector(diamond.collector.Collector):
 
         return datnames
 
+    def _get_connection(self, database):
+        """
+        Returns the pooled connection to the given database, checking it is
+        still usable once per collection and reconnecting if it is not.
+        Returns None if the database is unreachable.
+        """
+        conn = self.connections.get(database)
+        if conn is not None and database not in self.checked:
+            if not self._is_alive(conn):
+                self.log.info('Connection to %s lost, reconnecting', database)
+                self._close_connection(database)
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._connect(database=database)
+            except Exception:
+                return None
+            self.connections[database] = conn
+
+        self.checked.add(database)
+        return conn
+
+    def _is_alive(self, conn):
+        """
+        Check a connection is still open
+        """
+        if conn.closed:
+            return False
+
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+                cursor.fetchall()
+            finally:
+                cursor.close()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close_connection(self, database):
+        """
+        Close and forget the pooled connection to the given database
+        """
+        conn = self.connections.pop(database, None)
+        self.checked.discard(database)
+        if conn is not None:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
     def _connect(self, database=None):
         """
         Connect to given database
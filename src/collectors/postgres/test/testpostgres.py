@@ -4,6 +4,10 @@
 
 from test import CollectorTestCase
 from test import get_collector_config
+from mock import Mock
+from mock import patch
+
+from diamond.collector import Collector
 
 from postgres import PostgresqlCollector
 
@@ -18,3 +22,97 @@ class TestPostgresqlCollector(CollectorTestCase):
 
     def test_import(self):
         self.assertTrue(PostgresqlCollector)
+
+
+class FakeError(Exception):
+    pass
+
+
+class FakeCursor(object):
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    def execute(self, query, parameters=None):
+        self.conn.queries.append(query)
+        if 'FROM pg_database\n            WHERE datallowconn' in query:
+            self.rows = [{'datname': 'db1'}, {'datname': 'db2'}]
+        else:
+            self.rows = [('metric', 1)]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+    def __init__(self, database):
+        self.database = database
+        self.closed = 0
+        self.queries = []
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def set_isolation_level(self, level):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class TestPostgresqlCollectorConnections(CollectorTestCase):
+    def setUp(self):
+        config = get_collector_config('PostgresqlCollector', {
+            'metrics': ['LockStats', 'ConnectionStateStats'],
+        })
+        self.collector = PostgresqlCollector(config, None)
+
+        self.psycopg2 = Mock()
+        self.psycopg2.Error = FakeError
+        self.connections = []
+
+        def connect(**kwargs):
+            conn = FakeConnection(kwargs['database'])
+            self.connections.append(conn)
+            return conn
+        self.psycopg2.connect.side_effect = connect
+
+        patcher = patch('postgres.psycopg2', self.psycopg2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queries(self, database, marker):
+        return [q for conn in self.connections if conn.database == database
+                for q in conn.queries if marker in q]
+
+    @patch.object(Collector, 'publish')
+    def test_connections_are_reused(self, publish_mock):
+        self.collector.collect()
+        self.collector.collect()
+
+        self.assertEqual(sorted(c.database for c in self.connections),
+                         ['db1', 'db2', 'postgres'])
+        self.assertEqual(len(self.queries('db1', 'SELECT 1')), 1)
+
+    @patch.object(Collector, 'publish')
+    def test_shared_stats_fetched_once(self, publish_mock):
+        self.collector.collect()
+
+        self.assertEqual(len(self.queries('db1', 'pg_locks')), 1)
+        self.assertEqual(len(self.queries('db2', 'pg_locks')), 0)
+        self.assertEqual(len(self.queries('db1', 'pg_stat_activity')), 1)
+        self.assertEqual(len(self.queries('db2', 'pg_stat_activity')), 1)
+        publish_mock.assert_any_call('db1.locks.metric', 1)
+        publish_mock.assert_any_call('db2.connections.metric', 1)
+
+    @patch.object(Collector, 'publish')
+    def test_reconnect_closed_connection(self, publish_mock):
+        self.collector.collect()
+        self.collector.connections['db2'].closed = 1
+        self.collector.collect()
+
+        self.assertEqual(sorted(c.database for c in self.connections),
+                         ['db1', 'db2', 'db2', 'postgres'])
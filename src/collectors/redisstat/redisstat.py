@@ -323,6 +323,8 @@ class RedisCollector(diamond.collector.Collector):
             self.log.error('Unable to import module redis')
             return {}
 
+        args_list = []
         for nick in self.instances.keys():
             (host, port, unix_socket, auth) = self.instances[nick]
-            self.collect_instance(nick, host, int(port), unix_socket, auth)
+            args_list.append((nick, host, int(port), unix_socket, auth))
+        self.run_concurrently(self.collect_instance, args_list)
@@ -3,6 +3,14 @@
 """
 SNMPCollector is a special collector for collecting data by using SNMP
 
+The devices configured under [devices] are polled concurrently, each with
+its own deadline, and the success and duration of every poll are published
+as devices.<device>.poll.success and devices.<device>.poll.time_ms.
+
+get accepts a list of OIDs, fetched with as few GET requests as possible, and
+walk retrieves tables with GETBULK. The resolved transports are cached for
+TRANSPORT_CACHE_TTL seconds.
+
 #### Dependencies
 
  * pysnmp
@@ -10,6 +18,8 @@ SNMPCollector is a special collector for collecting data by using SNMP
 """
 
 import socket
+import threading
+import time
 
 import warnings
 
@@ -24,22 +34,49 @@ cmdgen = None
 try:
     import pysnmp.entity.rfc3413.oneliner.cmdgen as cmdgen
     import pysnmp.debug
+    from pysnmp.proto import rfc1905
 except ImportError:
     pysnmp = None
     cmdgen = None
+    rfc1905 = None
 
 warnings.showwarning = old_showwarning
 
 import diamond.collector
+from diamond.collector import str_to_bool
+
+
+# Seconds to keep the resolved address and transport of a device
+TRANSPORT_CACHE_TTL = 300
 
 
 class SNMPCollector(diamond.collector.Collector):
 
+    def __init__(self, *args, **kwargs):
+        # Devices being polled, a device whose last poll timed out and is
+        # still running is skipped
+        self._polling = set()
+        self._polling_lock = threading.Lock()
+        # Number of failed requests of the device polled by each thread
+        self._poll_errors = threading.local()
+        super(SNMPCollector, self).__init__(*args, **kwargs)
+
+    def process_config(self):
+        super(SNMPCollector, self).process_config()
+        # The transports depend on the timeout and retries
+        self._sessions = {}
+        self._auth_data = {}
+
     def get_default_config_help(self):
         config_help = super(SNMPCollector, self).get_default_config_help()
         config_help.update({
             'timeout': 'Seconds before timing out the snmp connection',
             'retries': 'Number of times to retry before bailing',
+            'bulk': 'Walk tables with GETBULK requests (SNMP v2c)',
+            'max_repetitions': 'Number of table rows asked for per GETBULK ' +
+                               'request',
+            'max_oids_per_get': 'Maximum number of OIDs fetched per GET ' +
+                                'request',
         })
         return config_help
 
@@ -50,9 +87,69 @@ class SNMPCollector(diamond.collector.Collector):
         default_config['path_prefix'] = 'systems'
         default_config['timeout'] = 5
         default_config['retries'] = 3
+        default_config['bulk'] = True
+        default_config['max_repetitions'] = 25
+        default_config['max_oids_per_get'] = 20
         # Return default config
         return default_config
 
+    def collect_snmp(self, device, host, port, community):
+        """
+        Collect the metrics of a device
+        """
+        raise NotImplementedError()
+
+    def collect(self):
+        """
+        Poll the configured devices concurrently
+        """
+        if cmdgen is None:
+            self.log.error('Unable to import pysnmp')
+            return
+
+        args_list = []
+        for device, device_config in self.config.get('devices', {}).items():
+            args_list.append((device,
+                              device_config['host'],
+                              int(device_config.get('port', 161)),
+                              device_config.get('community', 'public')))
+
+        results = self.run_concurrently(self._poll_device, args_list)
+
+        for args, result in zip(args_list, results):
+            device = args[0]
+            if result is None:
+                # Timed out or failed
+                self.publish_gauge('devices.%s.poll.success' % device, 0)
+                continue
+
+            elapsed, errors = result
+            self.publish_gauge('devices.%s.poll.success' % device,
+                               int(not errors))
+            self.publish_gauge('devices.%s.poll.time_ms' % device,
+                               int(elapsed * 1000))
+
+    def _poll_device(self, device, host, port, community):
+        """
+        Collect a device, returns how long it took and the number of failed
+        requests
+        """
+        with self._polling_lock:
+            if device in self._polling:
+                self.log.error('Skipping %s, its previous poll is still '
+                               'running', device)
+                return None
+            self._polling.add(device)
+
+        try:
+            self._poll_errors.count = 0
+            start = time.time()
+            self.collect_snmp(device, host, port, community)
+            return time.time() - start, self._poll_errors.count
+        finally:
+            with self._polling_lock:
+                self._polling.discard(device)
+
     def _convert_to_oid(self, s):
         d = s.split(".")
         return tuple([int(x) for x in d])
@@ -60,73 +157,131 @@ class SNMPCollector(diamond.collector.Collector):
     def _convert_from_oid(self, oid):
         return ".".join([str(x) for x in oid])
 
-    def get(self, oid, host, port, community):
+    def _get_oids(self, oid):
         """
-        Perform SNMP get for a given OID
+        Returns a list of OID tuples from an OID or a list of OIDs
         """
-        # Initialize return value
-        ret = {}
+        if isinstance(oid, (basestring, tuple)):
+            oid = [oid]
+        return [o if isinstance(o, tuple) else self._convert_to_oid(o)
+                for o in oid]
 
-        # Convert OID to tuple if necessary
-        if not isinstance(oid, tuple):
-            oid = self._convert_to_oid(oid)
-
-        # Convert Host to IP if necessary
-        host = socket.gethostbyname(host)
+    def _get_auth_data(self, community):
+        """
+        Returns the cached SNMP auth data of a community
+        """
+        auth_data = self._auth_data.get(community)
+        if auth_data is None:
+            auth_data = cmdgen.CommunityData('agent', community)
+            self._auth_data[community] = auth_data
+        return auth_data
 
-        # Assemble SNMP Auth Data
-        snmpAuthData = cmdgen.CommunityData('agent', community)
+    def _get_session(self, host, port):
+        """
+        Returns the cached SNMP command generator and transport of a device,
+        resolving the host again once the cache entry expired. Each device
+        has its own command generator, as the devices are polled from
+        different threads.
+        """
+        key = (host, int(port))
+        now = time.time()
+        cached = self._sessions.get(key)
+        if cached is None or cached[2] <= now:
+            # Convert Host to IP if necessary
+            address = socket.gethostbyname(host)
+
+            # Assemble SNMP Transport Data
+            transport = cmdgen.UdpTransportTarget(
+                (address, int(port)),
+                int(self.config['timeout']),
+                int(self.config['retries']))
+
+            if cached is None:
+                generator = cmdgen.CommandGenerator()
+            else:
+                generator = cached[0]
+            cached = (generator, transport, now + TRANSPORT_CACHE_TTL)
+            self._sessions[key] = cached
+        return cached[:2]
+
+    def _check_error(self, result, host):
+        """
+        Log the error of an SNMP request. Returns True if there was none.
+        """
+        errorIndication, errorStatus, errorIndex = result[:3]
+        if errorIndication or errorStatus:
+            self._poll_errors.count = getattr(self._poll_errors, 'count',
+                                              0) + 1
+        if errorIndication:
+            self.log.error('SNMP request to %s failed: %s', host,
+                           errorIndication)
+            return False
+        if errorStatus:
+            self.log.error('SNMP request to %s failed: %s at %s', host,
+                           errorStatus.prettyPrint(), errorIndex)
+            return False
+        return True
 
-        # Assemble SNMP Transport Data
-        snmpTransportData = cmdgen.UdpTransportTarget(
-            (host, port),
-            int(self.config['timeout']),
-            int(self.config['retries']))
+    def get(self, oid, host, port, community):
+        """
+        Perform SNMP get for a given OID, or a list of OIDs fetched with as
+        few requests as possible
+        """
+        # Initialize return value
+        ret = {}
 
-        # Assemble SNMP Next Command
-        result = self.snmpCmdGen.getCmd(snmpAuthData, snmpTransportData, oid)
-        varBind = result[3]
+        oids = self._get_oids(oid)
+        snmpAuthData = self._get_auth_data(community)
+        snmpCmdGen, snmpTransportData = self._get_session(host, port)
 
-        # TODO: Error check
+        size = max(int(self.config['max_oids_per_get']), 1)
+        for i in xrange(0, len(oids), size):
+            # Assemble SNMP Get Command
+            result = snmpCmdGen.getCmd(snmpAuthData, snmpTransportData,
+                                       *oids[i:i + size])
+            if not self._check_error(result, host):
+                continue
 
-        for o, v in varBind:
-            ret[o.prettyPrint()] = v.prettyPrint()
+            for o, v in result[3]:
+                ret[o.prettyPrint()] = v.prettyPrint()
 
         return ret
 
     def walk(self, oid, host, port, community):
         """
-        Perform an SNMP walk on a given OID
+        Perform an SNMP walk on a given OID, or on a list of OIDs walked side
+        by side such as the columns of a table
         """
         # Initialize return value
         ret = {}
 
-        # Convert OID to tuple if necessary
-        if not isinstance(oid, tuple):
-            oid = self._convert_to_oid(oid)
-
-        # Convert Host to IP if necessary
-        host = socket.gethostbyname(host)
-
-        # Assemble SNMP Auth Data
-        snmpAuthData = cmdgen.CommunityData('agent', community)
-
-        # Assemble SNMP Transport Data
-        snmpTransportData = cmdgen.UdpTransportTarget(
-            (host, port),
-            int(self.config['timeout']),
-            int(self.config['retries']))
-
-        # Assemble SNMP Next Command
-        resultTable = self.snmpCmdGen.nextCmd(snmpAuthData,
-                                              snmpTransportData,
-                                              oid)
-        varBindTable = resultTable[3]
-
-        # TODO: Error Check
-
-        for varBindTableRow in varBindTable:
+        oids = self._get_oids(oid)
+        snmpAuthData = self._get_auth_data(community)
+        snmpCmdGen, snmpTransportData = self._get_session(host, port)
+
+        if str_to_bool(self.config['bulk']):
+            # Assemble SNMP Bulk Command
+            resultTable = snmpCmdGen.bulkCmd(
+                snmpAuthData, snmpTransportData, 0,
+                int(self.config['max_repetitions']), *oids)
+        else:
+            # Assemble SNMP Next Command
+            resultTable = snmpCmdGen.nextCmd(snmpAuthData, snmpTransportData,
+                                             *oids)
+        if not self._check_error(resultTable, host):
+            return ret
+
+        # The last responses may run past the walked subtrees
+        prefixes = [self._convert_from_oid(o) + '.' for o in oids]
+
+        for varBindTableRow in resultTable[3]:
             for o, v in varBindTableRow:
-                ret[o.prettyPrint()] = v.prettyPrint()
+                if rfc1905 is not None and isinstance(v, rfc1905.EndOfMibView):
+                    continue
+                name = o.prettyPrint()
+                for prefix in prefixes:
+                    if name.startswith(prefix):
+                        ret[name] = v.prettyPrint()
+                        break
 
         return ret
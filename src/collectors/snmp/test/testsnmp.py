@@ -2,21 +2,128 @@
 # coding=utf-8
 ################################################################################
 
+import time
+
 from test import CollectorTestCase
 from test import get_collector_config
+from mock import Mock
+from mock import patch
+
+from diamond.collector import Collector
 
 from snmp import SNMPCollector
 
 
+class Value(str):
+    """
+    Stands for the pysnmp OIDs and values
+    """
+
+    def prettyPrint(self):
+        return str(self)
+
+
 class TestSNMPCollector(CollectorTestCase):
     def setUp(self, allowed_names=None):
         if not allowed_names:
             allowed_names = []
         config = get_collector_config('SNMPCollector', {
             'allowed_names': allowed_names,
-            'interval': 1
+            'interval': 1,
+            'max_oids_per_get': 2,
         })
         self.collector = SNMPCollector(config, None)
 
+        patcher = patch('snmp.cmdgen')
+        self.cmdgen = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.generator = self.cmdgen.CommandGenerator.return_value
+
+        patcher = patch('socket.gethostbyname', Mock(return_value='10.0.0.1'))
+        self.gethostbyname = patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_import(self):
         self.assertTrue(SNMPCollector)
+
+    def test_get_multiple_oids(self):
+        def getCmd(auth, transport, *oids):
+            return (None, 0, 0, [(Value(self.collector._convert_from_oid(o)),
+                                  Value(o[-1])) for o in oids])
+        self.generator.getCmd.side_effect = getCmd
+
+        data = self.collector.get(['1.2.1', '1.2.2', '1.2.3'], 'switch',
+                                  161, 'public')
+        self.assertEqual(data, {'1.2.1': '1', '1.2.2': '2', '1.2.3': '3'})
+        self.assertEqual(self.generator.getCmd.call_count, 2)
+
+        # The transport and address are cached
+        self.collector.get('1.2.1', 'switch', 161, 'public')
+        self.assertEqual(self.gethostbyname.call_count, 1)
+        self.assertEqual(self.cmdgen.UdpTransportTarget.call_count, 1)
+
+    def test_walk_bulk(self):
+        self.generator.bulkCmd.return_value = (None, 0, 0, [
+            [(Value('1.2.1.1'), Value('a')), (Value('1.3.1.1'), Value('c'))],
+            [(Value('1.2.1.2'), Value('b')), (Value('1.4.1.1'), Value('d'))],
+        ])
+
+        data = self.collector.walk(['1.2.1', '1.3.1'], 'switch', 161,
+                                   'public')
+        self.assertEqual(data, {'1.2.1.1': 'a', '1.2.1.2': 'b',
+                                '1.3.1.1': 'c'})
+        args = self.generator.bulkCmd.call_args[0]
+        self.assertEqual(args[2:], (0, 25, (1, 2, 1), (1, 3, 1)))
+        self.assertFalse(self.generator.nextCmd.called)
+
+    def test_walk_next(self):
+        self.collector.config['bulk'] = 'False'
+        self.generator.nextCmd.return_value = (None, 0, 0, [
+            [(Value('1.2.1.1'), Value('a'))],
+        ])
+
+        data = self.collector.walk('1.2.1', 'switch', 161, 'public')
+        self.assertEqual(data, {'1.2.1.1': 'a'})
+        self.assertFalse(self.generator.bulkCmd.called)
+
+    def test_walk_error(self):
+        self.generator.bulkCmd.return_value = (
+            'requestTimedOut', 0, 0, [])
+
+        data = self.collector.walk('1.2.1', 'switch', 161, 'public')
+        self.assertEqual(data, {})
+
+    @patch.object(Collector, 'publish')
+    def test_collect_devices_concurrently(self, publish_mock):
+        self.collector.config['devices'] = {
+            'switch1': {'host': 'switch1', 'community': 'public'},
+            'switch2': {'host': 'switch2', 'port': 1161},
+            'switch3': {'host': 'switch3'},
+        }
+        self.collector.config['task_timeout'] = 0.5
+
+        def collect_snmp(device, host, port, community):
+            if device == 'switch2':
+                # Unreachable
+                self.collector._check_error(('requestTimedOut', 0, 0), host)
+            elif device == 'switch3':
+                time.sleep(2)
+            self.collector.publish(device, port)
+        collect_mock = Mock(side_effect=collect_snmp)
+
+        start = time.time()
+        with patch.object(SNMPCollector, 'collect_snmp', collect_mock):
+            self.collector.collect()
+        self.assertTrue(time.time() - start < 1.5)
+
+        self.assertEqual(collect_mock.call_count, 3)
+        self.assertPublished(publish_mock, 'switch1', 161)
+        self.assertPublished(publish_mock, 'switch2', 1161)
+        self.assertUnpublished(publish_mock, 'switch3', 161)
+        self.assertPublished(publish_mock, 'devices.switch1.poll.success', 1)
+        self.assertPublished(publish_mock, 'devices.switch2.poll.success', 0)
+        self.assertPublished(publish_mock, 'devices.switch3.poll.success', 0)
+        paths = [c[0][0] for c in publish_mock.call_args_list]
+        self.assertTrue('devices.switch1.poll.time_ms' in paths)
+        self.assertUnpublished(publish_mock, 'devices.switch3.poll.time_ms',
+                               0)
@@ -74,7 +74,6 @@ import diamond.convertor
 class SNMPInterfaceCollector(parent_SNMPCollector):
 
     # IF-MIB OID
-    IF_MIB_INDEX_OID = "1.3.6.1.2.1.2.2.1.1"
     IF_MIB_NAME_OID = "1.3.6.1.2.1.31.1.1.1.1"
     IF_MIB_TYPE_OID = "1.3.6.1.2.1.2.2.1.3"
 
@@ -115,6 +114,20 @@ class SNMPInterfaceCollector(parent_SNMPCollector):
         default_config['byte_unit'] = ['bit', 'byte']
         return default_config
 
+    def _walk_columns(self, columns, host, port, community):
+        """
+        Walk the columns of a table side by side. Returns a dict of
+        {column OID: {index: value}}.
+        """
+        table = dict((column, {}) for column in columns)
+        data = self.walk(columns, host, port, community)
+        for oid, value in data.items():
+            for column in columns:
+                if oid.startswith(column + '.'):
+                    table[column][oid[len(column) + 1:]] = value
+                    break
+        return table
+
     def collect_snmp(self, device, host, port, community):
         """
         Collect SNMP interface data from device
@@ -122,34 +135,30 @@ class SNMPInterfaceCollector(parent_SNMPCollector):
         # Log
         self.log.info("Collecting SNMP interface statistics from: %s", device)
 
-        # Define a list of interface indexes
-        ifIndexes = []
+        # Get Interface Types and Names
+        ifTable = self._walk_columns([self.IF_MIB_TYPE_OID,
+                                      self.IF_MIB_NAME_OID],
+                                     host, port, community)
+        ifTypes = ifTable[self.IF_MIB_TYPE_OID]
+        ifNames = ifTable[self.IF_MIB_NAME_OID]
+
+        ifIndexes = [ifIndex for ifIndex, ifType in ifTypes.items()
+                     if ifType in self.IF_TYPES and ifIndex in ifNames]
+        if not ifIndexes:
+            return
 
-        # Get Interface Indexes
-        ifIndexOid = '.'.join([self.IF_MIB_INDEX_OID])
-        ifIndexData = self.walk(ifIndexOid, host, port, community)
-        ifIndexes = [v for v in ifIndexData.values()]
+        # Get the gauge and counter columns of every interface at once
+        columns = (self.IF_MIB_GAUGE_OID_TABLE.values() +
+                   self.IF_MIB_COUNTER_OID_TABLE.values())
+        ifData = self._walk_columns(columns, host, port, community)
 
         for ifIndex in ifIndexes:
-            # Get Interface Type
-            ifTypeOid = '.'.join([self.IF_MIB_TYPE_OID, ifIndex])
-            ifTypeData = self.get(ifTypeOid, host, port, community)
-            if ifTypeData[ifTypeOid] not in self.IF_TYPES:
-                # Skip Interface
-                continue
-            # Get Interface Name
-            ifNameOid = '.'.join([self.IF_MIB_NAME_OID, ifIndex])
-            ifNameData = self.get(ifNameOid, host, port, community)
-            ifName = ifNameData[ifNameOid]
             # Remove quotes from string
-            ifName = re.sub(r'(\"|\')', '', ifName)
+            ifName = re.sub(r'(\"|\')', '', ifNames[ifIndex])
 
             # Get Gauges
             for gaugeName, gaugeOid in self.IF_MIB_GAUGE_OID_TABLE.items():
-                ifGaugeOid = '.'.join([self.IF_MIB_GAUGE_OID_TABLE[gaugeName],
-                                       ifIndex])
-                ifGaugeData = self.get(ifGaugeOid, host, port, community)
-                ifGaugeValue = ifGaugeData[ifGaugeOid]
+                ifGaugeValue = ifData[gaugeOid].get(ifIndex)
                 if not ifGaugeValue:
                     continue
 
@@ -168,10 +177,7 @@ class SNMPInterfaceCollector(parent_SNMPCollector):
             # Get counters (64bit)
             counterItems = self.IF_MIB_COUNTER_OID_TABLE.items()
             for counterName, counterOid in counterItems:
-                ifCounterOid = '.'.join(
-                    [self.IF_MIB_COUNTER_OID_TABLE[counterName], ifIndex])
-                ifCounterData = self.get(ifCounterOid, host, port, community)
-                ifCounterValue = ifCounterData[ifCounterOid]
+                ifCounterValue = ifData[counterOid].get(ifIndex)
                 if not ifCounterValue:
                     continue
 
@@ -4,7 +4,10 @@
 
 from test import CollectorTestCase
 from test import get_collector_config
+from mock import Mock
+from mock import patch
 
+from diamond.collector import Collector
 from snmpinterface import SNMPInterfaceCollector
 
 
@@ -18,3 +21,36 @@ class TestSNMPInterfaceCollector(CollectorTestCase):
 
     def test_import(self):
         self.assertTrue(SNMPInterfaceCollector)
+
+    @patch.object(Collector, 'publish')
+    def test_collect_snmp(self, publish_mock):
+        data = {
+            # ifType
+            '1.3.6.1.2.1.2.2.1.3.1': '6',
+            '1.3.6.1.2.1.2.2.1.3.2': '24',
+            # ifName
+            '1.3.6.1.2.1.31.1.1.1.1.1': '"eth0"',
+            '1.3.6.1.2.1.31.1.1.1.1.2': '"lo"',
+            # ifInErrors
+            '1.3.6.1.2.1.2.2.1.14.1': '3',
+            '1.3.6.1.2.1.2.2.1.14.2': '4',
+            # ifInUcastPkts
+            '1.3.6.1.2.1.31.1.1.1.7.1': '100',
+        }
+
+        def walk(columns, host, port, community):
+            return dict((oid, value) for oid, value in data.items()
+                        if [c for c in columns if oid.startswith(c + '.')])
+        walk_mock = Mock(side_effect=walk)
+
+        with patch.object(SNMPInterfaceCollector, 'walk', walk_mock):
+            self.collector.collect_snmp('switch', 'switch', 161, 'public')
+
+        # One walk for the interfaces, one for their statistics
+        self.assertEqual(walk_mock.call_count, 2)
+        self.assertPublishedMany(publish_mock, {
+            'devices.switch.interface.eth0.ifInErrors': 3,
+            'devices.switch.interface.eth0.ifInUcastPkts': 0,
+        })
+        self.assertUnpublished(publish_mock,
+                               'devices.switch.interface.lo.ifInErrors', 4)
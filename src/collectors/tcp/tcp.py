@@ -262,6 +262,7 @@ class TCPCollector(diamond.collector.Collector):
             for i in xrange(1, len(header)):
                 metrics[header[i]] = data[i]
 
+        counters = {}
         for metric_name in metrics.keys():
             if (len(self.config['allowed_names']) > 0
                     and metric_name not in self.config['allowed_names']):
@@ -273,4 +274,7 @@ class TCPCollector(diamond.collector.Collector):
             if metric_name in self.GAUGES:
                 self.publish_gauge(metric_name, value, 0)
             else:
-                self.publish_counter(metric_name, value, 0)
+                counters[metric_name] = value
+
+        # Publish the counters in one pass
+        self.publish_counters(counters, 0)
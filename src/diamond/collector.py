@@ -12,6 +12,9 @@ import configobj
 import time
 import re
 import subprocess
+import threading
+import Queue
+from itertools import izip, repeat
 
 from diamond.metric import Metric
 from diamond.utils.config import load_config
@@ -26,6 +29,11 @@ if platform.architecture()[0] == '64bit':
 else:
     MAX_COUNTER = (2 ** 32) - 1
 
+# Maximum number of metric paths and whitelist/blacklist decisions cached per
+# collector
+METRIC_PATH_CACHE_SIZE = 100000
+METRIC_FILTER_CACHE_SIZE = 100000
+
 
 def get_hostname(config, method=None):
     """
@@ -155,6 +163,19 @@ def str_to_bool(value):
     return value
 
 
+def compile_patterns(patterns):
+    """
+    Compiles a regex, or a list of regexes combined into a single alternation
+    """
+    if hasattr(patterns, 'match'):
+        return patterns
+
+    if isinstance(patterns, basestring):
+        return re.compile(patterns)
+
+    return re.compile('|'.join('(?:%s)' % pattern for pattern in patterns))
+
+
 class Collector(object):
     """
     The Collector class is a base class for all metric collectors.
@@ -174,6 +195,10 @@ class Collector(object):
 
         self.handlers = handlers
         self.last_values = {}
+        self._metric_paths = {}
+        self._metric_filter = {}
+        # Metrics held back by the threads of run_concurrently
+        self._local = threading.local()
 
         self.configfile = None
         self.load_config(configfile, config)
@@ -184,6 +209,7 @@ class Collector(object):
         """
 
         self.config = configobj.ConfigObj()
+        self._metric_paths = {}
 
         # Load in the collector's defaults
         if self.get_default_config() is not None:
@@ -193,14 +219,16 @@ class Collector(object):
             self.configfile = os.path.abspath(configfile)
 
         if self.configfile is not None:
-            config = load_config(self.configfile)
+            # The parsed config is shared by all the collectors, only copy
+            # the sections we need
+            config = load_config(self.configfile, copy=False)
 
             if 'collectors' in config:
                 if 'default' in config['collectors']:
-                    self.config.merge(config['collectors']['default'])
+                    self.config.merge(config['collectors']['default'].dict())
 
                 if self.name in config['collectors']:
-                    self.config.merge(config['collectors'][self.name])
+                    self.config.merge(config['collectors'][self.name].dict())
 
         if override_config is not None:
             if 'collectors' in override_config:
@@ -217,6 +245,9 @@ class Collector(object):
         Intended to put any code that should be run after any config reload
         event
         """
+        # Metric paths depend on the config
+        self._metric_paths = {}
+
         if 'byte_unit' in self.config:
             if isinstance(self.config['byte_unit'], basestring):
                 self.config['byte_unit'] = self.config['byte_unit'].split()
@@ -228,6 +259,10 @@ class Collector(object):
             self.config['measure_collector_time'] = str_to_bool(
                 self.config['measure_collector_time'])
 
+        if 'measure_schedule_lag' in self.config:
+            self.config['measure_schedule_lag'] = str_to_bool(
+                self.config['measure_schedule_lag'])
+
         # Raise an error if both whitelist and blacklist are specified
         if (self.config.get('metrics_whitelist', None)
                 and self.config.get('metrics_blacklist', None)):
@@ -236,12 +271,15 @@ class Collector(object):
                 'in file %s' % self.configfile)
 
         if self.config.get('metrics_whitelist', None):
-            self.config['metrics_whitelist'] = re.compile(
+            self.config['metrics_whitelist'] = compile_patterns(
                 self.config['metrics_whitelist'])
         elif self.config.get('metrics_blacklist', None):
-            self.config['metrics_blacklist'] = re.compile(
+            self.config['metrics_blacklist'] = compile_patterns(
                 self.config['metrics_blacklist'])
 
+        # Whitelist/blacklist decisions depend on the config
+        self._metric_filter = {}
+
     def get_default_config_help(self):
         """
         Returns the help text for the configuration options for this collector
@@ -250,10 +288,18 @@ class Collector(object):
             'enabled': 'Enable collecting these metrics',
             'byte_unit': 'Default numeric output(s)',
             'measure_collector_time': 'Collect the collector run time in ms',
-            'metrics_whitelist': 'Regex to match metrics to transmit. ' +
-                                 'Mutually exclusive with metrics_blacklist',
-            'metrics_blacklist': 'Regex to match metrics to block. ' +
-                                 'Mutually exclusive with metrics_whitelist',
+            'measure_schedule_lag': 'Collect how late the collector run ' +
+                                    'started in ms',
+            'metrics_whitelist': 'Regex, or list of regexes, to match ' +
+                                 'metrics to transmit. Mutually exclusive ' +
+                                 'with metrics_blacklist',
+            'metrics_blacklist': 'Regex, or list of regexes, to match ' +
+                                 'metrics to block. Mutually exclusive ' +
+                                 'with metrics_whitelist',
+            'max_workers': 'Maximum number of instances collected ' +
+                           'concurrently, by the collectors supporting it',
+            'task_timeout': 'Seconds to wait for each instance collected ' +
+                            'concurrently, 0 for half the interval',
         }
 
     def get_default_config(self):
@@ -301,11 +347,20 @@ class Collector(object):
             # Collect the collector run time in ms
             'measure_collector_time': False,
 
+            # Collect how late the collector run started in ms
+            'measure_schedule_lag': False,
+
             # Whitelist of metrics to let through
             'metrics_whitelist': None,
 
             # Blacklist of metrics to let through
             'metrics_blacklist': None,
+
+            # Maximum number of instances collected concurrently
+            'max_workers': 8,
+
+            # Seconds to wait for each instance collected concurrently
+            'task_timeout': 0,
         }
 
     def get_metric_path(self, name, instance=None):
@@ -315,6 +370,16 @@ class Collector(object):
             virtual machine and should have a different
             root prefix.
         """
+        key = (name, instance)
+        path = self._metric_paths.get(key)
+        if path is None:
+            if len(self._metric_paths) >= METRIC_PATH_CACHE_SIZE:
+                self._metric_paths = {}
+            path = self._build_metric_path(name, instance)
+            self._metric_paths[key] = path
+        return path
+
+    def _build_metric_path(self, name, instance=None):
         if 'path' in self.config:
             path = self.config['path']
         else:
@@ -371,12 +436,14 @@ class Collector(object):
         Publish a metric with the given name
         """
         # Check whitelist/blacklist
-        if self.config['metrics_whitelist']:
-            if not self.config['metrics_whitelist'].match(name):
-                return
-        elif self.config['metrics_blacklist']:
-            if self.config['metrics_blacklist'].match(name):
-                return
+        allowed = self._metric_filter.get(name)
+        if allowed is None:
+            allowed = self.is_metric_allowed(name)
+            if len(self._metric_filter) >= METRIC_FILTER_CACHE_SIZE:
+                self._metric_filter = {}
+            self._metric_filter[name] = allowed
+        if not allowed:
+            return
 
         # Get metric Path
         path = self.get_metric_path(name, instance=instance)
@@ -398,10 +465,26 @@ class Collector(object):
         # Publish Metric
         self.publish_metric(metric)
 
+    def is_metric_allowed(self, name):
+        """
+        Check a metric name against the whitelist/blacklist
+        """
+        if self.config['metrics_whitelist']:
+            return bool(self.config['metrics_whitelist'].match(name))
+        elif self.config['metrics_blacklist']:
+            return not self.config['metrics_blacklist'].match(name)
+        return True
+
     def publish_metric(self, metric):
         """
         Publish a Metric object
         """
+        # Hold back the metrics of a run_concurrently task until it is done
+        pending = getattr(self._local, 'metrics', None)
+        if pending is not None:
+            pending.append(metric)
+            return
+
         # Process Metric
         for handler in self.handlers:
             handler._process(metric)
@@ -422,50 +505,207 @@ class Collector(object):
                             precision=precision, metric_type='COUNTER',
                             instance=instance)
 
+    def publish_counters(self, metrics, precision=0, max_value=0,
+                         time_delta=True, interval=None, allow_negative=False,
+                         instance=None):
+        """
+        Publish the derivatives of a dict of counters, computed in one pass.
+        max_value may be a single value or a dict keyed by metric name.
+        """
+        names = metrics.keys()
+        raw_values = [metrics[name] for name in names]
+
+        if isinstance(max_value, dict):
+            max_value = [max_value.get(name, 0) for name in names]
+
+        values = self.derivative_many(names, raw_values, max_values=max_value,
+                                      time_delta=time_delta,
+                                      interval=interval,
+                                      allow_negative=allow_negative,
+                                      instance=instance)
+
+        for name, value, raw_value in izip(names, values, raw_values):
+            self.publish(name, value, raw_value=raw_value,
+                         precision=precision, metric_type='COUNTER',
+                         instance=instance)
+
     def derivative(self, name, new, max_value=0,
                    time_delta=True, interval=None,
                    allow_negative=False, instance=None):
         """
         Calculate the derivative of the metric.
         """
-        # Format Metric Path
-        path = self.get_metric_path(name, instance=instance)
+        return self.derivative_many([name], [new], max_values=max_value,
+                                    time_delta=time_delta, interval=interval,
+                                    allow_negative=allow_negative,
+                                    instance=instance)[0]
+
+    def derivative_many(self, names, values, max_values=0,
+                        time_delta=True, interval=None,
+                        allow_negative=False, instance=None):
+        """
+        Calculate the derivatives of many metrics in one pass. max_values may
+        be a single value or a sequence matching names.
+        """
+        # If we pass in a interval, use it rather then the configured one
+        if interval is None:
+            interval = int(self.config['interval'])
+
+        # Get Change in Y (time)
+        if time_delta:
+            derivative_y = float(interval)
+        else:
+            derivative_y = 1.0
+
+        if not isinstance(max_values, (list, tuple)):
+            max_values = repeat(max_values)
+
+        last_values = self.last_values
+        get_metric_path = self.get_metric_path
+        results = []
+
+        for name, new, max_value in izip(names, values, max_values):
+            # Format Metric Path
+            path = get_metric_path(name, instance)
+
+            old = last_values.get(path)
+
+            # Store Old Value
+            last_values[path] = new
+
+            if old is None:
+                results.append(0)
+                continue
 
-        if path in self.last_values:
-            old = self.last_values[path]
             # Check for rollover
             if new < old:
                 old = old - max_value
-            # Get Change in X (value)
-            derivative_x = new - old
-
-            # If we pass in a interval, use it rather then the configured one
-            if interval is None:
-                interval = int(self.config['interval'])
 
-            # Get Change in Y (time)
-            if time_delta:
-                derivative_y = interval
-            else:
-                derivative_y = 1
-
-            result = float(derivative_x) / float(derivative_y)
+            # Get Change in X (value)
+            result = float(new - old) / derivative_y
             if result < 0 and not allow_negative:
                 result = 0
-        else:
-            result = 0
-
-        # Store Old Value
-        self.last_values[path] = new
+            results.append(result)
 
-        # Return result
-        return result
+        return results
 
-    def _run(self):
+    def run_concurrently(self, func, args_list, max_workers=None,
+                         timeout=None):
+        """
+        Call func with each tuple of arguments in args_list from a pool of at
+        most max_workers threads, so the collection takes as long as the
+        slowest call rather than the sum of them.
+
+        The metrics published by a call are held back and published from the
+        calling thread once it returns. Calls raising an exception are logged,
+        calls running longer than timeout seconds are logged and their
+        metrics dropped. Returns the results in the order of args_list, None
+        for the failed calls.
+        """
+        args_list = list(args_list)
+        if max_workers is None:
+            max_workers = int(self.config['max_workers'])
+        if timeout is None:
+            timeout = float(self.config['task_timeout'])
+            if timeout <= 0:
+                timeout = float(self.config['interval']) / 2
+        results = [None] * len(args_list)
+
+        if max_workers <= 1 or len(args_list) <= 1:
+            for i, args in enumerate(args_list):
+                try:
+                    results[i] = func(*args)
+                except Exception:
+                    self.log.exception('%s: Failed to collect %r', self.name,
+                                       args)
+            return results
+
+        tasks = Queue.Queue()
+        for i, args in enumerate(args_list):
+            tasks.put((i, args))
+        done = Queue.Queue()
+        started = {}
+
+        def work():
+            while True:
+                try:
+                    i, args = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+
+                metrics = []
+                self._local.metrics = metrics
+                started[i] = time.time()
+                try:
+                    result = func(*args)
+                except Exception:
+                    self.log.exception('%s: Failed to collect %r', self.name,
+                                       args)
+                    result = None
+                done.put((i, result, metrics))
+
+        def start_worker():
+            thread = threading.Thread(target=work,
+                                      name='%s-worker' % self.name)
+            # A timed out call must not keep the process alive
+            thread.daemon = True
+            thread.start()
+
+        for _ in xrange(min(max_workers, len(args_list))):
+            start_worker()
+
+        remaining = set(xrange(len(args_list)))
+        while remaining:
+            now = time.time()
+            deadlines = []
+            for i, start in started.items():
+                if i not in remaining:
+                    continue
+                if now - start >= timeout:
+                    self.log.error('%s: Collecting %r timed out after %0.1f '
+                                   'seconds', self.name, args_list[i],
+                                   timeout)
+                    remaining.discard(i)
+                    # The stuck thread is abandoned, replace it
+                    start_worker()
+                else:
+                    deadlines.append(start + timeout)
+            if not remaining:
+                break
+
+            # Wake up in time for the next deadline. Waiting on a queue
+            # without a timeout can not be interrupted by the collector alarm
+            if deadlines:
+                wait = min(max(min(deadlines) - now, 0.01), 1.0)
+            else:
+                wait = 1.0
+            try:
+                i, result, metrics = done.get(timeout=wait)
+            except Queue.Empty:
+                continue
+
+            if i not in remaining:
+                # Late result of a call that timed out
+                continue
+            remaining.discard(i)
+            results[i] = result
+            for metric in metrics:
+                self.publish_metric(metric)
+
+        return results
+
+    def _run(self, schedule_lag=None):
         """
         Run the collector unless it's already running
         """
         try:
+            if schedule_lag is not None:
+                self.log.debug('Collection started %0.3f seconds late',
+                               schedule_lag)
+                if self.config.get('measure_schedule_lag'):
+                    self.publish('collector_schedule_lag_ms',
+                                 int(max(schedule_lag, 0) * 1000))
+
             start_time = time.time()
 
             # Collect Data
@@ -49,6 +49,12 @@ class Handler(object):
             'get_default_config_help': 'get_default_config_help',
             'server_error_interval': ('How frequently to send repeated server '
                                       'errors'),
+            'worker': ('Process metrics in a dedicated thread, so a slow '
+                       'handler does not hold up the others'),
+            'worker_queue_size': ('Maximum number of metric batches waiting '
+                                  'for the worker thread'),
+            'worker_policy': ('What to do when the worker queue is full, '
+                              'drop the batch or block'),
         }
 
     def get_default_config(self):
@@ -58,6 +64,9 @@ class Handler(object):
         return {
             'get_default_config': 'get_default_config',
             'server_error_interval': 120,
+            'worker': False,
+            'worker_queue_size': 100,
+            'worker_policy': 'drop',
         }
 
     def _process(self, metric):
@@ -147,3 +156,89 @@ class Handler(object):
             del self._errors[msg]
         else:
             self._errors = {}
+
+
+class BatchMixin(object):
+    """
+    Buffers the lines of a handler and sends them with one _send call once
+    batch lines, batch_max_bytes bytes or batch_max_interval seconds worth
+    are buffered, and on flush. Mix in before Handler and call _init_batch
+    from __init__.
+    """
+
+    def _init_batch(self):
+        """
+        Initialize the buffer and the batch options
+        """
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.buffer_timestamp = None
+
+        self.batch_size = int(self.config['batch'])
+        self.batch_max_bytes = int(self.config['batch_max_bytes'])
+        self.batch_max_interval = float(self.config['batch_max_interval'])
+
+    def get_default_config_help(self):
+        """
+        Returns the help text for the batch options
+        """
+        config = super(BatchMixin, self).get_default_config_help()
+
+        config.update({
+            'batch': 'How many metrics to store before sending',
+            'batch_max_bytes': 'How many bytes to store before sending',
+            'batch_max_interval': 'How many seconds to store metrics ' +
+                                  'before sending',
+        })
+
+        return config
+
+    def get_default_config(self):
+        """
+        Return the default batch options
+        """
+        config = super(BatchMixin, self).get_default_config()
+
+        config.update({
+            'batch': 100,
+            'batch_max_bytes': 65536,
+            'batch_max_interval': 10,
+        })
+
+        return config
+
+    def flush(self):
+        """
+        Send the buffered lines
+        """
+        if self.buffer:
+            data = ''.join(self.buffer)
+            self.buffer = []
+            self.buffer_bytes = 0
+            self._send(data)
+
+    def _buffer(self, line):
+        """
+        Buffer a line, sending the buffer once it is due
+        """
+        if self.buffer and self.buffer_bytes + len(line) > self.batch_max_bytes:
+            self.flush()
+        if not self.buffer:
+            self.buffer_timestamp = time.time()
+
+        self.buffer.append(line)
+        self.buffer_bytes += len(line)
+
+        if (len(self.buffer) >= self.batch_size
+                or self.buffer_bytes >= self.batch_max_bytes
+                or time.time() - self.buffer_timestamp >=
+                self.batch_max_interval):
+            self.flush()
+
+    def _send(self, data):
+        """
+        Send a batch of lines
+
+        Should be overridden in subclasses
+        """
+        raise NotImplementedError
@@ -32,13 +32,20 @@ metric = 05
 namespace = MachineLoad
 name = Avg05
 unit = None
+
+Matching datapoints are buffered and sent on every flush, in requests of up
+to 20 datapoints, from a background thread unless async_dispatch is False.
 """
 
 import sys
 import datetime
+import threading
+import Queue
 
 from Handler import Handler
 from configobj import Section
+from diamond.utils.config import str_to_bool
+from diamond.utils.process import ProcessLocal
 
 try:
     import boto
@@ -47,6 +54,9 @@ try:
 except ImportError:
     boto = None
 
+# Maximum number of datapoints accepted by a PutMetricData request
+MAX_DATAPOINTS_PER_REQUEST = 20
+
 
 class cloudwatchHandler(Handler):
     """
@@ -69,6 +79,13 @@ class cloudwatchHandler(Handler):
 
         # Initialize Data
         self.connection = None
+        # Datapoints waiting for the next flush, per namespace
+        self.datapoints = {}
+        self.async_dispatch = str_to_bool(self.config['async_dispatch'])
+        self.queue_size = int(self.config['queue_size'])
+        # Queue of the background thread, started on first use in each
+        # process
+        self.queue = ProcessLocal()
 
         # Initialize Options
         self.region = self.config['region']
@@ -83,6 +100,8 @@ class cloudwatchHandler(Handler):
                              'name', 'unit')
 
         self.rules = []
+        # Rules indexed by (collector, metric)
+        self.rules_index = {}
         for key_name, section in self.config.items():
             if section.__class__ is Section:
                 keys = section.keys()
@@ -95,6 +114,9 @@ class cloudwatchHandler(Handler):
                         rules[key] = section[key]
 
                 self.rules.append(rules)
+                if 'collector' in rules and 'metric' in rules:
+                    key = (str(rules['collector']), str(rules['metric']))
+                    self.rules_index.setdefault(key, []).append(rules)
 
         # Create CloudWatch Connection
         self._bind()
@@ -112,6 +134,9 @@ class cloudwatchHandler(Handler):
             'name': '',
             'unit': '',
             'collector': '',
+            'async_dispatch': 'Send the datapoints from a background thread',
+            'queue_size': 'Maximum number of requests waiting for the ' +
+                          'background thread',
         })
 
         return config
@@ -129,6 +154,8 @@ class cloudwatchHandler(Handler):
             'namespace': 'MachineLoad',
             'name': 'Avg01',
             'unit': 'None',
+            'async_dispatch': True,
+            'queue_size': 100,
         })
 
         return config
@@ -160,56 +187,83 @@ class cloudwatchHandler(Handler):
 
     def process(self, metric):
         """
-          Process a metric and send it to CloudWatch
+          Process a metric, buffering it for CloudWatch if a rule matches
         """
         if not boto:
             return
 
-        collector = str(metric.getCollectorPath())
-        metricname = str(metric.getMetricPath())
+        rules = self.rules_index.get((metric.getCollectorPath(),
+                                      metric.getMetricPath()))
+        if not rules:
+            return
+
         timestamp = datetime.datetime.fromtimestamp(metric.timestamp)
+        for rule in rules:
+            self.datapoints.setdefault(str(rule['namespace']), []).append(
+                (str(rule['name']), str(metric.value), timestamp,
+                 str(rule['unit'])))
 
-        # Send the data as ......
+    def flush(self):
+        """
+          Send the buffered datapoints to CloudWatch
+        """
+        if not boto or not self.datapoints:
+            return
 
-        for rule in self.rules:
+        datapoints = self.datapoints
+        self.datapoints = {}
+        for namespace, points in datapoints.iteritems():
+            for i in xrange(0, len(points), MAX_DATAPOINTS_PER_REQUEST):
+                request = (namespace, points[i:i + MAX_DATAPOINTS_PER_REQUEST])
+                if self.async_dispatch:
+                    self._dispatch(request)
+                else:
+                    self._publish(*request)
+
+    def _dispatch(self, request):
+        """
+          Queue a request for the background thread
+        """
+        queue = self.queue.get(self._start_worker)
+        try:
+            queue.put_nowait(request)
+        except Queue.Full:
+            self.log.error("CloudWatch: Request queue is full, dropping %d "
+                           "datapoints", len(request[1]))
+
+    def _start_worker(self):
+        queue = Queue.Queue(self.queue_size)
+        thread = threading.Thread(target=self._work, args=(queue,),
+                                  name='cloudwatchHandler')
+        thread.daemon = True
+        thread.start()
+        return queue
+
+    def _work(self, queue):
+        while True:
+            namespace, points = queue.get()
+            try:
+                self._publish(namespace, points)
+            except Exception:
+                self.log.exception("CloudWatch: Unexpected error")
+
+    def _publish(self, namespace, points):
+        """
+          Send datapoints of a namespace in a single PutMetricData request
+        """
+        names, values, timestamps, units = zip(*points)
+        try:
+            self.connection.put_metric_data(
+                namespace, list(names), list(values), list(timestamps),
+                list(units), [{'InstanceID': self.instance_id}] * len(points))
             self.log.debug(
-                "Comparing Collector: [%s] with (%s) "
-                "and Metric: [%s] with (%s)",
-                str(rule['collector']),
-                collector,
-                str(rule['metric']),
-                metricname
-                )
-
-            if (str(rule['collector']) == collector
-                    and str(rule['metric']) == metricname):
-                self.log.debug(
-                    "CloudWatch: Attempting to publish metric: %s to %s "
-                    "with value (%s) @%s",
-                    rule['name'],
-                    rule['namespace'],
-                    str(metric.value),
-                    str(metric.timestamp)
-                    )
-                try:
-                    self.connection.put_metric_data(
-                        str(rule['namespace']),
-                        str(rule['name']),
-                        str(metric.value),
-                        timestamp, str(rule['unit']),
-                        {'InstanceID': self.instance_id})
-                    self.log.debug(
-                        "CloudWatch: Successfully published metric: %s to"
-                        " %s with value (%s)",
-                        rule['name'],
-                        rule['namespace'],
-                        str(metric.value)
-                        )
-                except AttributeError, e:
-                    self.log.error(
-                        "CloudWatch: Failed publishing - %s ", str(e))
-                except Exception:  # Rough connection re-try logic.
-                    self.log.error(
-                        "CloudWatch: Failed publishing - %s ",
-                        str(sys.exc_info()[0]))
-                    self._bind()
+                "CloudWatch: Successfully published %d datapoints to %s",
+                len(points), namespace)
+        except AttributeError, e:
+            self.log.error(
+                "CloudWatch: Failed publishing - %s ", str(e))
+        except Exception:  # Rough connection re-try logic.
+            self.log.error(
+                "CloudWatch: Failed publishing - %s ",
+                str(sys.exc_info()[0]))
+            self._bind()
@@ -0,0 +1,399 @@
+# coding=utf-8
+
+"""
+Non blocking connections for the line protocol handlers.
+
+An AsyncConnection buffers the data handed to it and returns immediately.
+A single background EventLoop thread per process connects, writes the
+buffered data as the sockets become writable and reconnects with an
+exponential backoff, so a dead endpoint never stalls the handler process.
+Host names are resolved from a short lived thread and the address is cached
+until the connection fails, so a slow resolver does not stall it either.
+"""
+
+import errno
+import fcntl
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+from diamond.utils.process import ProcessLocal
+
+# Errors meaning a non blocking operation has to be retried later
+_RETRY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS,
+                 errno.EALREADY)
+
+# Maximum number of bytes to hand to the kernel per send call
+_SEND_SIZE = 65536
+
+
+class EventLoop(threading.Thread):
+    """
+    Background thread multiplexing all the AsyncConnections of a process
+    """
+
+    _loop = ProcessLocal()
+
+    @classmethod
+    def get(cls):
+        """
+        Returns the event loop of the current process, starting it if needed
+        """
+        return cls._loop.get(cls._start)
+
+    @classmethod
+    def _start(cls):
+        loop = cls()
+        loop.start()
+        return loop
+
+    def __init__(self):
+        threading.Thread.__init__(self, name='EventLoop')
+        self.daemon = True
+        self.log = logging.getLogger('diamond')
+        self.connections = set()
+        self.lock = threading.Lock()
+
+        # Pipe used to wake up select when data is queued
+        self._wake_read, self._wake_write = os.pipe()
+        for fd in (self._wake_read, self._wake_write):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def register(self, connection):
+        with self.lock:
+            self.connections.add(connection)
+        self.wake()
+
+    def unregister(self, connection):
+        with self.lock:
+            self.connections.discard(connection)
+        self.wake()
+
+    def wake(self):
+        try:
+            os.write(self._wake_write, 'x')
+        except OSError:
+            # The pipe is full, the loop is already due to wake up
+            pass
+
+    def run(self):
+        while True:
+            try:
+                self.poll(1.0)
+            except Exception:
+                self.log.exception('EventLoop: Unexpected error')
+                time.sleep(1)
+
+    def poll(self, timeout):
+        """
+        Run one iteration of the loop
+        """
+        now = time.time()
+        with self.lock:
+            connections = list(self.connections)
+
+        readers = [self._wake_read]
+        writers = []
+        for connection in connections:
+            connection.maintain(now)
+            if connection.socket is None:
+                continue
+            if connection.stream:
+                readers.append(connection)
+            if connection.connecting or connection.pending():
+                writers.append(connection)
+
+        try:
+            readable, writable, _ = select.select(readers, writers, [],
+                                                  timeout)
+        except (select.error, socket.error, ValueError):
+            # A socket was closed under us, try again on the next iteration
+            return
+
+        for connection in readable:
+            if connection is self._wake_read:
+                try:
+                    os.read(self._wake_read, 4096)
+                except OSError:
+                    pass
+            else:
+                connection.handle_read()
+
+        for connection in writable:
+            connection.handle_write()
+
+
+class AsyncConnection(object):
+    """
+    A buffered, non blocking, automatically reconnecting client connection
+    """
+
+    def __init__(self, host, port, proto='tcp', max_buffer_size=4194304,
+                 backoff_min=1, backoff_max=60, name='AsyncConnection',
+                 log=None):
+        if log is None:
+            self.log = logging.getLogger('diamond')
+        else:
+            self.log = log
+
+        self.host = host
+        self.port = int(port)
+        self.proto = proto.lower().strip()
+        self.stream = not self.proto.startswith('udp')
+        self.max_buffer_size = int(max_buffer_size)
+        self.backoff_min = float(backoff_min)
+        self.backoff_max = float(backoff_max)
+        self.name = name
+
+        self.lock = threading.Lock()
+        self.chunks = deque()
+        self.buffer_size = 0
+        # Whether the first chunk was partially sent
+        self.partial = False
+        # Number of sends refused because the buffer was full
+        self.dropped = 0
+
+        self.socket = None
+        self.connecting = False
+        self.connected = False
+        # Resolved (family, socktype, proto, address), None until resolved
+        self.address = None
+        self.resolving = False
+        self.backoff = self.backoff_min
+        self.next_connect = 0
+        self.loop = None
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def pending(self):
+        """
+        Returns the number of bytes waiting to be sent
+        """
+        return self.buffer_size
+
+    def send(self, data):
+        """
+        Queue data to be sent. Returns False if the buffer is full.
+        """
+        if not data:
+            return True
+
+        self._register()
+
+        with self.lock:
+            if self.buffer_size + len(data) > self.max_buffer_size:
+                self.dropped += 1
+                return False
+            self.chunks.append(data)
+            self.buffer_size += len(data)
+
+        self.loop.wake()
+        return True
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.unregister(self)
+            self.loop = None
+        with self.lock:
+            self._close()
+
+    def _register(self):
+        loop = EventLoop.get()
+        if loop is not self.loop:
+            # First use, or we were forked and the socket belongs to the
+            # parent process
+            with self.lock:
+                self._close()
+                self.next_connect = 0
+                self.resolving = False
+            self.loop = loop
+            loop.register(self)
+
+    def _close(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+        self.socket = None
+        self.connecting = False
+        self.connected = False
+
+    def _failed(self, reason):
+        """
+        Close the socket and schedule a reconnection
+        """
+        if self.connected or self.backoff == self.backoff_min:
+            self.log.error('%s: Connection to %s:%d failed, retrying in '
+                           '%0.1f seconds. %s', self.name, self.host,
+                           self.port, self.backoff, reason)
+        self._close()
+        # Resolve the host again, in case it moved
+        self.address = None
+
+        # The receiving end got the start of a line, drop the rest of it
+        # but keep the complete lines queued after it
+        if self.partial and self.chunks:
+            chunk = self.chunks.popleft()
+            end = chunk.find('\n') + 1
+            if 0 < end < len(chunk):
+                self.chunks.appendleft(chunk[end:])
+                self.buffer_size -= end
+            else:
+                self.buffer_size -= len(chunk)
+        self.partial = False
+
+        self.next_connect = time.time() + self.backoff
+        self.backoff = min(self.backoff * 2, self.backoff_max)
+
+    def _connected(self):
+        self.connecting = False
+        self.connected = True
+        self.backoff = self.backoff_min
+        self.log.debug('%s: Established connection to %s:%d', self.name,
+                       self.host, self.port)
+
+    def maintain(self, now):
+        """
+        Start connecting if we are not connected and the backoff expired
+        """
+        with self.lock:
+            if self.socket is not None or now < self.next_connect:
+                return
+            if self.address is None:
+                if not self.resolving:
+                    self.resolving = True
+                    thread = threading.Thread(target=self._resolve,
+                                              name='%s-resolve' % self.name)
+                    thread.daemon = True
+                    thread.start()
+                return
+            family, socktype, proto, address = self.address
+
+        # Connecting does not block, but keep the lock free for send anyway
+        try:
+            sock = socket.socket(family, socktype, proto)
+            sock.setblocking(0)
+            error = sock.connect_ex(address)
+        except socket.error, ex:
+            with self.lock:
+                self._failed(ex)
+            return
+
+        with self.lock:
+            if self.loop is None:
+                # Closed while connecting
+                sock.close()
+                return
+            self.socket = sock
+            if error == 0:
+                self._connected()
+            elif error in _RETRY_ERRORS:
+                self.connecting = True
+            else:
+                self._failed(os.strerror(error))
+
+    def _resolve(self):
+        """
+        Resolve the host without holding the lock or the event loop
+        """
+        if self.stream:
+            socktype = socket.SOCK_STREAM
+        else:
+            socktype = socket.SOCK_DGRAM
+
+        if self.proto[-1] == '4':
+            family = socket.AF_INET
+        elif self.proto[-1] == '6':
+            family = socket.AF_INET6
+        else:
+            family = socket.AF_UNSPEC
+
+        try:
+            addrinfo = socket.getaddrinfo(self.host, self.port, family,
+                                          socktype)
+            family, socktype, proto, _, address = addrinfo[0]
+        except (socket.error, socket.gaierror, IndexError), ex:
+            with self.lock:
+                self.resolving = False
+                self._failed(ex)
+            return
+
+        with self.lock:
+            self.resolving = False
+            self.address = (family, socktype, proto, address)
+
+        loop = self.loop
+        if loop is not None:
+            loop.wake()
+
+    def handle_read(self):
+        with self.lock:
+            if self.socket is None:
+                return
+            try:
+                data = self.socket.recv(4096)
+            except socket.error, ex:
+                if ex.args[0] not in _RETRY_ERRORS:
+                    self._failed(ex)
+                return
+            if not data:
+                self._failed('Connection closed by peer')
+
+    def handle_write(self):
+        with self.lock:
+            if self.socket is None:
+                return
+
+            if self.connecting:
+                error = self.socket.getsockopt(socket.SOL_SOCKET,
+                                               socket.SO_ERROR)
+                if error:
+                    self._failed(os.strerror(error))
+                    return
+                self._connected()
+
+            while self.chunks:
+                # Coalesce small writes into a single send call, keeping a
+                # partially sent chunk apart so a failure only drops its
+                # truncated line
+                if (self.stream and not self.partial
+                        and len(self.chunks) > 1):
+                    if len(self.chunks[0]) < _SEND_SIZE:
+                        size = 0
+                        merged = []
+                        while self.chunks and size < _SEND_SIZE:
+                            chunk = self.chunks.popleft()
+                            merged.append(chunk)
+                            size += len(chunk)
+                        self.chunks.appendleft(''.join(merged))
+
+                chunk = self.chunks[0]
+                try:
+                    sent = self.socket.send(chunk[:_SEND_SIZE])
+                except socket.error, ex:
+                    if ex.args[0] in _RETRY_ERRORS:
+                        return
+                    if not self.stream:
+                        # Datagrams are fire and forget, drop this one
+                        self.chunks.popleft()
+                        self.buffer_size -= len(chunk)
+                        continue
+                    self._failed(ex)
+                    return
+
+                if self.stream and sent < len(chunk):
+                    self.chunks[0] = chunk[sent:]
+                    self.buffer_size -= sent
+                    self.partial = True
+                    return
+
+                self.chunks.popleft()
+                self.buffer_size -= len(chunk)
+                self.partial = False
@@ -4,9 +4,8 @@ Operations and Development teams who write and run applications
 at scale, and want to turn the massive amounts of data produced
 by their apps, tools and services into actionable insight.
 
-#### Dependencies
-
-  * [dogapi]
+Metrics are posted in batches to the series API with the shared persistent
+http client.
 
 #### Configuration
 
@@ -21,14 +20,14 @@ Enable handler
 """
 
 from Handler import Handler
+from httpclient import HttpClient
+from httpclient import HTTP_CLIENT_CONFIG
+from httpclient import HTTP_CLIENT_CONFIG_HELP
+import json
 import logging
+import urllib
 from collections import deque
 
-try:
-    import dogapi
-except ImportError:
-    dogapi = None
-
 
 class DatadogHandler(Handler):
 
@@ -40,14 +39,13 @@ class DatadogHandler(Handler):
         Handler.__init__(self, config)
         logging.debug("Initialized Datadog handler.")
 
-        if dogapi is None:
-            logging.error("Failed to load dogapi module.")
-            return
-
-        self.api = dogapi.dog_http_api
-        self.api.api_key = self.config.get('api_key', '')
-        self.queue_size = self.config.get('queue_size', 1)
+        self.url = '%s?%s' % (
+            self.config['url'],
+            urllib.urlencode({'api_key': self.config.get('api_key', '')}))
+        self.queue_size = int(self.config.get('queue_size', 1))
         self.queue = deque([])
+        self.client = HttpClient.from_config(self.config, 'DatadogHandler',
+                                             log=self.log)
 
     def get_default_config_help(self):
         """
@@ -55,9 +53,11 @@ class DatadogHandler(Handler):
         """
         config = super(DatadogHandler, self).get_default_config_help()
 
+        config.update(HTTP_CLIENT_CONFIG_HELP)
         config.update({
             'api_key': '',
-            'queue_size': '',
+            'queue_size': 'How many metrics to store before sending',
+            'url': 'Datadog series API endpoint',
         })
 
         return config
@@ -68,9 +68,11 @@ class DatadogHandler(Handler):
         """
         config = super(DatadogHandler, self).get_default_config()
 
+        config.update(HTTP_CLIENT_CONFIG)
         config.update({
             'api_key': '',
-            'queue_size': '',
+            'queue_size': 1,
+            'url': 'https://app.datadoghq.com/api/v1/series',
         })
 
         return config
@@ -93,9 +95,10 @@ class DatadogHandler(Handler):
 
     def _send(self):
         """
-        Take metrics from queue and send it to Datadog API
+        Take metrics from queue and send them to the Datadog API in one batch
         """
 
+        series = []
         while len(self.queue) > 0:
             metric = self.queue.popleft()
 
@@ -105,12 +108,16 @@ class DatadogHandler(Handler):
                 metric.getMetricPath()
             )
 
-            topic, value, timestamp = str(metric).split()
-            logging.debug(
-                "Sending.. topic[%s], value[%s], timestamp[%s]",
-                path,
-                value,
-                timestamp
-            )
+            series.append({
+                'metric': path,
+                'points': [[metric.timestamp, metric.value]],
+                'type': 'gauge',
+                'host': metric.host,
+            })
+
+        if not series:
+            return
 
-            self.api.metric(path, (timestamp, value), host=metric.host)
+        logging.debug("Sending %d metrics to Datadog", len(series))
+        self.client.post_async(self.url, json.dumps({'series': series}),
+                               {'Content-Type': 'application/json'})
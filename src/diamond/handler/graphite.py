@@ -17,7 +17,11 @@ use it.
 """
 
 from Handler import Handler
+from connection import AsyncConnection
+from spool import DiskSpool
+from diamond.utils.config import str_to_bool
 import socket
+import time
 
 
 class GraphiteHandler(Handler):
@@ -34,6 +38,7 @@ class GraphiteHandler(Handler):
 
         # Initialize Data
         self.socket = None
+        self.connection = None
 
         # Initialize Options
         self.proto = self.config['proto'].lower().strip()
@@ -51,6 +56,25 @@ class GraphiteHandler(Handler):
         self.scope_id = self.config['scope_id']
         self.metrics = []
 
+        # Spool metrics to disk while the server is unreachable
+        self.spool = None
+        if self.config['spool_path']:
+            self.spool = DiskSpool(self.config['spool_path'],
+                                   self.config['spool_segment_size'],
+                                   self.config['spool_max_size'],
+                                   log=self.log)
+        self.spool_drain_size = int(self.config['spool_drain_size'])
+        self.spool_metric = self.config['spool_metric']
+
+        # Hand the metrics to a background event loop rather than blocking
+        # on the socket
+        if str_to_bool(self.config['nonblocking']):
+            self.connection = AsyncConnection(
+                self.host, self.port, self.proto,
+                max_buffer_size=self.config['nonblocking_buffer_size'],
+                name=self.__class__.__name__, log=self.log)
+            return
+
         # Connect
         self._connect()
 
@@ -72,6 +96,19 @@ class GraphiteHandler(Handler):
             'keepaliveinterval': 'How frequently to send keepalives',
             'flow_info': 'IPv6 Flow Info',
             'scope_id': 'IPv6 Scope ID',
+            'spool_path': 'Directory to spool metrics to while the server ' +
+                          'is unreachable, instead of trimming the backlog',
+            'spool_segment_size': 'Size in bytes of each spool file',
+            'spool_max_size': 'Maximum size in bytes of the spool, the ' +
+                              'oldest metrics are dropped past it',
+            'spool_drain_size': 'How many bytes of spooled metrics to send ' +
+                                'per flush once the server is back',
+            'spool_metric': 'Metric path to report the spool size in ' +
+                            'bytes to, if set',
+            'nonblocking': 'Send from a background event loop, so an ' +
+                           'unreachable server never blocks the handler',
+            'nonblocking_buffer_size': 'Maximum size in bytes of the ' +
+                                       'nonblocking send buffer',
         })
 
         return config
@@ -94,6 +131,13 @@ class GraphiteHandler(Handler):
             'keepaliveinterval': 10,
             'flow_info': 0,
             'scope_id': 0,
+            'spool_path': '',
+            'spool_segment_size': 16777216,
+            'spool_max_size': 1073741824,
+            'spool_drain_size': 1048576,
+            'spool_metric': '',
+            'nonblocking': False,
+            'nonblocking_buffer_size': 4194304,
         })
 
         return config
@@ -102,6 +146,8 @@ class GraphiteHandler(Handler):
         """
         Destroy instance of the GraphiteHandler class
         """
+        if self.connection is not None:
+            self.connection.close()
         self._close()
 
     def process(self, metric):
@@ -115,11 +161,13 @@ class GraphiteHandler(Handler):
 
     def flush(self):
         """Flush metrics in queue"""
+        if self.spool is not None and self.spool_metric:
+            self._report_spool()
         self._send()
 
     def _send_data(self, data):
         """
-        Try to send all data in buffer.
+        Try to send all data in buffer. Returns False if it could not be sent.
         """
         try:
             self.socket.sendall(data)
@@ -132,8 +180,36 @@ class GraphiteHandler(Handler):
             try:
                 self.socket.sendall(data)
             except:
-                return
+                return False
             self._reset_errors()
+        return True
+
+    def _spool_metrics(self):
+        """
+        Move the metrics that could not be sent to the spool
+        """
+        try:
+            self.spool.write(''.join(self.metrics))
+            self.metrics = []
+        except (IOError, OSError), ex:
+            self._throttle_error("GraphiteHandler: Failed to spool metrics. "
+                                 "%s.", ex)
+
+    def _drain_spool(self):
+        """
+        Send part of the spooled metrics
+        """
+        data = self.spool.peek(self.spool_drain_size)
+        if data and self._send_data(data) is not False:
+            self.spool.consume(len(data))
+
+    def _report_spool(self):
+        """
+        Add the spool size to the metrics to send
+        """
+        self.metrics.append('%s %d %d\n' % (self.spool_metric,
+                                            self.spool.size(),
+                                            int(time.time())))
 
     def _send(self):
         """
@@ -142,16 +218,10 @@ class GraphiteHandler(Handler):
         # Check to see if we have a valid socket. If not, try to connect.
         try:
             try:
-                if self.socket is None:
-                    self.log.debug("GraphiteHandler: Socket is not connected. "
-                                   "Reconnecting.")
-                    self._connect()
-                if self.socket is None:
-                    self.log.debug("GraphiteHandler: Reconnect failed.")
+                if self.connection is not None:
+                    self._send_async()
                 else:
-                    # Send data to socket
-                    self._send_data(''.join(self.metrics))
-                    self.metrics = []
+                    self._send_blocking()
             except Exception:
                 self._close()
                 self._throttle_error("GraphiteHandler: Error sending metrics.")
@@ -167,6 +237,48 @@ class GraphiteHandler(Handler):
                               abs(trim_offset))
                 self.metrics = self.metrics[trim_offset:]
 
+    def _send_blocking(self):
+        """
+        Send the metrics over the blocking socket, reconnecting if needed
+        """
+        if self.socket is None:
+            self.log.debug("GraphiteHandler: Socket is not connected. "
+                           "Reconnecting.")
+            self._connect()
+        if self.socket is None:
+            self.log.debug("GraphiteHandler: Reconnect failed.")
+            if self.spool is not None:
+                self._spool_metrics()
+            return
+
+        # Send data to socket
+        sent = self._send_data(''.join(self.metrics))
+        if self.spool is not None:
+            if sent is False:
+                self._spool_metrics()
+            else:
+                self.metrics = []
+                self._drain_spool()
+        else:
+            self.metrics = []
+
+    def _send_async(self):
+        """
+        Queue the metrics on the nonblocking connection
+        """
+        if self.connection.send(''.join(self.metrics)):
+            self.metrics = []
+            # Only drain the spool once the connection caught up
+            if (self.spool is not None and self.connection.connected
+                    and not self.connection.pending()):
+                data = self.spool.peek(self.spool_drain_size)
+                if data and self.connection.send(data):
+                    self.spool.consume(len(data))
+        else:
+            self._throttle_error("GraphiteHandler: Send buffer is full.")
+            if self.spool is not None:
+                self._spool_metrics()
+
     def _connect(self):
         """
         Connect to the graphite server
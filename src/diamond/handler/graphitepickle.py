@@ -47,6 +47,12 @@ class GraphitePickleHandler(GraphiteHandler):
         # Initialize Options
         self.batch_size = int(self.config['batch'])
 
+        # The disk spool only handles the plaintext line protocol
+        if self.spool is not None:
+            self.log.error("GraphitePickleHandler: spool_path is not "
+                           "supported, disabling the spool")
+            self.spool = None
+
     def get_default_config_help(self):
         """
         Returns the help text for the configuration options for this handler
@@ -6,7 +6,7 @@ Send metrics to a http endpoint via POST
 
 #### Dependencies
 
- * urllib2
+ * httplib
 
 
 #### Configuration
@@ -19,7 +19,9 @@ Enable this handler
 """
 
 from Handler import Handler
-import urllib2
+from httpclient import HttpClient
+from httpclient import HTTP_CLIENT_CONFIG
+from httpclient import HTTP_CLIENT_CONFIG_HELP
 
 
 class HttpPostHandler(Handler):
@@ -30,6 +32,8 @@ class HttpPostHandler(Handler):
         self.metrics = []
         self.batch_size = int(self.config['batch'])
         self.url = self.config.get('url')
+        self.client = HttpClient.from_config(self.config, 'HttpPostHandler',
+                                             log=self.log)
 
     def get_default_config_help(self):
         """
@@ -37,6 +41,7 @@ class HttpPostHandler(Handler):
         """
         config = super(HttpPostHandler, self).get_default_config_help()
 
+        config.update(HTTP_CLIENT_CONFIG_HELP)
         config.update({
             'url': 'Fully qualified url to send metrics to',
             'batch': 'How many to store before sending to the graphite server',
@@ -50,6 +55,7 @@ class HttpPostHandler(Handler):
         """
         config = super(HttpPostHandler, self).get_default_config()
 
+        config.update(HTTP_CLIENT_CONFIG)
         config.update({
             'url': 'http://localhost/blah/blah/blah',
             'batch': 100,
@@ -69,6 +75,8 @@ class HttpPostHandler(Handler):
         self.post()
 
     def post(self):
-        req = urllib2.Request(self.url, "\n".join(self.metrics))
-        urllib2.urlopen(req)
-        self.metrics = []
+        if self.metrics:
+            self.client.post_async(
+                self.url, "\n".join(self.metrics),
+                {'Content-Type': 'application/x-www-form-urlencoded'})
+            self.metrics = []
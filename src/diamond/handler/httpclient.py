@@ -0,0 +1,251 @@
+# coding=utf-8
+
+"""
+A persistent HTTP client shared by the HTTP based handlers.
+
+Connections are kept alive and reused across batches, request bodies can be
+gzip compressed, failed requests are retried with an exponential backoff and
+posts can be handed to a pool of worker threads so a slow endpoint does not
+hold up the handler process. Retries only happen on the worker threads, a
+post made from the handler is tried once so the handler never sleeps.
+"""
+
+import errno
+import gzip
+import httplib
+import logging
+import Queue
+import socket
+import threading
+import time
+import urlparse
+from cStringIO import StringIO
+
+from diamond.utils.config import str_to_bool
+from diamond.utils.process import ProcessLocal
+
+# Options understood by HttpClient.from_config, merged into the handlers
+# default config
+HTTP_CLIENT_CONFIG = {
+    'timeout': 15,
+    'retries': 2,
+    'retry_backoff': 1,
+    'gzip': False,
+    'concurrency': 0,
+    'concurrency_queue_size': 100,
+}
+
+HTTP_CLIENT_CONFIG_HELP = {
+    'timeout': 'Request timeout (seconds)',
+    'retries': 'How many times the background threads retry a failed ' +
+               'request',
+    'retry_backoff': 'Seconds to wait before the first retry, doubled on ' +
+                     'each following retry',
+    'gzip': 'Compress the request bodies with gzip',
+    'concurrency': 'Number of threads posting in the background, 0 to post ' +
+                   'from the handler',
+    'concurrency_queue_size': 'Maximum number of requests waiting for the ' +
+                              'background threads',
+}
+
+
+# Errors of an idle keep alive connection the server has already closed
+STALE_CONNECTION_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+
+class HttpError(Exception):
+    pass
+
+
+def compress(data):
+    """
+    Returns data compressed with gzip
+    """
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+
+class HttpClient(object):
+
+    def __init__(self, timeout=15, retries=2, retry_backoff=1, gzip=False,
+                 concurrency=0, concurrency_queue_size=100,
+                 name='HttpClient', log=None):
+        if log is None:
+            self.log = logging.getLogger('diamond')
+        else:
+            self.log = log
+
+        self.timeout = float(timeout)
+        self.retries = int(retries)
+        self.retry_backoff = float(retry_backoff)
+        self.gzip = gzip
+        self.concurrency = int(concurrency)
+        self.concurrency_queue_size = int(concurrency_queue_size)
+        self.name = name
+
+        # Idle keep alive connections per (scheme, host:port)
+        self._idle = {}
+        self._lock = threading.Lock()
+
+        # Queue of the background posting threads, started on first use in
+        # each process
+        self._workers = ProcessLocal()
+
+    @classmethod
+    def from_config(cls, config, name, log=None):
+        """
+        Create a client from the HTTP_CLIENT_CONFIG options of a handler
+        """
+        return cls(timeout=config['timeout'],
+                   retries=config['retries'],
+                   retry_backoff=config['retry_backoff'],
+                   gzip=str_to_bool(config['gzip']),
+                   concurrency=config['concurrency'],
+                   concurrency_queue_size=config['concurrency_queue_size'],
+                   name=name, log=log)
+
+    def _get_connection(self, key):
+        """
+        Returns an idle connection, or a new one, and whether it was reused
+        """
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+
+        scheme, netloc = key
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        else:
+            connection = httplib.HTTPConnection(netloc, timeout=self.timeout)
+        return connection, False
+
+    def _release_connection(self, key, connection):
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def _is_stale(self, error):
+        """
+        Returns whether error means the server closed a kept alive connection
+        before answering, so the request can safely be sent again
+        """
+        if isinstance(error, httplib.BadStatusLine):
+            return True
+        if isinstance(error, socket.timeout):
+            return False
+        return (isinstance(error, socket.error) and
+                error.errno in STALE_CONNECTION_ERRNOS)
+
+    def post(self, url, body, headers=None, retries=None):
+        """
+        Post body to url, retrying failed requests up to retries times, the
+        client setting by default. Returns the response body and raises
+        HttpError once the retries are exhausted.
+        """
+        if retries is None:
+            retries = self.retries
+
+        parsed = urlparse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        headers = dict(headers or {})
+        if self.gzip:
+            body = compress(body)
+            headers['Content-Encoding'] = 'gzip'
+
+        attempt = 0
+        while True:
+            connection, reused = self._get_connection(key)
+            response = None
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (socket.error, httplib.HTTPException), e:
+                connection.close()
+                if reused and response is None and self._is_stale(e):
+                    # The server closed the idle connection, retry at once
+                    continue
+                error = HttpError('%s' % e)
+            else:
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._release_connection(key, connection)
+
+                if 200 <= response.status < 300:
+                    return data
+
+                error = HttpError('HTTP %d %s' % (response.status,
+                                                  response.reason))
+                # Client errors will not go away by retrying
+                if response.status < 500:
+                    raise error
+
+            if attempt >= retries:
+                raise error
+            time.sleep(self.retry_backoff * 2 ** attempt)
+            attempt += 1
+
+    def post_async(self, url, body, headers=None):
+        """
+        Post body to url from the background threads, or right away and
+        without retries when concurrency is 0. Errors are logged. Returns
+        False if the request failed or was dropped.
+        """
+        if self.concurrency <= 0:
+            return self._post(url, body, headers, retries=0)
+
+        queue = self._workers.get(self._start_workers)
+        try:
+            queue.put_nowait((url, body, headers))
+        except Queue.Full:
+            self.log.error('%s: Request queue is full, dropping request to '
+                           '%s', self.name, url)
+            return False
+        return True
+
+    def _post(self, url, body, headers, retries=None):
+        try:
+            self.post(url, body, headers, retries)
+        except HttpError, e:
+            self.log.error('%s: Failed to post to %s. %s', self.name, url, e)
+            return False
+        return True
+
+    def _start_workers(self):
+        # The idle connections belong to the parent process
+        self.close()
+        queue = Queue.Queue(self.concurrency_queue_size)
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work, args=(queue,),
+                                      name='%s-%d' % (self.name, i))
+            thread.daemon = True
+            thread.start()
+        return queue
+
+    def _work(self, queue):
+        while True:
+            url, body, headers = queue.get()
+            try:
+                self._post(url, body, headers)
+            except Exception:
+                self.log.exception('%s: Unexpected error', self.name)
+
+    def close(self):
+        """
+        Close the idle connections
+        """
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle = {}
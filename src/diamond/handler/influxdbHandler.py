@@ -9,10 +9,8 @@ v1.1 : force influxdb driver with SSL
 v1.2 : added a timer to delay influxdb writing in case of failure
        this whill avoid the 100% cpu loop when influx in not responding
        Sebastien Prune THOMAS - prune@lecentre.net
-
-- Dependency:
-    - influxdb client (pip install influxdb)
-      you need version > 0.1.6 for HTTPS (not yet released)
+v1.3 : post to the series http api with the shared persistent http client,
+       instead of the influxdb client which reconnects for every batch
 
 - enable it in `diamond.conf` :
 
@@ -31,13 +29,13 @@ database = graphite
 time_precision = s
 """
 
+import json
 import time
+import urllib
 from Handler import Handler
-
-try:
-    from influxdb.client import InfluxDBClient
-except ImportError:
-    InfluxDBClient = None
+from httpclient import HttpClient
+from httpclient import HTTP_CLIENT_CONFIG
+from httpclient import HTTP_CLIENT_CONFIG_HELP
 
 
 class InfluxdbHandler(Handler):
@@ -51,12 +49,6 @@ class InfluxdbHandler(Handler):
         # Initialize Handler
         Handler.__init__(self, config)
 
-        if not InfluxDBClient:
-            self.log.error('influxdb.client.InfluxDBClient import failed. '
-                           'Handler disabled')
-            self.enabled = False
-            return
-
         # Initialize Options
         if self.config['ssl'] == "True":
             self.ssl = True
@@ -74,12 +66,20 @@ class InfluxdbHandler(Handler):
 
         # Initialize Data
         self.batch = {}
-        self.influx = None
         self.batch_timestamp = time.time()
         self.time_multiplier = 1
 
-        # Connect
-        self._connect()
+        if self.ssl:
+            scheme = 'https'
+        else:
+            scheme = 'http'
+        self.url = '%s://%s:%d/db/%s/series?%s' % (
+            scheme, self.hostname, self.port, self.database,
+            urllib.urlencode({'u': self.username,
+                              'p': self.password,
+                              'time_precision': self.time_precision}))
+        self.client = HttpClient.from_config(self.config, 'InfluxdbHandler',
+                                             log=self.log)
 
     def get_default_config_help(self):
         """
@@ -87,6 +87,7 @@ class InfluxdbHandler(Handler):
         """
         config = super(InfluxdbHandler, self).get_default_config_help()
 
+        config.update(HTTP_CLIENT_CONFIG_HELP)
         config.update({
             'hostname': 'Hostname',
             'port': 'Port',
@@ -110,6 +111,7 @@ class InfluxdbHandler(Handler):
         """
         config = super(InfluxdbHandler, self).get_default_config()
 
+        config.update(HTTP_CLIENT_CONFIG)
         config.update({
             'hostname': 'localhost',
             'port': 8086,
@@ -159,67 +161,42 @@ class InfluxdbHandler(Handler):
         """
         Send data to Influxdb. Data that can not be sent will be kept in queued.
         """
-        # Check to see if we have a valid socket. If not, try to connect.
         try:
-                if self.influx is None:
-                    self.log.debug("InfluxdbHandler: Socket is not connected. "
-                                   "Reconnecting.")
-                    self._connect()
-                if self.influx is None:
-                    self.log.debug("InfluxdbHandler: Reconnect failed.")
-                else:
-                    # build metrics data
-                    metrics = []
-                    for path in self.batch:
-                        metrics.append({
-                            "points": self.batch[path],
-                            "name": path,
-                            "columns": ["time", "value"]})
-                    # Send data to influxdb
-                    self.log.debug("InfluxdbHandler: writing %d series of data",
-                                   len(metrics))
-                    self.influx.write_points(metrics,
-                                             time_precision=self.time_precision)
-
-                    # empty batch buffer
-                    self.batch = {}
-                    self.batch_count = 0
-                    self.time_multiplier = 1
+            # build metrics data
+            metrics = []
+            for path in self.batch:
+                metrics.append({
+                    "points": self.batch[path],
+                    "name": path,
+                    "columns": ["time", "value"]})
+            # Send data to influxdb
+            self.log.debug("InfluxdbHandler: writing %d series of data",
+                           len(metrics))
+            body = json.dumps(metrics)
+            headers = {'Content-Type': 'application/json'}
+            if self.client.concurrency > 0:
+                # Failures are retried and logged by the background threads
+                self.client.post_async(self.url, body, headers)
+            else:
+                # Tried once, the batch is kept and resent after the
+                # time_multiplier backoff below
+                self.client.post(self.url, body, headers, retries=0)
+
+            # empty batch buffer
+            self.batch = {}
+            self.batch_count = 0
+            self.time_multiplier = 1
 
         except Exception:
-                self._close()
-                if self.time_multiplier < 5:
-                    self.time_multiplier += 1
-                self._throttle_error(
-                    "InfluxdbHandler: Error sending metrics, waiting for %ds.",
-                    2**self.time_multiplier)
-                raise
-
-    def _connect(self):
-        """
-        Connect to the influxdb server
-        """
-
-        try:
-            # Open Connection
-            self.influx = InfluxDBClient(self.hostname, self.port,
-                                         self.username, self.password,
-                                         self.database, self.ssl)
-            # Log
-            self.log.debug("InfluxdbHandler: Established connection to "
-                           "%s:%d/%s.",
-                           self.hostname, self.port, self.database)
-        except Exception, ex:
-            # Log Error
-            self._throttle_error("InfluxdbHandler: Failed to connect to "
-                                 "%s:%d/%s. %s",
-                                 self.hostname, self.port, self.database, ex)
-            # Close Socket
-            self._close()
-            return
+            if self.time_multiplier < 5:
+                self.time_multiplier += 1
+            self._throttle_error(
+                "InfluxdbHandler: Error sending metrics, waiting for %ds.",
+                2**self.time_multiplier)
+            raise
 
     def _close(self):
         """
-        Close the socket = do nothing for influx which is http stateless
+        Close the idle connections
         """
-        self.influx = None
+        self.client.close()
@@ -2,10 +2,18 @@
 
 """
 Insert the collected values into a mysql table
+
+Metrics are buffered and written with a single multi-row INSERT per batch,
+in one transaction per flush.
 """
 
-from handler import Handler
-import MySQLdb
+from Handler import Handler
+import time
+
+try:
+    import MySQLdb
+except ImportError:
+    MySQLdb = None
 
 
 class MySQLHandler(Handler):
@@ -21,6 +29,11 @@ class MySQLHandler(Handler):
         # Initialize Handler
         Handler.__init__(self, config)
 
+        if MySQLdb is None:
+            self.log.error('MySQLdb import failed. Handler disabled')
+            self.enabled = False
+            return
+
         # Initialize Options
         self.hostname = self.config['hostname']
         self.port = int(self.config['port'])
@@ -31,6 +44,24 @@ class MySQLHandler(Handler):
         self.col_time = self.config['col_time']
         self.col_metric = self.config['col_metric']
         self.col_value = self.config['col_value']
+        self.batch_size = int(self.config['batch'])
+        self.batch_max_interval = float(self.config['batch_max_interval'])
+        self.max_backlog = (self.batch_size *
+                            int(self.config['max_backlog_multiplier']))
+        self.reconnect_interval_max = float(
+            self.config['reconnect_interval_max'])
+
+        # Initialize Data
+        self.metrics = []
+        self.batch_timestamp = time.time()
+        self.reconnect_interval = 0
+        self.next_connect = 0
+
+        # MySQLdb rewrites an executemany of this statement into a single
+        # multi-row INSERT
+        self.query = ("INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)"
+                      % (self.table, self.col_metric, self.col_time,
+                         self.col_value))
 
         # Connect
         self._connect()
@@ -42,6 +73,13 @@ class MySQLHandler(Handler):
         config = super(MySQLHandler, self).get_default_config_help()
 
         config.update({
+            'batch': 'How many metrics to store before inserting them',
+            'batch_max_interval': 'How many seconds to store metrics before ' +
+                                  'inserting them',
+            'max_backlog_multiplier': 'How many batches to keep while the ' +
+                                      'server is unreachable',
+            'reconnect_interval_max': 'Maximum number of seconds to wait ' +
+                                      'between reconnection attempts',
         })
 
         return config
@@ -53,6 +91,10 @@ class MySQLHandler(Handler):
         config = super(MySQLHandler, self).get_default_config()
 
         config.update({
+            'batch': 100,
+            'batch_max_interval': 10,
+            'max_backlog_multiplier': 10,
+            'reconnect_interval_max': 300,
         })
 
         return config
@@ -67,43 +109,98 @@ class MySQLHandler(Handler):
         """
         Process a metric
         """
-        # Just send the data
-        self._send(str(metric))
+        if not self.metrics:
+            self.batch_timestamp = time.time()
+
+        if isinstance(metric.precision, (int, long)):
+            precision = metric.precision
+        else:
+            precision = 0
+        self.metrics.append((metric.path, metric.timestamp,
+                             '%0.*f' % (precision, metric.value)))
+
+        if (len(self.metrics) >= self.batch_size
+                or time.time() - self.batch_timestamp >=
+                self.batch_max_interval):
+            self._send()
+
+    def flush(self):
+        """
+        Insert the buffered metrics
+        """
+        self._send()
 
-    def _send(self, data):
+    def _send(self):
         """
-        Insert the data
+        Insert the buffered metrics in a single transaction
         """
-        data = data.strip().split(' ')
+        if not self.metrics:
+            return
+
+        if self.conn is None and not self._connect():
+            self._trim_backlog()
+            return
+
         try:
             cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO %s (%s, %s, %s) VALUES(%%s, %%s, %%s)"
-                           % (self.table, self.col_metric,
-                              self.col_time, self.col_value),
-                           (data[0], data[2], data[1]))
-            cursor.close()
+            try:
+                for i in xrange(0, len(self.metrics), self.batch_size):
+                    cursor.executemany(self.query,
+                                       self.metrics[i:i + self.batch_size])
+            finally:
+                cursor.close()
             self.conn.commit()
-        except BaseException, e:
+            self.metrics = []
+        except MySQLdb.Error, e:
             # Log Error
-            self.log.error("MySQLHandler: Failed sending data. %s.", e)
-            # Attempt to restablish connection
-            self._connect()
+            self._throttle_error("MySQLHandler: Failed sending data. %s.", e)
+            # Reconnect on the next send
+            self._close()
+            self._trim_backlog()
+
+    def _trim_backlog(self):
+        """
+        Drop the oldest metrics past the backlog limit
+        """
+        if len(self.metrics) > self.max_backlog:
+            self.log.warn('MySQLHandler: Trimming backlog. Removing oldest %d '
+                          'metrics', len(self.metrics) - self.max_backlog)
+            self.metrics = self.metrics[-self.max_backlog:]
 
     def _connect(self):
         """
-        Connect to the MySQL server
+        Connect to the MySQL server, backing off exponentially between failed
+        attempts. Returns True if connected.
         """
+        if time.time() < self.next_connect:
+            return False
+
         self._close()
-        self.conn = MySQLdb.Connect(host=self.hostname,
-                                    port=self.port,
-                                    user=self.username,
-                                    passwd=self.password,
-                                    db=self.database)
+        try:
+            self.conn = MySQLdb.Connect(host=self.hostname,
+                                        port=self.port,
+                                        user=self.username,
+                                        passwd=self.password,
+                                        db=self.database)
+        except MySQLdb.Error, e:
+            self.reconnect_interval = min(max(self.reconnect_interval * 2, 1),
+                                          self.reconnect_interval_max)
+            self.next_connect = time.time() + self.reconnect_interval
+            self._throttle_error("MySQLHandler: Failed to connect, retrying "
+                                 "in %d seconds. %s.",
+                                 self.reconnect_interval, e)
+            return False
+
+        self.reconnect_interval = 0
+        return True
 
     def _close(self):
         """
         Close the connection
         """
         if self.conn:
-            self.conn.commit()
-            self.conn.close()
+            try:
+                self.conn.close()
+            except MySQLdb.Error:
+                pass
+        self.conn = None
@@ -6,6 +6,9 @@ do not try to use it as a normal handler
 """
 
 from Handler import Handler
+from Queue import Full
+
+from diamond.metric import encode_metrics
 
 
 class QueueHandler(Handler):
@@ -42,5 +45,9 @@ class QueueHandler(Handler):
         process per collector
         """
         if len(self.metrics) > 0:
-            self.queue.put(self.metrics, block=False)
+            try:
+                self.queue.put(encode_metrics(self.metrics), block=False)
+            except Full:
+                self.log.error('Metric queue is full, dropping %d metrics',
+                               len(self.metrics))
             self.metrics = []
@@ -15,16 +15,28 @@ It has these options:
  * `host` - The Riemann host to connect to.
  * `port` - The port it's on.
  * `transport` - Either `tcp` or `udp`. (default: `tcp`)
+ * `batch` - How many events to send per message. (default: `100`, at
+   most `20` over udp)
+ * `batch_max_interval` - How many seconds to hold events before sending
+   them. (default: `10`)
 
 """
 
 from Handler import Handler
 import logging
+import time
 try:
     import bernhard
 except ImportError:
     bernhard = None
 
+# Maximum number of events per message over udp, so a message fits in a
+# datagram
+UDP_MAX_BATCH_SIZE = 20
+
+# Maximum number of metric paths to remember the service name of
+SERVICE_CACHE_SIZE = 100000
+
 
 class RiemannHandler(Handler):
     def __init__(self, config=None):
@@ -39,6 +51,16 @@ class RiemannHandler(Handler):
         self.host = self.config['host']
         self.port = int(self.config['port'])
         self.transport = self.config['transport']
+        self.batch_size = int(self.config['batch'])
+        if self.transport != 'tcp':
+            self.batch_size = min(self.batch_size, UDP_MAX_BATCH_SIZE)
+        self.batch_max_interval = float(self.config['batch_max_interval'])
+
+        # Initialize Data
+        self.events = []
+        self.batch_timestamp = time.time()
+        # Service names per (path, host)
+        self.services = {}
 
         # Initialize client
         if self.transport == 'tcp':
@@ -57,6 +79,9 @@ class RiemannHandler(Handler):
             'host': '',
             'port': '',
             'transport': 'tcp or udp',
+            'batch': 'How many events to send per message',
+            'batch_max_interval': 'How many seconds to hold events before ' +
+                                  'sending them',
         })
 
         return config
@@ -71,31 +96,63 @@ class RiemannHandler(Handler):
             'host': '',
             'port': 123,
             'transport': 'tcp',
+            'batch': 100,
+            'batch_max_interval': 10,
         })
 
         return config
 
     def process(self, metric):
         """
-        Send a metric to Riemann.
+        Queue a metric for Riemann, sending the queued events once due.
+        """
+        if not self.events:
+            self.batch_timestamp = time.time()
+        self.events.append(self._metric_to_riemann_event(metric))
+
+        if (len(self.events) >= self.batch_size
+                or time.time() - self.batch_timestamp >=
+                self.batch_max_interval):
+            self._send()
+
+    def flush(self):
+        """
+        Send the queued events.
+        """
+        self._send()
+
+    def _send(self):
+        """
+        Send the queued events to Riemann in a single message.
         """
-        event = self._metric_to_riemann_event(metric)
+        if not self.events:
+            return
+
+        events = self.events
+        self.events = []
         try:
-            self.client.send(event)
+            self.client.transmit(bernhard.Message(
+                events=[bernhard.Event(params=event) for event in events]))
         except Exception, e:
-            self.log.error("RiemannHandler: Error sending event to Riemann: %s",
-                           e)
+            self.log.error("RiemannHandler: Error sending %d events to "
+                           "Riemann: %s", len(events), e)
 
     def _metric_to_riemann_event(self, metric):
         """
         Convert a metric to a dictionary representing a Riemann event.
         """
         # Riemann has a separate "host" field, so remove from the path.
-        path = '%s.%s.%s' % (
-            metric.getPathPrefix(),
-            metric.getCollectorPath(),
-            metric.getMetricPath()
-        )
+        key = (metric.path, metric.host)
+        path = self.services.get(key)
+        if path is None:
+            path = '%s.%s.%s' % (
+                metric.getPathPrefix(),
+                metric.getCollectorPath(),
+                metric.getMetricPath()
+            )
+            if len(self.services) >= SERVICE_CACHE_SIZE:
+                self.services.clear()
+            self.services[key] = path
 
         return {
             'host': metric.host,
@@ -2,14 +2,24 @@
 
 """
 Save stats in RRD files using rrdtool.
+
+The python rrdtool bindings are used when they are installed, otherwise the
+updates are piped to a single long lived `rrdtool -` process. Updates are
+coalesced per file and written for all files on every flush.
 """
 
+from __future__ import absolute_import
+
 import os
 import re
 import subprocess
-import Queue
 
-from Handler import Handler
+from diamond.handler.Handler import Handler
+
+try:
+    import rrdtool
+except ImportError:
+    rrdtool = None
 
 #
 # Constants for RRD file creation.
@@ -24,7 +34,10 @@ BASEDIR = '/var/lib/collectd/rrd'
 
 METRIC_STEP = 10
 
-BATCH_SIZE = 1
+BATCH_SIZE = 0
+
+# Number of commands written to the rrdtool pipe before reading the replies
+PIPE_CHUNK_SIZE = 256
 
 # NOTE: We don't really have a rigorous defition
 # for metrics, particularly how often they will be
@@ -57,6 +70,92 @@ RRA_SPECS = [
 ]
 
 
+class RRDToolBindings(object):
+    """
+    Run rrdtool commands in process with the python bindings
+    """
+
+    def run(self, commands):
+        """
+        Run a list of commands, returning None or an error message for each
+        """
+        results = []
+        for command in commands:
+            try:
+                getattr(rrdtool, command[0])(*command[1:])
+                results.append(None)
+            except Exception, e:
+                results.append(str(e))
+        return results
+
+    def close(self):
+        pass
+
+
+class RRDToolPipe(object):
+    """
+    Run rrdtool commands through a long lived `rrdtool -` process
+    """
+
+    def __init__(self, binary='rrdtool'):
+        self.binary = binary
+        self.process = None
+
+    def _start(self):
+        self.process = subprocess.Popen([self.binary, '-'],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        close_fds=True)
+
+    def _format(self, command):
+        # Arguments are split on whitespace unless quoted
+        return ' '.join('"%s"' % arg if re.search(r'\s', arg) else arg
+                        for arg in command) + '\n'
+
+    def run(self, commands):
+        """
+        Run a list of commands, returning None or an error message for each.
+        Commands are written in chunks before reading the replies, so the
+        pipe buffers can not fill up. The commands of a chunk rrdtool could
+        not run, because it is missing or exited, all get an error.
+        """
+        results = []
+        for i in xrange(0, len(commands), PIPE_CHUNK_SIZE):
+            chunk = commands[i:i + PIPE_CHUNK_SIZE]
+            try:
+                if self.process is None or self.process.poll() is not None:
+                    self._start()
+
+                self.process.stdin.write(''.join(map(self._format, chunk)))
+                self.process.stdin.flush()
+                for command in chunk:
+                    while True:
+                        line = self.process.stdout.readline()
+                        if not line:
+                            raise IOError('rrdtool exited unexpectedly')
+                        if line.startswith('OK'):
+                            results.append(None)
+                            break
+                        if line.startswith('ERROR'):
+                            results.append(line.strip())
+                            break
+            except (IOError, OSError), e:
+                self.close()
+                error = 'Failed to run %s: %s' % (self.binary, e)
+                results.extend([error] * (i + len(chunk) - len(results)))
+
+        return results
+
+    def close(self):
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+        self.process = None
+
+
 class RRDHandler(Handler):
 
     # NOTE: This handler is fairly loose about locking (none),
@@ -64,27 +163,34 @@ class RRDHandler(Handler):
     # by locking done in the _process and _flush routines.
     # If this were to change at some point, we would definitely
     # want to be a bit more sensible about how we lock.
-    #
-    # We would probably also want to restructure this as a
-    # consumer and producer so that one thread can continually
-    # write out data, but that really depends on the design
-    # at the top level.
 
     def __init__(self, *args, **kwargs):
         super(RRDHandler, self).__init__(*args, **kwargs)
         self._exists_cache = dict()
         self._basedir = self.config['basedir']
-        self._batch = self.config['batch']
-        self._step = self.config['step']
+        self._batch = int(self.config['batch'])
+        self._step = int(self.config['step'])
+        # Pending updates as {filename: {timestamp: value}}
         self._queues = {}
+        # Create commands of the files that do not exist yet
+        self._creates = {}
         self._last_update = {}
 
+        if rrdtool is not None and self.config['engine'] != 'pipe':
+            self._engine = RRDToolBindings()
+        else:
+            self._engine = RRDToolPipe(self.config['binary'])
+
     def get_default_config_help(self):
         config = super(RRDHandler, self).get_default_config_help()
         config.update({
             'basedir': 'The base directory for all RRD files.',
-            'batch': 'Wait for this many updates before saving to the RRD file',
+            'batch': 'Wait for this many updates before saving to the RRD ' +
+                     'file, 0 to save on every flush',
             'step': 'The minimum interval represented in generated RRD files.',
+            'engine': 'auto to use the python rrdtool bindings when ' +
+                      'installed, pipe to always use an rrdtool process',
+            'binary': 'The rrdtool binary used by the pipe engine',
         })
         return config
 
@@ -94,12 +200,18 @@ class RRDHandler(Handler):
             'basedir': BASEDIR,
             'batch': BATCH_SIZE,
             'step': METRIC_STEP,
+            'engine': 'auto',
+            'binary': 'rrdtool',
         })
         return config
 
+    def __del__(self):
+        if hasattr(self, '_engine'):
+            self._engine.close()
+
     def _ensure_exists(self, filename, metric_name, metric_type):
         # We're good to go!
-        if filename in self._exists_cache:
+        if filename in self._exists_cache or filename in self._creates:
             return True
 
         # Does the file already exist?
@@ -107,9 +219,9 @@ class RRDHandler(Handler):
             self._exists_cache[filename] = True
             return True
 
-        # Attempt the creation.
-        self._create(filename, metric_name, metric_type)
-        self._exists_cache[filename] = True
+        # Create it on the next flush.
+        self._creates[filename] = self._create(filename, metric_name,
+                                               metric_type)
         return True
 
     def _create(self, filename, metric_name, metric_type):
@@ -121,24 +233,16 @@ class RRDHandler(Handler):
         if metric_type not in ("GAUGE", "COUNTER"):
             raise Exception("Unknown metric type: %s" % metric_type)
 
-        # Try to create the directory.
-        # NOTE: If we aren't successful, the check_call()
-        # will fail anyways so we can do this optimistically.
-        try:
-            os.makedirs(os.path.dirname(filename))
-        except OSError:
-            pass
-
         ds_spec = "DS:%s:%s:%d:U:U" % (
             metric_name, metric_type, self._step * 2)
         rrd_create_cmd = [
-            "rrdtool", "create", filename,
+            "create", filename,
             "--no-overwrite",
             "--step", str(self._step),
             ds_spec
         ]
         rrd_create_cmd.extend(RRA_SPECS)
-        subprocess.check_call(rrd_create_cmd, close_fds=True)
+        return rrd_create_cmd
 
     def process(self, metric):
         # Extract the filename given the metric.
@@ -152,72 +256,78 @@ class RRDHandler(Handler):
 
         # Ensure that there is an RRD file for this metric.
         # This is done inline because it's quickly cached and
-        # we would like to have exceptions related to creating
-        # the RRD file raised in the main thread.
+        # we would like to have exceptions related to the
+        # metric name and type raised in the main thread.
         self._ensure_exists(filename, metric_name, metric.metric_type)
-        if self._queue(filename, metric.timestamp, metric.value) >= self._batch:
-            self._flush_queue(filename)
+        if (self._queue(filename, metric.timestamp, metric.value)
+                >= self._batch > 0):
+            self._flush_files([filename])
 
     def _queue(self, filename, timestamp, value):
-        if filename not in self._queues:
-            queue = Queue.Queue()
-            self._queues[filename] = queue
-        else:
-            queue = self._queues[filename]
-        queue.put((timestamp, value))
-        return queue.qsize()
+        # RRD only supports granularity at a
+        # per-second level (not milliseconds, etc.).
+        timestamp = int(timestamp)
+
+        # Remember the latest update done.
+        if self._last_update.get(filename, 0) >= timestamp:
+            # Yikes. RRDtool won't let us do this.
+            # We need to drop this update and log a warning.
+            self.log.warning(
+                "Dropping update to %s. Too frequent!" % filename)
+            return len(self._queues.get(filename, ()))
+
+        # A file has a single data source, the latest value for a
+        # given second wins.
+        queue = self._queues.setdefault(filename, {})
+        queue[timestamp] = value
+        return len(queue)
 
     def flush(self):
-        # Grab all current queues.
-        for filename in self._queues.keys():
-            self._flush_queue(filename)
+        # Write all the pending updates at once.
+        self._flush_files(self._queues.keys())
+
+    def _flush_files(self, filenames):
+        commands = []
+        for filename in filenames:
+            if filename in self._creates:
+                # NOTE: If we aren't successful, the create
+                # will fail anyways so we can do this optimistically.
+                try:
+                    os.makedirs(os.path.dirname(filename))
+                except OSError:
+                    pass
+                commands.append(self._creates[filename])
+
+            updates = self._queues.pop(filename, None)
+            if not updates:
+                continue
+
+            # Save the last update time.
+            timestamps = sorted(updates)
+            self._last_update[filename] = timestamps[-1]
 
-    def _flush_queue(self, filename):
-        queue = self._queues[filename]
-
-        # Collect all pending updates.
-        updates = {}
-        max_timestamp = 0
-        while True:
-            try:
-                (timestamp, value) = queue.get(block=False)
-                # RRD only supports granularity at a
-                # per-second level (not milliseconds, etc.).
-                timestamp = int(timestamp)
-
-                # Remember the latest update done.
-                last_update = self._last_update.get(filename, 0)
-                if last_update >= timestamp:
-                    # Yikes. RRDtool won't let us do this.
-                    # We need to drop this update and log a warning.
-                    self.log.warning(
-                        "Dropping update to %s. Too frequent!" % filename)
-                    continue
-                max_timestamp = max(timestamp, max_timestamp)
-
-                # Add this update.
-                if timestamp not in updates:
-                    updates[timestamp] = []
-                updates[timestamp].append(value)
-            except Queue.Empty:
-                break
-
-        # Save the last update time.
-        self._last_update[filename] = max_timestamp
-
-        if len(updates) > 0:
             # Construct our command line.
-            # This will look like <time>:<value1>[:<value2>...]
-            # The timestamps must be sorted, and we each of the
+            # This will look like <time>:<value>
+            # The timestamps must be sorted, and each of the
             # <time> values must be unique (like a snowflake).
-            data_points = map(
-                lambda (timestamp, values): "%d:%s" %
-                (timestamp, ":".join(map(str, values))),
-                sorted(updates.items()))
-
-            # Optimisticly update.
-            # Nothing can really be done if we fail.
-            rrd_update_cmd = ["rrdupdate", filename, "--"]
-            rrd_update_cmd.extend(data_points)
-            self.log.info("update: %s" % str(rrd_update_cmd))
-            subprocess.call(rrd_update_cmd)
+            rrd_update_cmd = ["update", filename, "--"]
+            rrd_update_cmd.extend("%d:%s" % (timestamp, updates[timestamp])
+                                  for timestamp in timestamps)
+            commands.append(rrd_update_cmd)
+
+        if not commands:
+            return
+
+        # Optimisticly update.
+        # Nothing can really be done if we fail.
+        self.log.debug("RRDHandler: Running %d rrdtool commands",
+                       len(commands))
+        for command, error in zip(commands, self._engine.run(commands)):
+            filename = command[1]
+            if command[0] == "create" and error is None:
+                # Failed creates are tried again on the next flush
+                self._creates.pop(filename, None)
+                self._exists_cache[filename] = True
+            if error is not None:
+                self.log.error("RRDHandler: rrdtool %s %s failed: %s",
+                               command[0], filename, error)
@@ -43,6 +43,9 @@ try:
 except ImportError:
     raven = None
 
+# Maximum number of metric paths to remember the matching rules of
+MATCH_CACHE_SIZE = 100000
+
 
 class InvalidRule(ValueError):
     """
@@ -174,8 +177,18 @@ class Rule(object):
                     self.min, self.max))
 
         # compile path regular expression
+        self.path = path
         self.regexp = re.compile(r'(?P<prefix>.*)\.(?P<path>%s)$' % path)
 
+    def match(self, path):
+        """
+        match a metric path against the rule
+        @type path: string
+        @param path: metric path
+        @rtype re.MatchObject or None
+        """
+        return self.regexp.match(path)
+
     def process(self, metric, handler):
         """
         process a single diamond metric
@@ -185,39 +198,51 @@ class Rule(object):
         @param handler: configured Sentry graphite handler
         @rtype None
         """
-        match = self.regexp.match(metric.path)
+        match = self.match(metric.path)
         if match:
-            minimum = Minimum(metric.value, self.min)
-            maximum = Maximum(metric.value, self.max)
-
-            if minimum.is_error or maximum.is_error:
-                self.counter_errors += 1
-                message = "%s Warning on %s: %.1f" % (self.name,
-                                                      handler.hostname,
-                                                      metric.value)
-                culprit = "%s %s" % (handler.hostname, match.group('path'))
-                handler.raven_logger.error(message, extra={
-                    'culprit': culprit,
-                    'data': {
-                        'metric prefix': match.group('prefix'),
-                        'metric path': match.group('path'),
-                        'minimum check': minimum.verbose_message,
-                        'maximum check': maximum.verbose_message,
-                        'metric original path': metric.path,
-                        'metric value': metric.value,
-                        'metric precision': metric.precision,
-                        'metric timestamp': metric.timestamp,
-                        'minimum threshold': self.min,
-                        'maximum threshold': self.max,
-                        'path regular expression': self.regexp.pattern,
-                        'total errors': self.counter_errors,
-                        'total pass': self.counter_pass,
-                        'hostname': handler.hostname
-                    }
+            self.check(metric, handler, match)
+
+    def check(self, metric, handler, match):
+        """
+        check the value of a metric matching the rule
+        @type metric: diamond.metric.Metric
+        @param metric: metric to check
+        @type handler: diamond.handler.sentry.SentryHandler
+        @param handler: configured Sentry graphite handler
+        @type match: re.MatchObject
+        @param match: match of the metric path by the rule
+        @rtype None
+        """
+        minimum = Minimum(metric.value, self.min)
+        maximum = Maximum(metric.value, self.max)
+
+        if minimum.is_error or maximum.is_error:
+            self.counter_errors += 1
+            message = "%s Warning on %s: %.1f" % (self.name,
+                                                  handler.hostname,
+                                                  metric.value)
+            culprit = "%s %s" % (handler.hostname, match.group('path'))
+            handler.raven_logger.error(message, extra={
+                'culprit': culprit,
+                'data': {
+                    'metric prefix': match.group('prefix'),
+                    'metric path': match.group('path'),
+                    'minimum check': minimum.verbose_message,
+                    'maximum check': maximum.verbose_message,
+                    'metric original path': metric.path,
+                    'metric value': metric.value,
+                    'metric precision': metric.precision,
+                    'metric timestamp': metric.timestamp,
+                    'minimum threshold': self.min,
+                    'maximum threshold': self.max,
+                    'path regular expression': self.regexp.pattern,
+                    'total errors': self.counter_errors,
+                    'total pass': self.counter_pass,
+                    'hostname': handler.hostname
                 }
-                )
-            else:
-                self.counter_pass += 1
+            })
+        else:
+            self.counter_pass += 1
 
     def __repr__(self):
         return '%s: min:%s max:%s %s' % (self.name, self.min, self.max,
@@ -246,6 +271,9 @@ class SentryHandler(Handler):
         self.raven_logger.addHandler(self.sentry_log_handler)
         self.configure_sentry_errors()
         self.rules = self.compile_rules()
+        self.matcher = self.compile_matcher(self.rules)
+        # rules matching each metric path seen so far
+        self.matches = {}
         self.hostname = get_hostname(self.config)
         if not len(self.rules):
             self.log.warning("No rules, this graphite handler is unused")
@@ -287,6 +315,47 @@ class SentryHandler(Handler):
                 output.append(rule)
         return output
 
+    def compile_matcher(self, rules):
+        """
+        Compile the rules paths into a single regular expression, used to
+        skip the metrics no rule matches
+        @type rules: list of Rules
+        @rtype compiled regular expression or None if the paths can not be
+            combined
+        """
+        if not rules:
+            return None
+        try:
+            return re.compile(r'.*\.(?:%s)$' % '|'.join(
+                '(?:%s)' % rule.path for rule in rules))
+        except re.error, err:
+            self.log.debug("can not combine the rules paths: %s", err)
+            return None
+
+    def match(self, path):
+        """
+        Find the rules matching a metric path, caching the result
+        @type path: string
+        @param path: metric path
+        @rtype list of (Rule, re.MatchObject)
+        """
+        try:
+            return self.matches[path]
+        except KeyError:
+            pass
+
+        matches = []
+        if self.matcher is None or self.matcher.match(path):
+            for rule in self.rules:
+                match = rule.match(path)
+                if match:
+                    matches.append((rule, match))
+
+        if len(self.matches) >= MATCH_CACHE_SIZE:
+            self.matches.clear()
+        self.matches[path] = matches
+        return matches
+
     def compile_section(self, section):
         """
         Validate if a section is a valid rule
@@ -353,8 +422,8 @@ class SentryHandler(Handler):
         @param metric: metric to process
         @rtype None
         """
-        for rule in self.rules:
-            rule.process(metric, self)
+        for rule, match in self.match(metric.path):
+            rule.check(metric, self, match)
 
     def __repr__(self):
         return "SentryHandler '%s' %d rules" % (
@@ -5,7 +5,7 @@ Send metrics to signalfx
 
 #### Dependencies
 
- * urllib2
+ * httplib
 
 
 #### Configuration
@@ -19,11 +19,13 @@ Enable this handler
 """
 
 from Handler import Handler
+from httpclient import HttpClient
+from httpclient import HTTP_CLIENT_CONFIG
+from httpclient import HTTP_CLIENT_CONFIG_HELP
 from diamond.util import get_diamond_version
 import json
 import logging
 import time
-import urllib2
 
 
 class SignalfxHandler(Handler):
@@ -36,6 +38,8 @@ class SignalfxHandler(Handler):
         self.url = self.config['url']
         self.auth_token = self.config['auth_token']
         self.batch_max_interval = self.config['batch_max_interval']
+        self.client = HttpClient.from_config(self.config, 'SignalfxHandler',
+                                             log=self.log)
         self.resetBatchTimeout()
         if self.auth_token == "":
             logging.error("Failed to load Signalfx module")
@@ -50,6 +54,7 @@ class SignalfxHandler(Handler):
         """
         config = super(SignalfxHandler, self).get_default_config_help()
 
+        config.update(HTTP_CLIENT_CONFIG_HELP)
         config.update({
             'url': 'Where to send metrics',
             'batch': 'How many to store before sending',
@@ -64,6 +69,7 @@ class SignalfxHandler(Handler):
         """
         config = super(SignalfxHandler, self).get_default_config()
 
+        config.update(HTTP_CLIENT_CONFIG)
         config.update({
             'url': 'https://api.signalfuse.com/v2/datapoint',
             'batch': 300,
@@ -116,6 +122,10 @@ class SignalfxHandler(Handler):
         return "Diamond: %s" % get_diamond_version()
 
     def _send(self):
+        if not self.metrics:
+            self.resetBatchTimeout()
+            return
+
         # Potentially use protobufs in the future
         postDictionary = {}
         for metric in self.metrics:
@@ -127,13 +137,8 @@ class SignalfxHandler(Handler):
         self.metrics = []
         postBody = json.dumps(postDictionary)
         logging.debug("Body is %s", postBody)
-        req = urllib2.Request(self.url, postBody,
-                              {"Content-type": "application/json",
-                               "X-SF-TOKEN": self.auth_token,
-                               "User-Agent": self.user_agent()})
         self.resetBatchTimeout()
-        try:
-            urllib2.urlopen(req)
-        except urllib2.URLError:
-            logging.exception("Unable to post signalfx metrics")
-            return
+        self.client.post_async(self.url, postBody,
+                               {"Content-type": "application/json",
+                                "X-SF-TOKEN": self.auth_token,
+                                "User-Agent": self.user_agent()})
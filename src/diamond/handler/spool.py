@@ -0,0 +1,167 @@
+# coding=utf-8
+
+"""
+An append only, segment rotated disk spool used by handlers to keep the
+metrics they could not send, rather than dropping them.
+
+Data is appended to the newest segment file and read back from the oldest
+one. Segments are rotated when they reach segment_size, and the oldest
+segments are removed when the spool grows over max_size. The read offset in
+the oldest segment is saved next to the segments, so a restart carries on
+where the previous run stopped instead of sending the same data again.
+"""
+
+import logging
+import os
+
+SEGMENT_SUFFIX = '.spool'
+OFFSET_FILE = 'offset'
+
+
+class DiskSpool(object):
+
+    def __init__(self, path, segment_size=16777216, max_size=1073741824,
+                 log=None):
+        """
+        Create a new spool in path, picking up the segments left over from a
+        previous run
+        """
+        if log is None:
+            self.log = logging.getLogger('diamond')
+        else:
+            self.log = log
+
+        self.path = path
+        self.segment_size = int(segment_size)
+        self.max_size = int(max_size)
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        # Segment sequence numbers, oldest first
+        self.segments = sorted(
+            int(f[:-len(SEGMENT_SUFFIX)]) for f in os.listdir(self.path)
+            if f.endswith(SEGMENT_SUFFIX)
+            and f[:-len(SEGMENT_SUFFIX)].isdigit())
+
+        # Offset of the next byte to read in the oldest segment
+        self.offset = self._load_offset()
+
+    def _segment_path(self, segment):
+        return os.path.join(self.path, '%020d%s' % (segment, SEGMENT_SUFFIX))
+
+    def _segment_size(self, segment):
+        try:
+            return os.path.getsize(self._segment_path(segment))
+        except OSError:
+            return 0
+
+    def _load_offset(self):
+        """
+        Returns the read offset saved by a previous run, if it is still for
+        the oldest segment
+        """
+        try:
+            with open(os.path.join(self.path, OFFSET_FILE), 'rb') as f:
+                segment, offset = [int(v) for v in f.read().split()]
+        except (IOError, OSError, ValueError):
+            return 0
+
+        if not self.segments or self.segments[0] != segment:
+            return 0
+        return min(offset, self._segment_size(segment))
+
+    def _save_offset(self):
+        """
+        Save the read offset, replacing the previous one in a single rename
+        """
+        path = os.path.join(self.path, OFFSET_FILE)
+        try:
+            if self.segments and self.offset:
+                with open(path + '.tmp', 'wb') as f:
+                    f.write('%d %d\n' % (self.segments[0], self.offset))
+                os.rename(path + '.tmp', path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except (IOError, OSError), e:
+            self.log.error('DiskSpool: Failed to save the read offset of %s. '
+                           '%s', self.path, e)
+
+    def _remove_oldest(self):
+        segment = self.segments.pop(0)
+        self.offset = 0
+        try:
+            os.remove(self._segment_path(segment))
+        except OSError:
+            pass
+        self._save_offset()
+
+    def size(self):
+        """
+        Returns the number of bytes waiting in the spool
+        """
+        return sum(self._segment_size(segment)
+                   for segment in self.segments) - self.offset
+
+    def write(self, data):
+        """
+        Append data to the spool
+        """
+        if not data:
+            return
+
+        if (not self.segments
+                or self._segment_size(self.segments[-1]) >= self.segment_size):
+            if self.segments:
+                self.segments.append(self.segments[-1] + 1)
+            else:
+                self.segments.append(0)
+
+        with open(self._segment_path(self.segments[-1]), 'ab') as f:
+            f.write(data)
+
+        # Make room by removing the oldest segments
+        while len(self.segments) > 1 and self.size() > self.max_size:
+            self.log.warning('DiskSpool: %s is over %d bytes, removing the '
+                             'oldest segment', self.path, self.max_size)
+            self._remove_oldest()
+
+    def peek(self, size):
+        """
+        Returns up to size bytes of whole lines from the oldest data in the
+        spool, without removing them. A single line longer than size is
+        returned whole.
+        """
+        while self.segments:
+            path = self._segment_path(self.segments[0])
+            with open(path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read(size)
+                end = data.rfind('\n') + 1
+                if end > 0:
+                    return data[:end]
+                data += f.readline()
+
+            if data.endswith('\n'):
+                return data
+
+            if data:
+                # Left over from a write cut short, it can not be sent
+                self.log.warning('DiskSpool: Dropping %d bytes of truncated '
+                                 'data at the end of %s', len(data), path)
+
+            # The oldest segment was fully read
+            self._remove_oldest()
+
+        return ''
+
+    def consume(self, size):
+        """
+        Remove size bytes, as returned by peek, from the spool
+        """
+        self.offset += size
+        if self.segments and self.offset >= self._segment_size(
+                self.segments[0]):
+            self._remove_oldest()
+        else:
+            self._save_offset()
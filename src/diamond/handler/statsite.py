@@ -52,11 +52,17 @@ store only a fraction of the samples.
 
 """
 
+from Handler import BatchMixin
 from Handler import Handler
+from connection import AsyncConnection
+from diamond.utils.config import str_to_bool
 import socket
 
+# Largest datagram that fits in a standard ethernet frame
+UDP_MAX_BATCH_BYTES = 1432
 
-class StatsiteHandler(Handler):
+
+class StatsiteHandler(BatchMixin, Handler):
     """
     Implements the abstract Handler class, sending data to statsite
     """
@@ -71,12 +77,31 @@ class StatsiteHandler(Handler):
 
         # Initialize Data
         self.socket = None
+        self.connection = None
 
         # Initialize Options
         self.host = self.config['host']
         self.tcpport = int(self.config['tcpport'])
         self.udpport = int(self.config['udpport'])
         self.timeout = int(self.config['timeout'])
+        self._init_batch()
+        if self.udpport > 0:
+            # Keep each batch within a single unfragmented datagram
+            self.batch_max_bytes = min(self.batch_max_bytes,
+                                       UDP_MAX_BATCH_BYTES)
+
+        # Hand the data to a background event loop rather than blocking on
+        # the socket
+        if str_to_bool(self.config['nonblocking']):
+            if self.udpport > 0:
+                proto, self.port = 'udp4', self.udpport
+            else:
+                proto, self.port = 'tcp4', self.tcpport
+            self.connection = AsyncConnection(
+                self.host, self.port, proto,
+                max_buffer_size=self.config['nonblocking_buffer_size'],
+                name='StatsiteHandler', log=self.log)
+            return
 
         # Connect
         self._connect()
@@ -92,6 +117,10 @@ class StatsiteHandler(Handler):
             'tcpport': '',
             'udpport': '',
             'timeout': '',
+            'nonblocking': 'Send from a background event loop, so an ' +
+                           'unreachable server never blocks the handler',
+            'nonblocking_buffer_size': 'Maximum size in bytes of the ' +
+                                       'nonblocking send buffer',
         })
 
         return config
@@ -107,6 +136,8 @@ class StatsiteHandler(Handler):
             'tcpport': 1234,
             'udpport': 1234,
             'timeout': 5,
+            'nonblocking': False,
+            'nonblocking_buffer_size': 4194304,
         })
 
         return config
@@ -115,19 +146,30 @@ class StatsiteHandler(Handler):
         """
         Destroy instance of the StatsiteHandler class
         """
+        if self.connection is not None:
+            self.connection.close()
         self._close()
 
     def process(self, metric):
         """
-        Process a metric by sending it to statsite
+        Process a metric by buffering it for statsite
         """
-        # Just send the data as a string
-        self._send(str(metric))
+        if isinstance(metric.precision, (int, long)):
+            precision = metric.precision
+        else:
+            precision = 0
+        self._buffer('%s:%0.*f|kv\n' % (metric.path, precision, metric.value))
 
     def _send(self, data):
         """
         Send data to statsite. Data that can not be sent will be queued.
         """
+        if self.connection is not None:
+            if not self.connection.send(data):
+                self._throttle_error("StatsiteHandler: Send buffer is full, "
+                                     "dropping data.")
+            return
+
         retry = self.RETRY
         # Attempt to send any data in the queue
         while retry > 0:
@@ -143,8 +185,6 @@ class StatsiteHandler(Handler):
                 continue
             try:
                 # Send data to socket
-                data = data.split()
-                data = data[0] + ":" + data[1] + "|kv\n"
                 self.socket.sendall(data)
                 # Done
                 break
@@ -0,0 +1,222 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+import errno
+import socket
+import time
+from collections import deque
+
+from test import unittest
+
+import configobj
+from mock import Mock
+from mock import patch
+
+from diamond.handler.connection import AsyncConnection
+from diamond.handler.graphite import GraphiteHandler
+from diamond.metric import Metric
+
+
+def _listen():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    server.settimeout(5)
+    return server
+
+
+def _read(client, size):
+    data = ''
+    deadline = time.time() + 5
+    while len(data) < size and time.time() < deadline:
+        chunk = client.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class TestAsyncConnection(unittest.TestCase):
+
+    def test_send_tcp(self):
+        server = _listen()
+        connection = AsyncConnection('127.0.0.1', server.getsockname()[1])
+        try:
+            self.assertTrue(connection.send('a 1 1\n'))
+            self.assertTrue(connection.send('b 2 2\n'))
+            client, _ = server.accept()
+            client.settimeout(5)
+            self.assertEqual(_read(client, 12), 'a 1 1\nb 2 2\n')
+            client.close()
+        finally:
+            connection.close()
+            server.close()
+
+    def test_send_udp(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        connection = AsyncConnection('127.0.0.1', server.getsockname()[1],
+                                     'udp4')
+        try:
+            connection.send('a:1|kv\n')
+            connection.send('b:2|kv\n')
+            self.assertEqual(server.recv(100), 'a:1|kv\n')
+            self.assertEqual(server.recv(100), 'b:2|kv\n')
+        finally:
+            connection.close()
+            server.close()
+
+    def test_send_does_not_block_when_unreachable(self):
+        # Grab a free port nothing listens on
+        server = _listen()
+        port = server.getsockname()[1]
+        server.close()
+
+        connection = AsyncConnection('127.0.0.1', port, max_buffer_size=10)
+        try:
+            start = time.time()
+            self.assertTrue(connection.send('a 1 1\n'))
+            self.assertFalse(connection.send('b 2 2\n'))
+            self.assertTrue(time.time() - start < 1)
+            self.assertEqual(connection.pending(), 6)
+            self.assertEqual(connection.dropped, 1)
+        finally:
+            connection.close()
+
+    def test_send_does_not_block_on_resolver(self):
+        server = _listen()
+        getaddrinfo = socket.getaddrinfo
+
+        def slow_getaddrinfo(*args):
+            time.sleep(1)
+            return getaddrinfo(*args)
+
+        connection = AsyncConnection('127.0.0.1', server.getsockname()[1])
+        try:
+            with patch('socket.getaddrinfo', slow_getaddrinfo):
+                start = time.time()
+                self.assertTrue(connection.send('a 1 1\n'))
+                time.sleep(0.1)
+                self.assertTrue(connection.send('b 2 2\n'))
+                self.assertTrue(time.time() - start < 0.5)
+
+                client, _ = server.accept()
+                client.settimeout(5)
+                self.assertEqual(_read(client, 12), 'a 1 1\nb 2 2\n')
+                client.close()
+        finally:
+            connection.close()
+            server.close()
+
+    def test_reconnect_backoff(self):
+        server = _listen()
+        port = server.getsockname()[1]
+        server.close()
+
+        connection = AsyncConnection('127.0.0.1', port, backoff_min=0.1,
+                                     backoff_max=0.4)
+        try:
+            connection.send('a 1 1\n')
+            deadline = time.time() + 5
+            while connection.backoff < 0.4 and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(connection.backoff, 0.4)
+            self.assertFalse(connection.connected)
+
+            # The buffered data is sent once the server comes up
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind(('127.0.0.1', port))
+            server.listen(1)
+            server.settimeout(5)
+            client, _ = server.accept()
+            client.settimeout(5)
+            self.assertEqual(_read(client, 6), 'a 1 1\n')
+            self.assertEqual(connection.backoff, 0.1)
+            client.close()
+            server.close()
+        finally:
+            connection.close()
+
+    def test_failure_drops_only_truncated_line(self):
+        class FakeSocket(object):
+            sent = []
+
+            def send(self, data):
+                if not self.sent:
+                    self.sent.append(data[:5])
+                    return 5
+                raise socket.error(errno.ECONNRESET, 'Connection reset')
+
+            def close(self):
+                pass
+
+        connection = AsyncConnection('127.0.0.1', 1)
+        connection.socket = FakeSocket()
+        connection.connected = True
+        connection.chunks = deque(['aaa\nbbb\n', 'ccc\n'])
+        connection.buffer_size = 12
+
+        connection.handle_write()
+        self.assertEqual(FakeSocket.sent, ['aaa\nb'])
+        self.assertTrue(connection.partial)
+
+        # Queued after the partial send, must not be merged with it
+        connection.chunks.append('ddd\n')
+        connection.buffer_size += 4
+        connection.handle_write()
+
+        self.assertEqual(list(connection.chunks), ['ccc\n', 'ddd\n'])
+        self.assertEqual(connection.pending(), 8)
+        self.assertFalse(connection.partial)
+
+
+class TestGraphiteHandlerNonblocking(unittest.TestCase):
+
+    def test_send(self):
+        server = _listen()
+        config = configobj.ConfigObj()
+        config['host'] = '127.0.0.1'
+        config['port'] = server.getsockname()[1]
+        config['nonblocking'] = 'True'
+
+        handler = GraphiteHandler(config)
+        try:
+            self.assertEqual(handler.socket, None)
+            handler.process(Metric('servers.host.cpu.idle', 1,
+                                   timestamp=1234567))
+            client, _ = server.accept()
+            client.settimeout(5)
+            expected = 'servers.host.cpu.idle 1 1234567\n'
+            self.assertEqual(_read(client, len(expected)), expected)
+            self.assertEqual(handler.metrics, [])
+            client.close()
+        finally:
+            handler.connection.close()
+            server.close()
+
+    def test_send_does_not_spool(self):
+        server = _listen()
+        config = configobj.ConfigObj()
+        config['host'] = '127.0.0.1'
+        config['port'] = server.getsockname()[1]
+        config['nonblocking'] = 'True'
+
+        handler = GraphiteHandler(config)
+        handler.spool = Mock()
+        handler.spool.peek.return_value = ''
+        try:
+            handler.process(Metric('servers.host.cpu.idle', 1,
+                                   timestamp=1234567))
+            self.assertEqual(handler.metrics, [])
+            self.assertFalse(handler.spool.write.called)
+        finally:
+            handler.connection.close()
+            server.close()
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
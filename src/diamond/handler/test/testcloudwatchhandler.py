@@ -0,0 +1,89 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+import time
+
+from test import unittest
+from mock import Mock
+from mock import patch
+
+import configobj
+
+import diamond.handler.cloudwatch as mod
+from diamond.metric import Metric
+
+
+class TestCloudwatchHandler(unittest.TestCase):
+
+    def setUp(self):
+        boto = Mock()
+        boto.utils.get_instance_metadata.return_value = {
+            'instance-id': 'i-12345'}
+        self.patcher = patch.object(mod, 'boto', boto)
+        self.patcher.start()
+
+        config = configobj.ConfigObj()
+        config['region'] = 'us-east-1'
+        config['async_dispatch'] = 'False'
+        for name in ('01', '05'):
+            config['LoadAvg' + name] = {
+                'collector': 'loadavg',
+                'metric': name,
+                'namespace': 'MachineLoad',
+                'name': 'Avg' + name,
+                'unit': 'None',
+            }
+        self.handler = mod.cloudwatchHandler(config)
+        self.connection = self.handler.connection
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def _metric(self, name, value):
+        return Metric('servers.host.loadavg.' + name, value,
+                      timestamp=1234567, host='host')
+
+    def test_rules_index(self):
+        self.assertEqual(
+            sorted(self.handler.rules_index.keys()),
+            [('loadavg', '01'), ('loadavg', '05')])
+
+    def test_batch_on_flush(self):
+        self.handler.process(self._metric('01', 1))
+        self.handler.process(self._metric('05', 2))
+        self.handler.process(self._metric('15', 3))
+        self.assertFalse(self.connection.put_metric_data.called)
+
+        self.handler.flush()
+        self.assertEqual(self.connection.put_metric_data.call_count, 1)
+        args = self.connection.put_metric_data.call_args[0]
+        self.assertEqual(args[0], 'MachineLoad')
+        self.assertEqual(args[1], ['Avg01', 'Avg05'])
+        self.assertEqual(args[2], ['1', '2'])
+        self.assertEqual(args[5], [{'InstanceID': 'i-12345'}] * 2)
+
+        self.handler.flush()
+        self.assertEqual(self.connection.put_metric_data.call_count, 1)
+
+    def test_request_size(self):
+        for i in range(mod.MAX_DATAPOINTS_PER_REQUEST + 1):
+            self.handler.process(self._metric('01', i))
+        self.handler.flush()
+        self.assertEqual(self.connection.put_metric_data.call_count, 2)
+
+    def test_async_dispatch(self):
+        # Create the child mock before the background thread can race us
+        put_metric_data = self.connection.put_metric_data
+        self.handler.async_dispatch = True
+        self.handler.process(self._metric('01', 1))
+        self.handler.flush()
+
+        deadline = time.time() + 5
+        while not put_metric_data.called and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(put_metric_data.call_count, 1)
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,9 @@
 # coding=utf-8
 ################################################################################
 
+import os
+import shutil
+import tempfile
 import time
 
 from test import unittest
@@ -12,6 +15,7 @@ from mock import call
 import configobj
 
 import diamond.handler.graphite as mod
+from diamond.handler.spool import DiskSpool
 from diamond.metric import Metric
 
 
@@ -218,3 +222,123 @@ class TestGraphiteHandler(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+
+class TestGraphiteHandlerSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.__connect_method = mod.GraphiteHandler._connect
+        mod.GraphiteHandler._connect = fake_connect
+        self.spool_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        mod.GraphiteHandler._connect = self.__connect_method
+        shutil.rmtree(self.spool_path)
+
+    def get_handler(self, **options):
+        config = configobj.ConfigObj()
+        config['batch'] = 2
+        config['spool_path'] = self.spool_path
+        config.update(options)
+        return mod.GraphiteHandler(config)
+
+    def test_spool_when_send_fails(self):
+        handler = self.get_handler()
+        handler._send_data = Mock(return_value=False)
+
+        handler.process(Metric('metricname1', 1, timestamp=123))
+        handler.process(Metric('metricname2', 2, timestamp=123))
+
+        self.assertEqual(handler.metrics, [])
+        self.assertEqual(handler.spool.peek(1024),
+                         'metricname1 1 123\nmetricname2 2 123\n')
+
+    def test_drain_spool_on_reconnect(self):
+        handler = self.get_handler(spool_drain_size=20)
+        handler.spool.write('metricname1 1 123\nmetricname2 2 123\n')
+        handler._send_data = Mock(return_value=True)
+
+        handler.process(Metric('metricname3', 3, timestamp=124))
+        handler.flush()
+        handler.flush()
+
+        self.assertEqual(handler._send_data.call_args_list, [
+            call('metricname3 3 124\n'),
+            call('metricname1 1 123\n'),
+            call(''),
+            call('metricname2 2 123\n'),
+        ])
+        self.assertEqual(handler.spool.size(), 0)
+
+    def test_spool_metric(self):
+        handler = self.get_handler(spool_metric='diamond.spool')
+        handler.spool.write('metricname1 1 123\n')
+        handler._send_data = Mock(return_value=True)
+
+        with patch('time.time', Mock(return_value=200)):
+            handler.flush()
+
+        self.assertEqual(handler._send_data.call_args_list[0],
+                         call('diamond.spool 18 200\n'))
+
+
+class TestDiskSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_rotate_and_read(self):
+        spool = DiskSpool(self.path, segment_size=10, max_size=1000)
+        spool.write('a 1 1\nb 2 2\n')
+        spool.write('c 3 3\n')
+        self.assertEqual(len(os.listdir(self.path)), 2)
+        self.assertEqual(spool.size(), 18)
+
+        self.assertEqual(spool.peek(9), 'a 1 1\n')
+        spool.consume(6)
+        self.assertEqual(spool.peek(100), 'b 2 2\n')
+        spool.consume(6)
+        self.assertEqual(spool.peek(100), 'c 3 3\n')
+        spool.consume(6)
+        self.assertEqual(spool.peek(100), '')
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_max_size(self):
+        spool = DiskSpool(self.path, segment_size=6, max_size=12)
+        for i in range(4):
+            spool.write('m %d 1\n' % i)
+        self.assertEqual(spool.size(), 12)
+        self.assertEqual(spool.peek(100), 'm 2 1\n')
+
+    def test_reopen(self):
+        DiskSpool(self.path).write('a 1 1\n')
+        self.assertEqual(DiskSpool(self.path).peek(100), 'a 1 1\n')
+
+    def test_reopen_after_consume(self):
+        spool = DiskSpool(self.path)
+        spool.write('a 1 1\nb 2 2\n')
+        spool.consume(len(spool.peek(6)))
+
+        spool = DiskSpool(self.path)
+        self.assertEqual(spool.size(), 6)
+        self.assertEqual(spool.peek(100), 'b 2 2\n')
+        spool.consume(6)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_peek_long_line(self):
+        spool = DiskSpool(self.path)
+        spool.write('long.metric.name 1 1\nb 2 2\n')
+        self.assertEqual(spool.peek(4), 'long.metric.name 1 1\n')
+        spool.consume(21)
+        self.assertEqual(spool.peek(4), 'b 2 2\n')
+
+    def test_peek_drops_truncated_line(self):
+        spool = DiskSpool(self.path, segment_size=6)
+        spool.write('a 1 1\nb 2')
+        spool.write('c 3 3\n')
+        self.assertEqual(spool.peek(100), 'a 1 1\n')
+        spool.consume(6)
+        self.assertEqual(spool.peek(100), 'c 3 3\n')
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+import BaseHTTPServer
+import SocketServer
+import errno
+import gzip
+import socket
+import threading
+import time
+from cStringIO import StringIO
+
+from test import unittest
+from mock import Mock
+
+from diamond.handler.httpclient import HttpClient
+from diamond.handler.httpclient import HttpError
+
+
+class RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=StringIO(body)).read()
+        self.server.requests.append((self.client_address, self.path, body))
+
+        time.sleep(self.server.delay)
+        status = 200
+        if self.server.statuses:
+            status = self.server.statuses.pop(0)
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that timed out have closed their end already
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.requests = []
+        self.server.statuses = []
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/write?db=x' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        client = HttpClient()
+        self.assertEqual(client.post(self.url, 'a'), 'ok')
+        self.assertEqual(client.post(self.url, 'b'), 'ok')
+        self.assertEqual([r[1:] for r in self.server.requests],
+                         [('/write?db=x', 'a'), ('/write?db=x', 'b')])
+        # Both requests were made over the same connection
+        self.assertEqual(self.server.requests[0][0],
+                         self.server.requests[1][0])
+        client.close()
+
+    def test_gzip(self):
+        client = HttpClient(gzip=True)
+        client.post(self.url, 'metric 1 2\n' * 100)
+        self.assertEqual(self.server.requests[0][2], 'metric 1 2\n' * 100)
+        client.close()
+
+    def test_retry(self):
+        self.server.statuses = [503, 502]
+        client = HttpClient(retries=2, retry_backoff=0.01)
+        self.assertEqual(client.post(self.url, 'a'), 'ok')
+        self.assertEqual(len(self.server.requests), 3)
+
+        self.server.statuses = [503, 503, 503]
+        self.assertRaises(HttpError, client.post, self.url, 'a')
+        client.close()
+
+    def test_client_error_not_retried(self):
+        self.server.statuses = [400]
+        client = HttpClient(retries=2, retry_backoff=0.01)
+        self.assertRaises(HttpError, client.post, self.url, 'a')
+        self.assertEqual(len(self.server.requests), 1)
+        client.close()
+
+    def test_stale_connection_resent(self):
+        client = HttpClient(retries=0)
+        stale = Mock()
+        stale.request.side_effect = socket.error(errno.ECONNRESET,
+                                                 'Connection reset by peer')
+        client._idle[('http', '127.0.0.1:%d' % self.server.server_port)] = [
+            stale]
+        self.assertEqual(client.post(self.url, 'a'), 'ok')
+        self.assertEqual(len(self.server.requests), 1)
+        stale.close.assert_called_once_with()
+        client.close()
+
+    def test_timeout_not_resent(self):
+        client = HttpClient(timeout=0.1, retries=0)
+        client.post(self.url, 'a')
+        # The kept alive connection times out after the body was sent
+        self.server.delay = 0.5
+        self.assertRaises(HttpError, client.post, self.url, 'b')
+        time.sleep(0.2)
+        self.assertEqual([r[2] for r in self.server.requests], ['a', 'b'])
+        client.close()
+
+    def test_post_async(self):
+        client = HttpClient(concurrency=2)
+        for i in range(5):
+            self.assertTrue(client.post_async(self.url, str(i)))
+
+        deadline = time.time() + 5
+        while len(self.server.requests) < 5 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(r[2] for r in self.server.requests),
+                         ['0', '1', '2', '3', '4'])
+
+    def test_post_async_inline(self):
+        client = HttpClient(retries=0)
+        self.server.statuses = [500]
+        self.assertFalse(client.post_async(self.url, 'a'))
+        self.assertTrue(client.post_async(self.url, 'b'))
+        client.close()
+
+    def test_post_async_inline_not_retried(self):
+        client = HttpClient(retries=2, retry_backoff=10)
+        self.server.statuses = [503]
+        start = time.time()
+        self.assertFalse(client.post_async(self.url, 'a'))
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(len(self.server.requests), 1)
+        client.close()
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import patch
+
+import configobj
+
+import diamond.handler.mysql as mod
+from diamond.metric import Metric
+
+
+class MySQLError(Exception):
+    pass
+
+
+class TestMySQLHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.mysqldb = Mock()
+        self.mysqldb.Error = MySQLError
+        self.patcher = patch.object(mod, 'MySQLdb', self.mysqldb)
+        self.patcher.start()
+
+        config = configobj.ConfigObj()
+        config['hostname'] = 'localhost'
+        config['port'] = 3306
+        config['username'] = 'diamond'
+        config['password'] = ''
+        config['database'] = 'diamond'
+        config['table'] = 'metrics'
+        config['col_time'] = 'timestamp'
+        config['col_metric'] = 'metric'
+        config['col_value'] = 'value'
+        config['batch'] = 2
+        self.handler = mod.MySQLHandler(config)
+        self.cursor = self.handler.conn.cursor.return_value
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_batch(self):
+        self.handler.process(Metric('servers.host.cpu.idle', 1,
+                                    timestamp=1234567))
+        self.assertFalse(self.cursor.executemany.called)
+        self.handler.process(Metric('servers.host.cpu.user', 2.5,
+                                    precision=1, timestamp=1234567))
+
+        self.cursor.executemany.assert_called_once_with(
+            'INSERT INTO metrics (metric, timestamp, value) '
+            'VALUES (%s, %s, %s)',
+            [('servers.host.cpu.idle', 1234567, '1'),
+             ('servers.host.cpu.user', 1234567, '2.5')])
+        self.assertEqual(self.handler.conn.commit.call_count, 1)
+        self.assertEqual(self.handler.metrics, [])
+
+    def test_invalid_precision(self):
+        metric = Metric('servers.host.cpu.idle', 1.5, timestamp=1234567)
+        metric.precision = None
+        self.handler.process(metric)
+        self.assertEqual(self.handler.metrics,
+                         [('servers.host.cpu.idle', 1234567, '2')])
+
+    def test_flush(self):
+        self.handler.process(Metric('servers.host.cpu.idle', 1,
+                                    timestamp=1234567))
+        self.handler.flush()
+        self.assertEqual(self.cursor.executemany.call_count, 1)
+        self.handler.flush()
+        self.assertEqual(self.cursor.executemany.call_count, 1)
+
+    def test_reconnect_backoff(self):
+        self.cursor.executemany.side_effect = MySQLError('gone away')
+        self.mysqldb.Connect.side_effect = MySQLError('refused')
+
+        self.handler.process(Metric('servers.host.cpu.idle', 1,
+                                    timestamp=1234567))
+        self.handler.flush()
+        self.assertEqual(self.handler.conn, None)
+        self.assertEqual(len(self.handler.metrics), 1)
+
+        # The first attempt fails, the next ones wait for the backoff
+        self.handler.flush()
+        self.handler.flush()
+        self.assertEqual(self.mysqldb.Connect.call_count, 2)
+        self.assertEqual(self.handler.reconnect_interval, 1)
+        self.assertEqual(len(self.handler.metrics), 1)
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -4,8 +4,11 @@
 
 from test import unittest
 from test import run_only
+from mock import Mock
+from mock import patch
 import configobj
 
+import diamond.handler.riemann as mod
 from diamond.handler.riemann import RiemannHandler
 from diamond.metric import Metric
 
@@ -42,3 +45,54 @@ class TestRiemannHandler(unittest.TestCase):
             'metric': 0.0,
             'ttl': None
         })
+
+
+class TestRiemannHandlerBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.patcher = patch.object(mod, 'bernhard', Mock())
+        self.bernhard = self.patcher.start()
+        self.bernhard.Event.side_effect = lambda params: params
+        self.bernhard.Message.side_effect = lambda events: events
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def _handler(self, **options):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config['port'] = 5555
+        config.update(options)
+        return RiemannHandler(config)
+
+    def _metric(self, value):
+        return Metric('servers.com.example.www.cpu.total.idle', value,
+                      timestamp=1234567, host='com.example.www')
+
+    def test_batch(self):
+        handler = self._handler(batch=2)
+        handler.process(self._metric(1))
+        self.assertFalse(handler.client.transmit.called)
+        handler.process(self._metric(2))
+
+        handler.client.transmit.assert_called_once_with([
+            handler._metric_to_riemann_event(self._metric(1)),
+            handler._metric_to_riemann_event(self._metric(2))])
+        self.assertEqual(handler.events, [])
+
+    def test_flush(self):
+        handler = self._handler()
+        handler.process(self._metric(1))
+        handler.flush()
+        self.assertEqual(handler.client.transmit.call_count, 1)
+        handler.flush()
+        self.assertEqual(handler.client.transmit.call_count, 1)
+
+    def test_batch_max_interval(self):
+        handler = self._handler(batch_max_interval=0)
+        handler.process(self._metric(1))
+        self.assertEqual(handler.client.transmit.call_count, 1)
+
+    def test_udp_batch_size(self):
+        handler = self._handler(transport='udp', batch=1000)
+        self.assertEqual(handler.batch_size, mod.UDP_MAX_BATCH_SIZE)
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+import os
+import shutil
+import stat
+import tempfile
+
+from test import unittest
+from mock import Mock
+
+import configobj
+
+from diamond.handler.rrdtool import RRDHandler
+from diamond.handler.rrdtool import RRDToolPipe
+from diamond.metric import Metric
+
+
+class TestRRDHandler(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = tempfile.mkdtemp()
+        config = configobj.ConfigObj()
+        config['basedir'] = self.basedir
+        config['engine'] = 'pipe'
+        self.handler = RRDHandler(config)
+        self.handler._engine = Mock()
+        self.handler._engine.run.side_effect = lambda commands: [
+            None] * len(commands)
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
+
+    def _metric(self, name, value, timestamp):
+        return Metric('servers.host.cpu.' + name, value, timestamp=timestamp,
+                      host='host')
+
+    def test_coalesce_on_flush(self):
+        self.handler.process(self._metric('idle', 1, 10))
+        self.handler.process(self._metric('user', 2, 10))
+        self.handler.process(self._metric('idle', 3, 20))
+        self.handler.process(self._metric('idle', 4, 20))
+        self.assertFalse(self.handler._engine.run.called)
+
+        self.handler.flush()
+        self.assertEqual(self.handler._engine.run.call_count, 1)
+        commands = self.handler._engine.run.call_args[0][0]
+
+        idle = os.path.join(self.basedir, 'host', 'cpu', 'idle.rrd')
+        user = os.path.join(self.basedir, 'host', 'cpu', 'user.rrd')
+        creates = sorted(c[1] for c in commands if c[0] == 'create')
+        updates = sorted(c[1:] for c in commands if c[0] == 'update')
+        self.assertEqual(creates, [idle, user])
+        self.assertEqual(updates, [[idle, '--', '10:1', '20:4'],
+                                   [user, '--', '10:2']])
+
+        # Created files are cached
+        self.handler.process(self._metric('idle', 5, 30))
+        self.handler.flush()
+        commands = self.handler._engine.run.call_args[0][0]
+        self.assertEqual(commands, [['update', idle, '--', '30:5']])
+
+    def test_drop_old_updates(self):
+        self.handler.process(self._metric('idle', 1, 20))
+        self.handler.flush()
+        self.handler.process(self._metric('idle', 2, 10))
+        self.handler.flush()
+        self.assertEqual(self.handler._engine.run.call_count, 1)
+
+    def test_failed_create_kept(self):
+        self.handler._engine.run.side_effect = lambda commands: [
+            'failed'] * len(commands)
+        self.handler.process(self._metric('idle', 1, 10))
+        self.handler.flush()
+
+        idle = os.path.join(self.basedir, 'host', 'cpu', 'idle.rrd')
+        self.assertTrue(idle in self.handler._creates)
+        self.assertFalse(idle in self.handler._exists_cache)
+
+    def test_batch(self):
+        self.handler._batch = 2
+        self.handler.process(self._metric('idle', 1, 10))
+        self.assertFalse(self.handler._engine.run.called)
+        self.handler.process(self._metric('idle', 2, 20))
+        self.assertEqual(self.handler._engine.run.call_count, 1)
+
+
+class TestRRDToolPipe(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        # Mimic the rrdtool pipe mode replies
+        self.binary = os.path.join(self.tmpdir, 'rrdtool')
+        with open(self.binary, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    'while read cmd args; do\n'
+                    '  if [ "$cmd" = "update" ]; then echo "OK u:0.00"\n'
+                    '  else echo "ERROR: unknown $cmd"; fi\n'
+                    'done\n')
+        os.chmod(self.binary, stat.S_IRWXU)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_run(self):
+        pipe = RRDToolPipe(self.binary)
+        try:
+            commands = [['update', 'a.rrd', '--', '10:1'],
+                        ['bogus', 'a.rrd']] * 300
+            results = pipe.run(commands)
+            self.assertEqual(results, [None, 'ERROR: unknown bogus'] * 300)
+
+            # The same process is reused
+            process = pipe.process
+            pipe.run([['update', 'b.rrd', '--', '10:1']])
+            self.assertTrue(pipe.process is process)
+        finally:
+            pipe.close()
+
+    def test_missing_binary(self):
+        pipe = RRDToolPipe(os.path.join(self.tmpdir, 'missing'))
+        results = pipe.run([['update', 'a.rrd', '--', '10:1']] * 3)
+        self.assertEqual(len(results), 3)
+        self.assertTrue(results[0].startswith('Failed to run'))
+        self.assertTrue(pipe.process is None)
+
+    def test_format(self):
+        pipe = RRDToolPipe(self.binary)
+        self.assertEqual(pipe._format(['update', '/a b.rrd', '10:1']),
+                         'update "/a b.rrd" 10:1\n')
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
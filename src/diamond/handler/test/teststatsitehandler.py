@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import configobj
+
+from diamond.handler.statsite import StatsiteHandler
+from diamond.handler.statsite import UDP_MAX_BATCH_BYTES
+from diamond.metric import Metric
+
+
+@patch('diamond.handler.statsite.StatsiteHandler._connect')
+@patch('diamond.handler.statsite.StatsiteHandler._send')
+class TestStatsiteHandler(unittest.TestCase):
+
+    def _handler(self, **options):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config.update(options)
+        return StatsiteHandler(config)
+
+    def test_batch(self, mock_send, mock_connect):
+        handler = self._handler(batch=2)
+        handler.process(Metric('servers.host.cpu.idle', 1.5, precision=2,
+                               timestamp=1234567))
+        self.assertFalse(mock_send.called)
+        handler.process(Metric('servers.host.cpu.user', 3,
+                               timestamp=1234567))
+        mock_send.assert_called_once_with('servers.host.cpu.idle:1.50|kv\n'
+                                          'servers.host.cpu.user:3|kv\n')
+
+    def test_flush(self, mock_send, mock_connect):
+        handler = self._handler()
+        handler.process(Metric('servers.host.cpu.idle', 1,
+                               timestamp=1234567))
+        self.assertFalse(mock_send.called)
+        handler.flush()
+        mock_send.assert_called_once_with('servers.host.cpu.idle:1|kv\n')
+
+    def test_udp_batch_max_bytes(self, mock_send, mock_connect):
+        handler = self._handler(udpport=1234)
+        self.assertEqual(handler.batch_max_bytes, UDP_MAX_BATCH_BYTES)
+        handler = self._handler(udpport=0, tcpport=1234)
+        self.assertEqual(handler.batch_max_bytes, 65536)
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import patch
+
+import configobj
+
+from diamond.handler.tsdb import TSDBHandler
+from diamond.metric import Metric
+
+
+@patch('diamond.handler.tsdb.TSDBHandler._connect')
+@patch('diamond.handler.tsdb.TSDBHandler._send')
+class TestTSDBHandler(unittest.TestCase):
+
+    def _handler(self, **options):
+        config = configobj.ConfigObj()
+        config['host'] = 'localhost'
+        config.update(options)
+        return TSDBHandler(config)
+
+    def _metric(self, value):
+        return Metric('servers.host.cpu.total.idle', value,
+                      timestamp=1234567, host='host')
+
+    def test_batch_size(self, mock_send, mock_connect):
+        handler = self._handler(batch=2)
+        handler.process(self._metric(1))
+        self.assertFalse(mock_send.called)
+        handler.process(self._metric(2))
+        mock_send.assert_called_once_with(
+            'put cpu.total.idle 1234567 1 hostname=host\n'
+            'put cpu.total.idle 1234567 2 hostname=host\n')
+        self.assertEqual(handler.buffer, [])
+
+    def test_batch_max_bytes(self, mock_send, mock_connect):
+        handler = self._handler(batch=100, batch_max_bytes=50)
+        handler.process(self._metric(1))
+        self.assertFalse(mock_send.called)
+        handler.process(self._metric(2))
+        mock_send.assert_called_once_with(
+            'put cpu.total.idle 1234567 1 hostname=host\n')
+        self.assertEqual(len(handler.buffer), 1)
+
+    def test_batch_max_interval(self, mock_send, mock_connect):
+        handler = self._handler(batch=100, batch_max_interval=0)
+        handler.process(self._metric(1))
+        self.assertEqual(mock_send.call_count, 1)
+
+    def test_flush(self, mock_send, mock_connect):
+        handler = self._handler(batch=100)
+        handler.process(self._metric(1))
+        handler.flush()
+        mock_send.assert_called_once_with(
+            'put cpu.total.idle 1234567 1 hostname=host\n')
+        handler.flush()
+        self.assertEqual(mock_send.call_count, 1)
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
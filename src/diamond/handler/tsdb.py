@@ -36,11 +36,14 @@ yourself.
 
 """
 
+from Handler import BatchMixin
 from Handler import Handler
+from connection import AsyncConnection
+from diamond.utils.config import str_to_bool
 import socket
 
 
-class TSDBHandler(Handler):
+class TSDBHandler(BatchMixin, Handler):
     """
     Implements the abstract Handler class, sending data to graphite
     """
@@ -55,6 +58,7 @@ class TSDBHandler(Handler):
 
         # Initialize Data
         self.socket = None
+        self.connection = None
 
         # Initialize Options
         self.host = self.config['host']
@@ -62,6 +66,16 @@ class TSDBHandler(Handler):
         self.timeout = int(self.config['timeout'])
         self.metric_format = str(self.config['format'])
         self.tags = str(self.config['tags'])
+        self._init_batch()
+
+        # Hand the data to a background event loop rather than blocking on
+        # the socket
+        if str_to_bool(self.config['nonblocking']):
+            self.connection = AsyncConnection(
+                self.host, self.port, 'tcp',
+                max_buffer_size=self.config['nonblocking_buffer_size'],
+                name='TSDBHandler', log=self.log)
+            return
 
         # Connect
         self._connect()
@@ -78,6 +92,10 @@ class TSDBHandler(Handler):
             'timeout': '',
             'format': '',
             'tags': '',
+            'nonblocking': 'Send from a background event loop, so an ' +
+                           'unreachable server never blocks the handler',
+            'nonblocking_buffer_size': 'Maximum size in bytes of the ' +
+                                       'nonblocking send buffer',
         })
 
         return config
@@ -95,6 +113,8 @@ class TSDBHandler(Handler):
             'format': '{Collector}.{Metric} {timestamp} {value} hostname={host}'
                       '{tags}',
             'tags': '',
+            'nonblocking': False,
+            'nonblocking_buffer_size': 4194304,
         })
 
         return config
@@ -103,11 +123,13 @@ class TSDBHandler(Handler):
         """
         Destroy instance of the TSDBHandler class
         """
+        if self.connection is not None:
+            self.connection.close()
         self._close()
 
     def process(self, metric):
         """
-        Process a metric by sending it to TSDB
+        Process a metric by buffering it for TSDB
         """
 
         metric_str = self.metric_format.format(
@@ -119,13 +141,18 @@ class TSDBHandler(Handler):
             value=metric.value,
             tags=self.tags
         )
-        # Just send the data as a string
-        self._send("put " + str(metric_str) + "\n")
+        self._buffer("put " + str(metric_str) + "\n")
 
     def _send(self, data):
         """
         Send data to TSDB. Data that can not be sent will be queued.
         """
+        if self.connection is not None:
+            if not self.connection.send(data):
+                self._throttle_error("TSDBHandler: Send buffer is full, "
+                                     "dropping data.")
+            return
+
         retry = self.RETRY
         # Attempt to send any data in the queue
         while retry > 0:
@@ -3,11 +3,32 @@
 import time
 import re
 import logging
+import marshal
+import os.path
+from array import array
+from itertools import izip
 from error import DiamondException
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+# Markers for the encoding used by encode_metrics
+_MARSHAL_BATCH = 'M'
+_PICKLE_BATCH = 'P'
+
+# Column encodings used by encode_metrics
+_CONSTANT_COLUMN = '='
+_LIST_COLUMN = '*'
+
 
 class Metric(object):
 
+    # Metrics are created by the thousands, so keep them small
+    __slots__ = ['path', 'value', 'raw_value', 'timestamp', 'precision',
+                 'host', 'metric_type', 'ttl', '_path_parts']
+
     _METRIC_TYPES = ['COUNTER', 'GAUGE']
 
     def __init__(self, path, value, raw_value=None, timestamp=None, precision=0,
@@ -63,6 +84,7 @@ class Metric(object):
         self.host = host
         self.metric_type = metric_type
         self.ttl = ttl
+        self._path_parts = None
 
     def __repr__(self):
         """
@@ -98,19 +120,52 @@ class Metric(object):
             raise DiamondException(
                 "Metric could not be parsed from string: %s." % string)
 
+    def __getstate__(self):
+        return dict((slot, getattr(self, slot)) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot in self.__slots__:
+            setattr(self, slot, state.get(slot))
+
+    def _getPathParts(self):
+        """
+            Returns the path prefix, collector path and metric path, split
+            once per path and host and memoized
+        """
+        parts = self._path_parts
+        if (parts is None or parts[0] is not self.path
+                or parts[1] is not self.host):
+            parts = (self.path, self.host) + self._splitPath()
+            self._path_parts = parts
+        return parts
+
+    def _splitPath(self):
+        path = self.path
+
+        # If we don't have a host name, assume the path is
+        # prefix.host.collector.metric
+        if self.host is None:
+            parts = path.split('.')
+            if len(parts) < 3:
+                return parts[0], None, '.'.join(parts[3:])
+            return parts[0], parts[2], '.'.join(parts[3:])
+
+        offset = path.index(self.host)
+        prefix = path[0:offset - 1]
+
+        offset += len(self.host) + 1
+        endoffset = path.find('.', offset)
+        if endoffset == -1:
+            return prefix, None, None
+        return prefix, path[offset:endoffset], path[endoffset + 1:]
+
     def getPathPrefix(self):
         """
             Returns the path prefix path
             servers.host.cpu.total.idle
             return "servers"
         """
-        # If we don't have a host name, assume it's just the first part of the
-        # metric path
-        if self.host is None:
-            return self.path.split('.')[0]
-
-        offset = self.path.index(self.host) - 1
-        return self.path[0:offset]
+        return self._getPathParts()[2]
 
     def getCollectorPath(self):
         """
@@ -118,15 +173,10 @@ class Metric(object):
             servers.host.cpu.total.idle
             return "cpu"
         """
-        # If we don't have a host name, assume it's just the third part of the
-        # metric path
-        if self.host is None:
-            return self.path.split('.')[2]
-
-        offset = self.path.index(self.host)
-        offset += len(self.host) + 1
-        endoffset = self.path.index('.', offset)
-        return self.path[offset:endoffset]
+        collector = self._getPathParts()[3]
+        if collector is None:
+            raise ValueError('No collector path in metric %s' % self.path)
+        return collector
 
     def getMetricPath(self):
         """
@@ -134,14 +184,110 @@ class Metric(object):
             servers.host.cpu.total.idle
             return "total.idle"
         """
-        # If we don't have a host name, assume it's just the fourth+ part of the
-        # metric path
-        if self.host is None:
-            path = self.path.split('.')[3:]
-            return '.'.join(path)
+        path = self._getPathParts()[4]
+        if path is None:
+            raise ValueError('No metric path in metric %s' % self.path)
+        return path
+
+
+def _pack_column(values):
+    """
+    Pack a column of metric attributes. Columns holding a single repeated
+    value are stored once, homogeneous int or float columns as arrays.
+    """
+    types = set(map(type, values))
+    if len(types) == 1:
+        if values.count(values[0]) == len(values):
+            return (_CONSTANT_COLUMN, values[0])
+        kind = types.pop()
+        if kind is float:
+            return ('d', array('d', values).tostring())
+        if kind is int:
+            return ('l', array('l', values).tostring())
+    return (_LIST_COLUMN, values)
+
+
+def _unpack_column(column, length):
+    encoding, data = column
+    if encoding == _CONSTANT_COLUMN:
+        return [data] * length
+    if encoding == _LIST_COLUMN:
+        return data
+    values = array(encoding)
+    values.fromstring(data)
+    return values
+
+
+def encode_metrics(metrics):
+    """
+    Encode a list of metrics into a compact byte string
+
+    The path prefix shared by all metrics in the batch is stored once and the
+    remaining attributes are packed as columns. Batches holding attributes
+    that can not be marshaled fall back to pickle.
+    """
+    if not metrics:
+        return _PICKLE_BATCH + pickle.dumps([], pickle.HIGHEST_PROTOCOL)
+
+    paths = [metric.path for metric in metrics]
+    prefix = os.path.commonprefix(paths)
+    prefix = prefix[:prefix.rfind('.') + 1]
+    offset = len(prefix)
+
+    try:
+        return _MARSHAL_BATCH + marshal.dumps((
+            prefix,
+            [path[offset:] for path in paths],
+            _pack_column([metric.value for metric in metrics]),
+            _pack_column([metric.raw_value for metric in metrics]),
+            _pack_column([metric.timestamp for metric in metrics]),
+            _pack_column([metric.precision for metric in metrics]),
+            _pack_column([metric.host for metric in metrics]),
+            _pack_column([metric.metric_type for metric in metrics]),
+            _pack_column([metric.ttl for metric in metrics]),
+        ))
+    except ValueError:
+        return _PICKLE_BATCH + pickle.dumps(list(metrics),
+                                            pickle.HIGHEST_PROTOCOL)
+
+
+def decode_metrics(data):
+    """
+    Decode a byte string created by encode_metrics. The returned batch
+    creates the Metric instances lazily while it is iterated.
+    """
+    if data[0] == _PICKLE_BATCH:
+        return pickle.loads(data[1:])
+    return MetricBatch(*marshal.loads(data[1:]))
+
+
+class MetricBatch(object):
+    """
+    A decoded batch of metrics, as created by decode_metrics
+    """
+
+    def __init__(self, prefix, suffixes, *columns):
+        self.prefix = prefix
+        self.suffixes = suffixes
+        self.columns = [_unpack_column(column, len(suffixes))
+                        for column in columns]
 
-        prefix = '.'.join([self.getPathPrefix(), self.host,
-                           self.getCollectorPath()])
+    def __len__(self):
+        return len(self.suffixes)
 
-        offset = len(prefix) + 1
-        return self.path[offset:]
+    def __iter__(self):
+        prefix = self.prefix
+        for (suffix, value, raw_value, timestamp, precision, host,
+             metric_type, ttl) in izip(self.suffixes, *self.columns):
+            # The metric was validated when it was created, skip __init__
+            metric = Metric.__new__(Metric)
+            metric.path = prefix + suffix
+            metric.value = value
+            metric.raw_value = raw_value
+            metric.timestamp = timestamp
+            metric.precision = precision
+            metric.host = host
+            metric.metric_type = metric_type
+            metric.ttl = ttl
+            metric._path_parts = None
+            yield metric
@@ -19,21 +19,45 @@ sys.path.append(
             os.path.dirname(__file__), "../")))
 
 from diamond.utils.classes import initialize_collector
-from diamond.utils.classes import load_collectors
+from diamond.utils.classes import load_enabled_collectors
 from diamond.utils.classes import load_dynamic_class
 from diamond.utils.classes import load_handlers
 from diamond.utils.classes import load_include_path
 
 from diamond.utils.config import load_config
+from diamond.utils.config import str_to_bool
 
+from diamond.utils.scheduler import collector_pool_process
 from diamond.utils.scheduler import collector_process
 from diamond.utils.scheduler import handler_process
 
+from diamond.utils.transport import DEFAULT_BUFFER_SIZE
+from diamond.utils.transport import RingBufferQueue
+
 from diamond.handler.Handler import Handler
 
 from diamond.utils.signals import signal_to_exception
 from diamond.utils.signals import SIGHUPException
 
+# Collectors that only read /proc and are cheap enough to share a process when
+# the pool execution model is used
+POOL_COLLECTORS = [
+    'CPUCollector',
+    'DiskSpaceCollector',
+    'DiskUsageCollector',
+    'EntropyStatCollector',
+    'InterruptCollector',
+    'LoadAverageCollector',
+    'MemoryCollector',
+    'NetworkCollector',
+    'SockstatCollector',
+    'TCPCollector',
+    'UDPCollector',
+    'VMStatCollector',
+]
+
+POOL_PROCESS_NAME = 'Pool Worker'
+
 
 class Server(object):
     """
@@ -49,6 +73,30 @@ class Server(object):
         self.handlers = []
         self.handler_queue = []
         self.modules = {}
+        self.manager = None
+        self.metric_queue = None
+        self.pooled_collectors = set()
+        # Collectors run by each pool worker, by worker process name
+        self.pool_groups = {}
+
+    def create_metric_queue(self):
+        """
+        Create the queue used to pass metrics from the collectors to the
+        handlers, as selected by the transport server option
+        """
+        transport = self.config['server'].get('transport', 'ringbuffer')
+
+        if transport == 'ringbuffer':
+            size = int(self.config['server'].get('transport_buffer_size',
+                                                 DEFAULT_BUFFER_SIZE))
+            try:
+                return RingBufferQueue(size)
+            except (OSError, ValueError):
+                self.log.exception('Failed to create ring buffer transport, '
+                                   'falling back to the queue transport')
+        elif transport != 'queue':
+            self.log.error('Unknown transport %s, using the queue transport',
+                           transport)
 
         # We do this weird process title swap around to get the sync manager
         # title correct for ps
@@ -58,7 +106,121 @@ class Server(object):
         self.manager = multiprocessing.Manager()
         if setproctitle:
             setproctitle(oldproctitle)
-        self.metric_queue = self.manager.Queue()
+        return self.manager.Queue()
+
+    def load_collectors(self):
+        """
+        Load the classes of the enabled collectors, only importing the
+        modules defining them
+        """
+        names = set()
+        for collector, config in self.config['collectors'].iteritems():
+            if config.get('enabled', False) is not True:
+                continue
+            if 'Collector' not in collector.split()[0]:
+                continue
+            names.add(collector.split()[0])
+
+        return load_enabled_collectors(
+            self.config['server']['collectors_path'],
+            names,
+            index_file=self.config['server'].get('collectors_index_file'))
+
+    def create_collector(self, collectors, process_name):
+        """
+        Find the class of and initialize a collector
+        """
+        # To handle running multiple collectors concurrently, we
+        # split on white space and use the first word as the
+        # collector name to spin
+        collector_name = process_name.split()[0]
+
+        # Find the class
+        for cls in collectors.values():
+            cls_name = cls.__name__.split('.')[-1]
+            if cls_name == collector_name:
+                break
+        else:
+            self.log.error('Can not find collector %s', collector_name)
+            return None
+
+        collector = initialize_collector(
+            cls,
+            name=process_name,
+            configfile=self.configfile,
+            handlers=[self.handler_queue])
+
+        if collector is None:
+            self.log.error('Failed to load collector %s', process_name)
+
+        return collector
+
+    def get_pooled_collectors(self, running_collectors):
+        """
+        Returns the enabled collectors that should run in the worker pool
+        """
+        if self.config['server'].get('execution_model', 'process') != 'pool':
+            return set()
+
+        pool_collectors = self.config['server'].get('pool_collectors',
+                                                    POOL_COLLECTORS)
+        if isinstance(pool_collectors, basestring):
+            pool_collectors = [pool_collectors]
+
+        return set(name for name in running_collectors
+                   if name.split()[0] in pool_collectors)
+
+    def start_pool(self, collectors, pooled_collectors, active_children,
+                   splay=False, align=False):
+        """
+        (Re)start the worker processes sharing the pooled collectors
+        """
+        for process in active_children:
+            if process.name.startswith(POOL_PROCESS_NAME):
+                process.terminate()
+
+        self.pooled_collectors = pooled_collectors
+        self.pool_groups = {}
+
+        names = sorted(pooled_collectors)
+        if not names:
+            return
+
+        workers = min(int(self.config['server'].get('pool_workers', 2)),
+                      len(names))
+
+        for worker in range(workers):
+            self.start_pool_worker(collectors,
+                                   '%s %d' % (POOL_PROCESS_NAME, worker),
+                                   names[worker::workers],
+                                   splay=splay, align=align)
+
+    def start_pool_worker(self, collectors, worker_name, process_names,
+                          splay=False, align=False):
+        """
+        Start a pool worker running the given collectors, so a worker that
+        died is restarted without touching the others
+        """
+        instances = []
+        for process_name in process_names:
+            collector = self.create_collector(collectors, process_name)
+            if collector is not None:
+                instances.append(collector)
+
+        if not instances:
+            self.pool_groups.pop(worker_name, None)
+            return
+
+        self.pool_groups[worker_name] = process_names
+
+        process = multiprocessing.Process(
+            name=worker_name,
+            target=collector_pool_process,
+            args=(instances, self.metric_queue, self.log),
+            kwargs={'splay': splay, 'align': align},
+            )
+        process.daemon = True
+        process.start()
 
     def run(self):
         """
@@ -70,7 +232,13 @@ class Server(object):
         ########################################################################
         self.config = load_config(self.configfile)
 
-        collectors = load_collectors(self.config['server']['collectors_path'])
+        collectors = self.load_collectors()
+
+        ########################################################################
+        # Transport
+        ########################################################################
+
+        self.metric_queue = self.create_metric_queue()
 
         ########################################################################
         # Handlers
@@ -147,6 +315,18 @@ class Server(object):
                     running_collectors.append(collector)
                 running_collectors = set(running_collectors)
 
+                # Start collectors immediately and spread their first run
+                # across the interval rather than sleeping between spawns
+                splay = str_to_bool(
+                    self.config['server'].get('collectors_splay', False))
+                align = str_to_bool(
+                    self.config['server'].get('collectors_align', False))
+
+                # Lightweight collectors sharing the worker pool
+                pooled_collectors = self.get_pooled_collectors(
+                    running_collectors)
+                running_collectors -= pooled_collectors
+
                 # Collectors that are running but shouldn't be
                 for process_name in running_processes - running_collectors:
                     if 'Collector' not in process_name:
@@ -155,43 +335,40 @@ class Server(object):
                         if process.name == process_name:
                             process.terminate()
 
-                for process_name in running_collectors - running_processes:
-                    # To handle running multiple collectors concurrently, we
-                    # split on white space and use the first word as the
-                    # collector name to spin
-                    collector_name = process_name.split()[0]
+                # Restart the pool when its collectors changed, and only
+                # the workers that died otherwise
+                if pooled_collectors != self.pooled_collectors:
+                    self.start_pool(collectors, pooled_collectors,
+                                    active_children, splay=splay, align=align)
+                else:
+                    for worker_name, process_names in sorted(
+                            self.pool_groups.items()):
+                        if worker_name in running_processes:
+                            continue
+                        self.log.warning('%s died, restarting it',
+                                         worker_name)
+                        self.start_pool_worker(collectors, worker_name,
+                                               process_names, splay=splay,
+                                               align=align)
 
-                    if 'Collector' not in collector_name:
-                        continue
-
-                    # Find the class
-                    for cls in collectors.values():
-                        cls_name = cls.__name__.split('.')[-1]
-                        if cls_name == collector_name:
-                            break
-                    if cls_name != collector_name:
-                        self.log.error('Can not find collector %s',
-                                       collector_name)
+                for process_name in running_collectors - running_processes:
+                    if 'Collector' not in process_name.split()[0]:
                         continue
 
-                    collector = initialize_collector(
-                        cls,
-                        name=process_name,
-                        configfile=self.configfile,
-                        handlers=[self.handler_queue])
-
+                    collector = self.create_collector(collectors,
+                                                      process_name)
                     if collector is None:
-                        self.log.error('Failed to load collector %s',
-                                       process_name)
                         continue
 
                     # Splay the loads
-                    time.sleep(1)
+                    if not splay:
+                        time.sleep(1)
 
                     process = multiprocessing.Process(
                         name=process_name,
                         target=collector_process,
-                        args=(collector, self.metric_queue, self.log)
+                        args=(collector, self.metric_queue, self.log),
+                        kwargs={'splay': splay, 'align': align},
                         )
                     process.daemon = True
                     process.start()
@@ -203,5 +380,4 @@ class Server(object):
             except SIGHUPException:
                 self.log.info('Reloading state due to HUP')
                 self.config = load_config(self.configfile)
-                collectors = load_collectors(
-                    self.config['server']['collectors_path'])
+                collectors = self.load_collectors()
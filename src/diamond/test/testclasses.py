@@ -0,0 +1,49 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+import os
+import shutil
+import tempfile
+
+from diamond.utils.classes import get_collectors_index
+from diamond.utils.classes import load_enabled_collectors
+
+
+class TestCollectorsIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, 'indexed'))
+        os.mkdir(os.path.join(self.path, 'indexed', 'test'))
+        self.write('indexed/indexed.py',
+                   'import diamond.collector\n\n\n'
+                   'class IndexedCollector(diamond.collector.Collector):\n'
+                   '    pass\n')
+        self.write('indexed/test/testindexed.py',
+                   'class TestIndexedCollector(object):\n'
+                   '    pass\n')
+        self.write('broken.py', 'class BrokenCollector(\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, content):
+        with open(os.path.join(self.path, name), 'w') as f:
+            f.write(content)
+
+    def test_get_collectors_index(self):
+        index_file = os.path.join(self.path, 'collectors.index')
+        index = get_collectors_index(self.path, index_file)
+
+        self.assertEqual(index, {
+            'IndexedCollector': [os.path.join(self.path, 'indexed',
+                                              'indexed.py')],
+        })
+        self.assertTrue(os.path.exists(index_file))
+
+    def test_load_enabled_collectors(self):
+        collectors = load_enabled_collectors(self.path, ['IndexedCollector',
+                                                         'MissingCollector'])
+        self.assertEqual(collectors.keys(), ['IndexedCollector'])
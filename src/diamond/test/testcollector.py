@@ -4,6 +4,9 @@
 
 from test import unittest
 import configobj
+import threading
+import time
+from mock import Mock
 
 from diamond.collector import Collector
 
@@ -32,3 +35,159 @@ class BaseCollectorTest(unittest.TestCase):
         }
         c = Collector(config, [])
         self.assertEquals('custom.localhost', c.get_hostname())
+
+    def test_get_metric_path_cache(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+        }
+        c = Collector(config, [])
+        self.assertEquals('servers.custom.localhost.Collector.foo',
+                          c.get_metric_path('foo'))
+        self.assertEquals('instances.vm.Collector.foo',
+                          c.get_metric_path('foo', instance='vm'))
+
+        c.config['path_prefix'] = 'systems'
+        c.process_config()
+        self.assertEquals('systems.custom.localhost.Collector.foo',
+                          c.get_metric_path('foo'))
+
+    def test_metrics_whitelist_patterns(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'metrics_whitelist': ['^cpu\.', '^load$'],
+        }
+        c = Collector(config, [])
+        self.assertTrue(c.is_metric_allowed('cpu.idle'))
+        self.assertTrue(c.is_metric_allowed('load'))
+        self.assertFalse(c.is_metric_allowed('loadavg'))
+        self.assertFalse(c.is_metric_allowed('memory.free'))
+
+    def test_metrics_blacklist_cache(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+            'metrics_blacklist': '^cpu\.',
+        }
+        c = Collector(config, [])
+        c.publish_metric = Mock()
+        c.publish('cpu.idle', 1)
+        c.publish('memory.free', 1)
+        self.assertEquals(c.publish_metric.call_count, 1)
+
+        c.config['metrics_blacklist'] = '^memory\.'
+        c.process_config()
+        c.publish('cpu.idle', 1)
+        c.publish('memory.free', 1)
+        self.assertEquals(c.publish_metric.call_count, 2)
+
+    def test_derivative_many(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+            'interval': 10,
+        }
+        c = Collector(config, [])
+        self.assertEquals(c.derivative_many(['a', 'b'], [10, 100], 1000),
+                          [0, 0])
+        self.assertEquals(c.derivative_many(['a', 'b'], [110, 50],
+                                            [1000, 1000]),
+                          [10.0, 95.0])
+        self.assertEquals(c.derivative('a', 100), 0)
+        self.assertEquals(c.derivative('a', 120, allow_negative=True), 2.0)
+
+    def test_publish_counters(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+            'interval': 10,
+        }
+        c = Collector(config, [])
+        c.publish_metric = Mock()
+        c.publish_counters({'a': 10, 'b': 20})
+        c.publish_counters({'a': 30, 'b': 20})
+
+        metrics = dict((m[0][0].path, m[0][0])
+                       for m in c.publish_metric.call_args_list[2:])
+        a = metrics['servers.custom.localhost.Collector.a']
+        self.assertEquals(a.value, 2.0)
+        self.assertEquals(a.raw_value, 30)
+        self.assertEquals(a.metric_type, 'COUNTER')
+        self.assertEquals(metrics['servers.custom.localhost.Collector.b'].value,
+                          0)
+
+    def _concurrent_collector(self):
+        config = configobj.ConfigObj()
+        config['server'] = {}
+        config['server']['collectors_config_path'] = ''
+        config['collectors'] = {}
+        config['collectors']['default'] = {
+            'hostname': 'custom.localhost',
+        }
+        handler = Mock()
+        handler.threads = []
+        handler._process.side_effect = lambda metric: handler.threads.append(
+            threading.current_thread())
+        return Collector(config, [handler]), handler
+
+    def test_run_concurrently(self):
+        c, handler = self._concurrent_collector()
+
+        def collect(name, delay):
+            time.sleep(delay)
+            c.publish(name, 1)
+            return name
+
+        start = time.time()
+        results = c.run_concurrently(collect, [('a', 0.3), ('b', 0.2),
+                                               ('c', 0.1), ('d', 0)],
+                                     max_workers=4, timeout=5)
+        self.assertTrue(time.time() - start < 0.6)
+        self.assertEquals(results, ['a', 'b', 'c', 'd'])
+
+        # The metrics are published from the calling thread
+        paths = [m[0][0].path for m in handler._process.call_args_list]
+        self.assertEquals(paths, ['servers.custom.localhost.Collector.d',
+                                  'servers.custom.localhost.Collector.c',
+                                  'servers.custom.localhost.Collector.b',
+                                  'servers.custom.localhost.Collector.a'])
+        self.assertEquals(set(handler.threads),
+                          set([threading.current_thread()]))
+
+    def test_run_concurrently_timeout(self):
+        c, handler = self._concurrent_collector()
+
+        def collect(name, delay):
+            c.publish(name, 1)
+            if delay is None:
+                raise ValueError(name)
+            time.sleep(delay)
+            return name
+
+        start = time.time()
+        results = c.run_concurrently(collect, [('slow', 1), ('error', None),
+                                               ('a', 0), ('b', 0)],
+                                     max_workers=2, timeout=0.2)
+        self.assertTrue(time.time() - start < 0.8)
+        self.assertEquals(results, [None, None, 'a', 'b'])
+
+        # The metrics of the timed out call are dropped
+        paths = sorted(m[0][0].path for m in handler._process.call_args_list)
+        self.assertEquals(paths, ['servers.custom.localhost.Collector.a',
+                                  'servers.custom.localhost.Collector.b',
+                                  'servers.custom.localhost.Collector.error'])
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+import os
+import shutil
+import tempfile
+
+from diamond.utils.config import load_config
+from diamond.utils.config import read_config_file
+
+
+class TestLoadConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.collectors_path = os.path.join(self.path, 'collectors')
+        os.mkdir(self.collectors_path)
+        self.configfile = os.path.join(self.path, 'diamond.conf')
+        self.write(self.configfile,
+                   '[server]\ncollectors_config_path = %s\n'
+                   % self.collectors_path)
+        self.write(os.path.join(self.collectors_path, 'CPUCollector.conf'),
+                   'enabled = True\n', mtime=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, path, content, mtime=None):
+        with open(path, 'w') as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_load_config(self):
+        config = load_config(self.configfile)
+        self.assertEqual(config['collectors']['CPUCollector']['enabled'],
+                         True)
+
+    def test_load_config_copy(self):
+        config = load_config(self.configfile)
+        config['collectors']['CPUCollector']['enabled'] = False
+
+        self.assertEqual(
+            load_config(self.configfile)['collectors']['CPUCollector'],
+            {'enabled': True})
+        self.assertTrue(load_config(self.configfile, copy=False) is
+                        load_config(self.configfile, copy=False))
+
+    def test_load_config_reloads_changed_files(self):
+        load_config(self.configfile)
+        self.write(os.path.join(self.collectors_path, 'CPUCollector.conf'),
+                   'enabled = False\n', mtime=200)
+
+        config = load_config(self.configfile)
+        self.assertEqual(config['collectors']['CPUCollector']['enabled'],
+                         False)
+
+    def test_read_config_file_cache(self):
+        configfile = os.path.join(self.collectors_path, 'CPUCollector.conf')
+        config = read_config_file(configfile)
+        self.assertTrue(read_config_file(configfile) is config)
+
+        self.write(configfile, 'enabled = False\n', mtime=300)
+        self.assertEqual(read_config_file(configfile)['enabled'], 'False')
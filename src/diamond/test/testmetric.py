@@ -3,8 +3,11 @@
 ################################################################################
 
 from test import unittest
+import pickle
 
 from diamond.metric import Metric
+from diamond.metric import decode_metrics
+from diamond.metric import encode_metrics
 
 
 class TestMetric(unittest.TestCase):
@@ -111,3 +114,58 @@ class TestMetric(unittest.TestCase):
                 message = 'Actual %s, expected %s' % (actual_value,
                                                       expected_value)
                 self.assertEqual(actual_value, expected_value, message)
+
+    def test_path_parts_follow_path_changes(self):
+        metric = Metric('servers.host.cpu.total.idle', 0, host='host')
+        self.assertEqual(metric.getCollectorPath(), 'cpu')
+
+        metric.path = 'servers.host.memory.free'
+        self.assertEqual(metric.getCollectorPath(), 'memory')
+        self.assertEqual(metric.getMetricPath(), 'free')
+
+    def test_pickle(self):
+        metric = Metric('servers.host.cpu.total.idle', 1, timestamp=10,
+                        host='host')
+
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            actual = pickle.loads(pickle.dumps(metric, protocol))
+            self.assertEqual(str(actual), str(metric))
+            self.assertEqual(actual.getMetricPath(), 'total.idle')
+
+    def assertMetricsEqual(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for a, e in zip(actual, expected):
+            for attr in ('path', 'value', 'raw_value', 'timestamp',
+                         'precision', 'host', 'metric_type', 'ttl'):
+                self.assertEqual(getattr(a, attr), getattr(e, attr))
+                self.assertEqual(type(getattr(a, attr)),
+                                 type(getattr(e, attr)))
+
+    def test_encode_metrics(self):
+        metrics = [
+            Metric('servers.host.cpu.total.idle', 1, raw_value=10,
+                   timestamp=100, host='host', ttl=20.0),
+            Metric('servers.host.cpu.total.user', 2.5, timestamp=101,
+                   precision=2, host='host', metric_type='GAUGE', ttl=20.0),
+            Metric('servers.host.cpu.cpu0.user', 3, raw_value=2 ** 70,
+                   timestamp=102, host='host', ttl=20.0),
+        ]
+
+        actual = list(decode_metrics(encode_metrics(metrics)))
+        self.assertMetricsEqual(actual, metrics)
+
+    def test_encode_metrics_no_common_prefix(self):
+        metrics = [Metric('a', 1, timestamp=1), Metric('b.c', 2, timestamp=1)]
+
+        actual = list(decode_metrics(encode_metrics(metrics)))
+        self.assertMetricsEqual(actual, metrics)
+
+    def test_encode_metrics_fallback(self):
+        metrics = [Metric('servers.host.cpu.idle', 1, raw_value=object(),
+                          timestamp=1)]
+
+        actual = list(decode_metrics(encode_metrics(metrics)))
+        self.assertEqual(actual[0].path, 'servers.host.cpu.idle')
+
+    def test_encode_metrics_empty(self):
+        self.assertEqual(list(decode_metrics(encode_metrics([]))), [])
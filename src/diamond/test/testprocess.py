@@ -0,0 +1,36 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+import multiprocessing
+
+from diamond.utils.process import ProcessLocal
+
+
+def _child(local, values):
+    values.put(local.get(lambda: 'child'))
+
+
+class TestProcessLocal(unittest.TestCase):
+
+    def test_get(self):
+        local = ProcessLocal()
+        value = local.get(object)
+        self.assertTrue(local.get(object) is value)
+
+    def test_get_after_fork(self):
+        local = ProcessLocal()
+        local.get(lambda: 'parent')
+
+        values = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_child,
+                                          args=(local, values))
+        process.start()
+        self.assertEqual(values.get(timeout=5), 'child')
+        process.join(5)
+        self.assertEqual(local.get(object), 'parent')
+
+##########################################################################
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+import time
+from mock import Mock
+
+from diamond.handler.Handler import Handler
+from diamond.utils.scheduler import HandlerWorker
+from diamond.utils.scheduler import first_collection
+from diamond.utils.scheduler import splay_offset
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_splay_offset(self):
+        offset = splay_offset('CPUCollector', 60)
+        self.assertTrue(0 <= offset < 60)
+        self.assertEqual(offset, splay_offset('CPUCollector', 60))
+        self.assertNotEqual(offset, splay_offset('MemoryCollector', 60))
+
+    def test_first_collection(self):
+        self.assertEqual(first_collection('CPUCollector', 60, 1000), 1000)
+        self.assertEqual(first_collection('CPUCollector', 60, 1000,
+                                          splay=True),
+                         1000 + splay_offset('CPUCollector', 60))
+
+    def test_first_collection_align(self):
+        self.assertEqual(first_collection('CPUCollector', 60, 1000,
+                                          align=True), 1020)
+
+        offset = splay_offset('CPUCollector', 60)
+        actual = first_collection('CPUCollector', 60, 1000, splay=True,
+                                  align=True)
+        self.assertTrue(1000 <= actual < 1060)
+        self.assertEqual((actual - offset) % 60, 0)
+
+
+class TestHandlerWorker(unittest.TestCase):
+
+    def get_handler(self, **config):
+        handler = Handler(config=config)
+        handler.process = Mock()
+        handler.flush = Mock()
+        return handler
+
+    def test_worker(self):
+        handler = self.get_handler()
+        worker = HandlerWorker(handler, Mock())
+        worker.start()
+        worker.submit([1, 2])
+        worker.submit([3])
+
+        for i in range(100):
+            if handler.flush.call_count == 2:
+                break
+            time.sleep(0.01)
+
+        self.assertEqual([c[0][0] for c in handler.process.call_args_list],
+                         [1, 2, 3])
+        self.assertEqual(handler.flush.call_count, 2)
+        self.assertEqual(worker.dropped, 0)
+
+    def test_worker_drop(self):
+        handler = self.get_handler(worker_queue_size=1)
+        worker = HandlerWorker(handler, Mock())
+        worker.submit([1, 2])
+        worker.submit([3, 4, 5])
+        self.assertEqual(worker.dropped, 3)
+        self.assertEqual(worker.queue.qsize(), 1)
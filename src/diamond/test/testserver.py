@@ -0,0 +1,53 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+from mock import Mock
+from mock import patch
+import configobj
+
+from diamond.server import Server
+
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(configfile=None)
+        self.server.config = configobj.ConfigObj()
+        self.server.config['server'] = {}
+
+    def test_get_pooled_collectors_process_model(self):
+        self.assertEqual(
+            self.server.get_pooled_collectors(set(['CPUCollector'])), set())
+
+    def test_get_pooled_collectors_pool_model(self):
+        self.server.config['server']['execution_model'] = 'pool'
+        running = set(['CPUCollector', 'CPUCollector second',
+                       'MySQLCollector'])
+
+        self.assertEqual(self.server.get_pooled_collectors(running),
+                         set(['CPUCollector', 'CPUCollector second']))
+
+        self.server.config['server']['pool_collectors'] = 'MySQLCollector'
+        self.assertEqual(self.server.get_pooled_collectors(running),
+                         set(['MySQLCollector']))
+
+    @patch('diamond.server.multiprocessing.Process')
+    def test_start_pool_worker(self, mock_process):
+        self.server.config['server']['pool_workers'] = 2
+        self.server.create_collector = Mock(
+            side_effect=lambda collectors, name: name)
+
+        self.server.start_pool({}, set(['A', 'B', 'C']), [])
+        self.assertEqual(self.server.pool_groups,
+                         {'Pool Worker 0': ['A', 'C'],
+                          'Pool Worker 1': ['B']})
+        self.assertEqual(mock_process.call_count, 2)
+
+        # Only the collectors of the worker being restarted are rebuilt
+        self.server.create_collector.reset_mock()
+        self.server.start_pool_worker({}, 'Pool Worker 1', ['B'])
+        self.assertEqual(self.server.create_collector.call_count, 1)
+        self.assertEqual(mock_process.call_args[1]['name'], 'Pool Worker 1')
+        self.assertEqual(mock_process.call_args[1]['args'][0], ['B'])
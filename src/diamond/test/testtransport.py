@@ -0,0 +1,119 @@
+#!/usr/bin/python
+# coding=utf-8
+################################################################################
+
+from test import unittest
+import multiprocessing
+import signal
+import time
+from Queue import Empty, Full
+
+from diamond.metric import Metric
+from diamond.metric import decode_metrics
+from diamond.metric import encode_metrics
+from diamond.utils.transport import RingBufferQueue
+
+
+def _producer(queue, count):
+    for i in range(count):
+        queue.put(encode_metrics(
+            [Metric('servers.host.cpu.total.idle', i, timestamp=i)]))
+
+
+def _slow_producer(queue, writing):
+    write = queue._write
+
+    def slow_write(offset, data):
+        writing.set()
+        time.sleep(0.5)
+        write(offset, data)
+
+    queue._write = slow_write
+    queue.put('a')
+
+
+class TestRingBufferQueue(unittest.TestCase):
+
+    def test_put_get(self):
+        queue = RingBufferQueue(1024)
+        queue.put('abc')
+        queue.put('d')
+        self.assertEqual(queue.get(), 'abc')
+        self.assertEqual(queue.get(), 'd')
+        self.assertTrue(queue.empty())
+
+    def test_wake_up_permits(self):
+        queue = RingBufferQueue(1024)
+        for i in range(3):
+            queue.put('a')
+        for i in range(3):
+            queue.get()
+        # No permit is left over once the buffer is empty again
+        self.assertFalse(queue._ready.acquire(False))
+
+        queue.put('b')
+        self.assertTrue(queue._ready.acquire(False))
+        self.assertFalse(queue._ready.acquire(False))
+
+    def test_counters_past_32_bits(self):
+        queue = RingBufferQueue(1024)
+        queue._state[0] = queue._state[1] = 2 ** 32 - 2
+        queue.put('abc')
+        self.assertEqual(queue.qsize(), 7)
+        self.assertEqual(queue.get(), 'abc')
+        self.assertTrue(queue.empty())
+
+    def test_get_empty(self):
+        queue = RingBufferQueue(1024)
+        self.assertRaises(Empty, queue.get, block=False)
+        self.assertRaises(Empty, queue.get, timeout=0.05)
+
+    def test_put_full(self):
+        queue = RingBufferQueue(128)
+        self.assertRaises(Full, queue.put, 'x' * 256, block=False)
+        queue.put('x' * 80, block=False)
+        self.assertRaises(Full, queue.put, 'x' * 80, block=False)
+
+    def test_wrap_around(self):
+        queue = RingBufferQueue(100)
+        for i in range(50):
+            item = str(i) * (i % 7)
+            queue.put(item, block=False)
+            self.assertEqual(queue.get(block=False), item)
+        self.assertTrue(queue.empty())
+
+    def test_terminate_during_put(self):
+        queue = RingBufferQueue(1024)
+        writing = multiprocessing.Event()
+        process = multiprocessing.Process(target=_slow_producer,
+                                          args=(queue, writing))
+        process.start()
+        self.assertTrue(writing.wait(5))
+        process.terminate()
+        process.join(5)
+        self.assertEqual(process.exitcode, -signal.SIGTERM)
+
+        # The lock was released before the producer exited
+        self.assertTrue(queue._lock.acquire(True, 5))
+        queue._lock.release()
+        self.assertEqual(queue.get(timeout=1), 'a')
+        queue.put('b')
+        self.assertEqual(queue.get(timeout=1), 'b')
+
+    def test_multiple_processes(self):
+        queue = RingBufferQueue(4096)
+        producers = [multiprocessing.Process(target=_producer,
+                                             args=(queue, 50))
+                     for i in range(3)]
+        for process in producers:
+            process.start()
+
+        values = []
+        for i in range(150):
+            metrics = list(decode_metrics(queue.get(timeout=10)))
+            values.append(metrics[0].value)
+
+        for process in producers:
+            process.join()
+
+        self.assertEqual(sorted(values), sorted(range(50) * 3))
@@ -1,13 +1,16 @@
 # coding=utf-8
 
+import ast
 import configobj
 import os
 import sys
+import json
 import logging
 import inspect
 import traceback
 
 from diamond.util import load_class_from_name
+from diamond.utils.config import read_config_file
 from diamond.collector import Collector
 from diamond.handler.Handler import Handler
 
@@ -81,7 +84,8 @@ def load_handlers(config, handler_names):
                     cls_name) + '.conf'
                 if os.path.exists(configfile):
                     # Merge Collector config file
-                    handler_config.merge(configobj.ConfigObj(configfile))
+                    handler_config.merge(
+                        read_config_file(configfile).dict())
 
             # Initialize Handler class
             h = cls(handler_config)
@@ -97,13 +101,75 @@ def load_handlers(config, handler_names):
     return handlers
 
 
+def is_collector_file(path, f):
+    """
+    Check if a file in a collectors path may hold collectors
+    """
+    return (os.path.isfile(os.path.join(path, f))
+            and len(f) > 3
+            and f[-3:] == '.py'
+            and f[0:4] != 'test'
+            and f[0] != '.')
+
+
+def import_collectors(modname):
+    """
+    Import a module and return the Collector classes defined in it
+    """
+    collectors = {}
+    log = logging.getLogger('diamond')
+
+    try:
+        # Import the module
+        mod = __import__(modname, globals(), locals(), ['*'])
+    except (KeyboardInterrupt, SystemExit), err:
+        log.error(
+            "System or keyboard interrupt "
+            "while loading module %s"
+            % modname)
+        if isinstance(err, SystemExit):
+            sys.exit(err.code)
+        raise KeyboardInterrupt
+    except:
+        # Log error
+        log.error("Failed to import module: %s. %s",
+                  modname,
+                  traceback.format_exc())
+        return collectors
+
+    # Find all classes defined in the module
+    for attrname in dir(mod):
+        attr = getattr(mod, attrname)
+        # Only attempt to load classes that are infact classes
+        # are Collectors but are not the base Collector class
+        if (inspect.isclass(attr)
+                and issubclass(attr, Collector)
+                and attr != Collector):
+            if attrname.startswith('parent_'):
+                continue
+            # Get class name
+            fqcn = '.'.join([modname, attrname])
+            try:
+                # Load Collector class
+                cls = load_dynamic_class(fqcn, Collector)
+                # Add Collector class
+                collectors[cls.__name__] = cls
+            except Exception:
+                # Log error
+                log.error(
+                    "Failed to load Collector: %s. %s",
+                    fqcn, traceback.format_exc())
+                continue
+
+    return collectors
+
+
 def load_collectors(paths=None, filter=None):
     """
     Scan for collectors to load from path
     """
     # Initialize return value
     collectors = {}
-    log = logging.getLogger('diamond')
 
     if paths is None:
         return
@@ -133,61 +199,116 @@ def load_collectors(paths=None, filter=None):
                     collectors[key] = subcollectors[key]
 
             # Ignore anything that isn't a .py file
-            elif (os.path.isfile(fpath)
-                  and len(f) > 3
-                  and f[-3:] == '.py'
-                  and f[0:4] != 'test'
-                  and f[0] != '.'):
+            elif is_collector_file(path, f):
 
                 # Check filter
                 if filter and os.path.join(path, f) != filter:
                     continue
 
-                modname = f[:-3]
-
-                try:
-                    # Import the module
-                    mod = __import__(modname, globals(), locals(), ['*'])
-                except (KeyboardInterrupt, SystemExit), err:
-                    log.error(
-                        "System or keyboard interrupt "
-                        "while loading module %s"
-                        % modname)
-                    if isinstance(err, SystemExit):
-                        sys.exit(err.code)
-                    raise KeyboardInterrupt
-                except:
-                    # Log error
-                    log.error("Failed to import module: %s. %s",
-                              modname,
-                              traceback.format_exc())
+                collectors.update(import_collectors(f[:-3]))
+
+    # Return Collector classes
+    return collectors
+
+
+# Classes defined by each collector file, keyed by path, as
+# {path: {'mtime': mtime, 'classes': [names]}}
+_collectors_index = {}
+
+
+def get_collectors_index(paths, index_file=None):
+    """
+    Map class names to the collector files defining them, without importing
+    any collector. Files are parsed once and only parsed again when their
+    mtime changes. The index is also persisted to index_file when given.
+    """
+    log = logging.getLogger('diamond')
+
+    if isinstance(paths, basestring):
+        paths = paths.split(',')
+        paths = map(str.strip, paths)
+
+    if index_file and not _collectors_index:
+        try:
+            with open(index_file) as f:
+                _collectors_index.update(json.load(f))
+        except (IOError, ValueError):
+            log.debug('Unable to read collectors index %s', index_file)
+
+    changed = False
+    index = {}
+
+    for path in paths:
+        if not os.path.exists(path):
+            raise OSError("Directory does not exist: %s" % path)
+
+        for root, dirnames, filenames in os.walk(path):
+            # Skip test and fixture directories
+            dirnames[:] = [d for d in dirnames
+                           if not d.endswith('tests')
+                           and not d.endswith('fixtures')]
+
+            for f in filenames:
+                if not is_collector_file(root, f):
                     continue
 
-                # Find all classes defined in the module
-                for attrname in dir(mod):
-                    attr = getattr(mod, attrname)
-                    # Only attempt to load classes that are infact classes
-                    # are Collectors but are not the base Collector class
-                    if (inspect.isclass(attr)
-                            and issubclass(attr, Collector)
-                            and attr != Collector):
-                        if attrname.startswith('parent_'):
-                            continue
-                        # Get class name
-                        fqcn = '.'.join([modname, attrname])
-                        try:
-                            # Load Collector class
-                            cls = load_dynamic_class(fqcn, Collector)
-                            # Add Collector class
-                            collectors[cls.__name__] = cls
-                        except Exception:
-                            # Log error
-                            log.error(
-                                "Failed to load Collector: %s. %s",
-                                fqcn, traceback.format_exc())
-                            continue
+                fpath = os.path.abspath(os.path.join(root, f))
+                mtime = os.path.getmtime(fpath)
+
+                entry = _collectors_index.get(fpath)
+                if entry is None or entry['mtime'] != mtime:
+                    classes = []
+                    try:
+                        with open(fpath) as source:
+                            tree = ast.parse(source.read(), fpath)
+                        classes = [node.name for node in tree.body
+                                   if isinstance(node, ast.ClassDef)]
+                    except (IOError, SyntaxError):
+                        log.error("Failed to parse collector file: %s. %s",
+                                  fpath, traceback.format_exc())
+                    entry = {'mtime': mtime, 'classes': classes}
+                    _collectors_index[fpath] = entry
+                    changed = True
+
+                for name in entry['classes']:
+                    index.setdefault(name, []).append(fpath)
+
+    if index_file and changed:
+        try:
+            with open(index_file, 'w') as f:
+                json.dump(_collectors_index, f)
+        except IOError:
+            log.warning('Unable to write collectors index %s', index_file)
+
+    return index
+
+
+def load_enabled_collectors(paths, names, index_file=None):
+    """
+    Load the named collectors, only importing the modules defining them
+    """
+    collectors = {}
+    log = logging.getLogger('diamond')
+
+    if isinstance(paths, basestring):
+        paths = paths.split(',')
+        paths = map(str.strip, paths)
+
+    load_include_path(paths)
+
+    index = get_collectors_index(paths, index_file)
+
+    modules = set()
+    for name in names:
+        if name not in index:
+            log.error('Can not find collector %s', name)
+            continue
+        for fpath in index[name]:
+            modules.add(str(os.path.basename(fpath)[:-3]))
+
+    for modname in sorted(modules):
+        collectors.update(import_collectors(modname))
 
-    # Return Collector classes
     return collectors
 
 
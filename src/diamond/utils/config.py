@@ -21,13 +21,76 @@ def str_to_bool(value):
     return value
 
 
-def load_config(configfile):
+# Parsed config files, as {path: (mtime, config)}
+_config_files = {}
+
+# Merged configs, as {path: (dependencies, config)} where dependencies is a
+# list of (path, mtime) of the files and directories the config was built from
+_merged_configs = {}
+
+
+def _get_mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def read_config_file(configfile):
     """
-    Load the full config / merge splitted configs if configured
+    Parse a config file, reusing the previous parse if the file did not
+    change since. The returned config is shared and must not be modified.
     """
+    mtime = _get_mtime(configfile)
+    cached = _config_files.get(configfile)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
-    configfile = os.path.abspath(configfile)
     config = configobj.ConfigObj(configfile)
+    _config_files[configfile] = (mtime, config)
+    return config
+
+
+def load_config(configfile, copy=True):
+    """
+    Load the full config / merge splitted configs if configured
+
+    The merged config is only built again when one of the files or
+    directories it was built from changed. Unless copy is set, the returned
+    config is shared and must not be modified.
+    """
+    configfile = os.path.abspath(configfile)
+
+    cached = _merged_configs.get(configfile)
+    if (cached is None
+            or any(_get_mtime(path) != mtime for path, mtime in cached[0])):
+        dependencies = []
+        cached = (dependencies, _build_config(configfile, dependencies))
+        _merged_configs[configfile] = cached
+
+    if not copy:
+        return cached[1]
+
+    config = configobj.ConfigObj(cached[1].dict())
+    config.filename = configfile
+    return config
+
+
+def _list_config_dir(path, dependencies):
+    dependencies.append((path, _get_mtime(path)))
+    return os.listdir(path)
+
+
+def _read_config_file(path, dependencies):
+    dependencies.append((path, _get_mtime(path)))
+    return read_config_file(path).dict()
+
+
+def _build_config(configfile, dependencies):
+    """
+    Build the merged config, recording the files and directories read
+    """
+    config = configobj.ConfigObj(_read_config_file(configfile, dependencies))
 
     config_extension = '.conf'
 
@@ -40,13 +103,14 @@ def load_config(configfile):
 
         # Load other configs
         if 'path' in config['configs']:
-            for cfgfile in os.listdir(config['configs']['path']):
+            for cfgfile in _list_config_dir(config['configs']['path'],
+                                            dependencies):
                 cfgfile = os.path.join(config['configs']['path'],
                                        cfgfile)
                 cfgfile = os.path.abspath(cfgfile)
                 if not cfgfile.endswith(config_extension):
                     continue
-                newconfig = configobj.ConfigObj(cfgfile)
+                newconfig = _read_config_file(cfgfile, dependencies)
                 config.merge(newconfig)
 
     #########################################################################
@@ -64,7 +128,8 @@ def load_config(configfile):
     if 'handlers_config_path' in config['server']:
         handlers_config_path = config['server']['handlers_config_path']
         if os.path.exists(handlers_config_path):
-            for cfgfile in os.listdir(handlers_config_path):
+            for cfgfile in _list_config_dir(handlers_config_path,
+                                            dependencies):
                 cfgfile = os.path.join(handlers_config_path, cfgfile)
                 cfgfile = os.path.abspath(cfgfile)
                 if not cfgfile.endswith(config_extension):
@@ -75,8 +140,10 @@ def load_config(configfile):
                 if handler not in config['handlers']:
                     config['handlers'][handler] = configobj.ConfigObj()
 
-                newconfig = configobj.ConfigObj(cfgfile)
+                newconfig = _read_config_file(cfgfile, dependencies)
                 config['handlers'][handler].merge(newconfig)
+        else:
+            dependencies.append((handlers_config_path, None))
 
     #########################################################################
     # Load up Collector specific configs
@@ -88,7 +155,8 @@ def load_config(configfile):
     if 'collectors_config_path' in config['server']:
         collectors_config_path = config['server']['collectors_config_path']
         if os.path.exists(collectors_config_path):
-            for cfgfile in os.listdir(collectors_config_path):
+            for cfgfile in _list_config_dir(collectors_config_path,
+                                            dependencies):
                 cfgfile = os.path.join(collectors_config_path, cfgfile)
                 cfgfile = os.path.abspath(cfgfile)
                 if not cfgfile.endswith(config_extension):
@@ -99,8 +167,10 @@ def load_config(configfile):
                 if collector not in config['collectors']:
                     config['collectors'][collector] = configobj.ConfigObj()
 
-                newconfig = configobj.ConfigObj(cfgfile)
+                newconfig = _read_config_file(cfgfile, dependencies)
                 config['collectors'][collector].merge(newconfig)
+        else:
+            dependencies.append((collectors_config_path, None))
 
     # Convert enabled to a bool
     for collector in config['collectors']:
@@ -0,0 +1,28 @@
+# coding=utf-8
+
+import os
+import threading
+
+
+class ProcessLocal(object):
+    """
+    Holds a value created once in each process. Threads do not survive a
+    fork, so whatever starts them, a worker pool or an event loop, has to be
+    created again in a forked child rather than inherited from the parent.
+    """
+
+    def __init__(self):
+        self.value = None
+        self.pid = None
+        self.lock = threading.Lock()
+
+    def get(self, factory):
+        """
+        Returns the value of the current process, calling factory to create
+        it on first use in each process
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                self.value = factory()
+                self.pid = os.getpid()
+            return self.value
@@ -1,23 +1,60 @@
 # coding=utf-8
 
+import hashlib
+import heapq
 import time
 import multiprocessing
 import os
+import Queue
 import sys
 import signal
+import threading
 
 try:
     from setproctitle import getproctitle, setproctitle
 except ImportError:
     setproctitle = None
 
+from diamond.metric import decode_metrics
+from diamond.utils.config import str_to_bool
 from diamond.utils.signals import signal_to_exception
 from diamond.utils.signals import SIGALRMException
 from diamond.utils.signals import SIGHUPException
 
 
-def collector_process(collector, metric_queue, log):
+def splay_offset(name, interval):
     """
+    Returns a deterministic offset in [0, interval) derived from the name, so
+    collectors are spread evenly across the interval
+    """
+    digest = int(hashlib.md5(name).hexdigest()[:8], 16)
+    return interval * digest / float(0x100000000)
+
+
+def first_collection(name, interval, now, splay=False, align=False):
+    """
+    Returns the time of the first collection of a collector. When align is
+    set collections happen on wall clock interval boundaries, plus the splay
+    offset when splay is set.
+    """
+    offset = 0
+    if splay:
+        offset = splay_offset(name, interval)
+
+    if not align:
+        return now + offset
+
+    next_collection = now - (now % interval) + offset
+    if next_collection < now:
+        next_collection += interval
+    return next_collection
+
+
+def collector_process(collector, metric_queue, log, splay=False, align=False):
+    """
+    Run a collector every interval. The first run is spread across the
+    interval when splay is set and aligned to the wall clock when align is
+    set.
     """
     proc = multiprocessing.current_process()
     if setproctitle:
@@ -39,7 +76,10 @@ def collector_process(collector, metric_queue, log):
         log.critical('interval of %s is not valid!', interval)
         sys.exit(1)
 
-    next_collection = time.time()
+    next_collection = first_collection(collector.name, interval, time.time(),
+                                       splay=splay, align=align)
+    log.debug('First collection in %0.3f seconds',
+              next_collection - time.time())
     reload_config = False
 
     # Setup stderr/stdout as /dev/null so random print statements in thrid
@@ -54,13 +94,22 @@ def collector_process(collector, metric_queue, log):
             if time_to_sleep > 0:
                 time.sleep(time_to_sleep)
 
+            schedule_lag = time.time() - next_collection
             next_collection += interval
 
+            # Skip the runs we are too late for rather than running them
+            # back to back
+            if schedule_lag > interval:
+                skipped = int(schedule_lag / interval)
+                log.warning('Behind schedule by %0.3f seconds, skipping %d '
+                            'collections', schedule_lag, skipped)
+                next_collection += skipped * interval
+
             # Ensure collector run times fit into the collection window
             signal.alarm(max_time)
 
             # Collect!
-            collector._run()
+            collector._run(schedule_lag=schedule_lag)
 
             # Success! Disable the alarm
             signal.alarm(0)
@@ -88,17 +137,177 @@ def collector_process(collector, metric_queue, log):
             break
 
 
-def handler_process(handlers, metric_queue, log):
+def collector_pool_process(collectors, metric_queue, log, splay=False,
+                           align=False):
+    """
+    Run several lightweight collectors in a single process. Collectors are
+    run one at a time in schedule order, each with its own collection time
+    limit.
+    """
+    proc = multiprocessing.current_process()
+    if setproctitle:
+        setproctitle('%s - %s' % (getproctitle(), proc.name))
+
+    signal.signal(signal.SIGALRM, signal_to_exception)
+    signal.signal(signal.SIGHUP, signal_to_exception)
+    signal.signal(signal.SIGUSR2, signal_to_exception)
+
+    log.debug('Starting with %d collectors', len(collectors))
+
+    now = time.time()
+    schedule = []
+    for collector in collectors:
+        interval = float(collector.config['interval'])
+
+        # Validate the interval
+        if interval <= 0:
+            log.critical('%s: interval of %s is not valid!', collector.name,
+                         interval)
+            continue
+
+        next_collection = first_collection(collector.name, interval, now,
+                                           splay=splay, align=align)
+        heapq.heappush(schedule, (next_collection, collector.name, collector))
+
+    reload_config = False
+
+    # Setup stderr/stdout as /dev/null so random print statements in thrid
+    # party libs do not fail and prevent collectors from running.
+    sys.stdout = open(os.devnull, 'w')
+    sys.stderr = open(os.devnull, 'w')
+
+    while schedule:
+        name = None
+        try:
+            # Reload the config if requested, between two collections
+            if reload_config:
+                log.debug('Reloading config')
+                for next_collection, name, collector in schedule:
+                    collector.load_config()
+                log.info('Config reloaded')
+                reload_config = False
+
+            next_collection, name, collector = schedule[0]
+
+            time_to_sleep = next_collection - time.time()
+            if time_to_sleep > 0:
+                time.sleep(time_to_sleep)
+
+            interval = float(collector.config['interval'])
+            schedule_lag = time.time() - next_collection
+            next_collection += interval
+
+            # Skip the runs we are too late for rather than running them
+            # back to back
+            if schedule_lag > interval:
+                skipped = int(schedule_lag / interval)
+                log.warning('%s: behind schedule by %0.3f seconds, skipping '
+                            '%d collections', name, schedule_lag, skipped)
+                next_collection += skipped * interval
+
+            heapq.heapreplace(schedule, (next_collection, name, collector))
+
+            # Ensure collector run times fit into the collection window
+            signal.alarm(int(interval * 0.9))
+
+            # Collect!
+            collector._run(schedule_lag=schedule_lag)
+
+            # Success! Disable the alarm
+            signal.alarm(0)
+
+        except SIGALRMException:
+            log.error('%s: took too long to run! Killed!', name)
+            continue
+
+        except SIGHUPException:
+            signal.alarm(0)
+            log.info('Scheduling config reload due to HUP')
+            reload_config = True
+
+        except Exception:
+            signal.alarm(0)
+            log.exception('%s: collector failed!', name)
+
+
+class HandlerWorker(threading.Thread):
+    """
+    Feeds a handler from a bounded queue in a dedicated thread, so a slow
+    handler does not hold up the others
+    """
+
+    def __init__(self, handler, log):
+        threading.Thread.__init__(self, name=handler.__class__.__name__)
+        self.daemon = True
+        self.handler = handler
+        self.log = log
+        self.queue = Queue.Queue(
+            maxsize=int(handler.config.get('worker_queue_size', 100)))
+        self.block = handler.config.get('worker_policy', 'drop') == 'block'
+        # Number of metrics dropped because the queue was full
+        self.dropped = 0
+        # Seconds the last batch waited in the queue
+        self.lag = 0.0
+
+    def submit(self, metrics):
+        """
+        Queue a batch of metrics, dropping it if the queue is full unless the
+        block policy is used
+        """
+        try:
+            self.queue.put((time.time(), metrics), block=self.block)
+        except Queue.Full:
+            self.dropped += len(metrics)
+            self.handler._throttle_error('%s: Queue full, dropping metrics',
+                                         self.name)
+
+    def run(self):
+        while True:
+            queued, metrics = self.queue.get()
+            self.lag = time.time() - queued
+            for metric in metrics:
+                self.handler._process(metric)
+            self.handler._flush()
+
+
+def handler_process(handlers, metric_queue, log, stats_interval=60):
     proc = multiprocessing.current_process()
     if setproctitle:
         setproctitle('%s - %s' % (getproctitle(), proc.name))
 
     log.debug('Starting process %s', proc.name)
 
+    # Handlers with a worker thread, the others are run inline
+    workers = []
+    inline_handlers = []
+    for handler in handlers:
+        if str_to_bool(handler.config.get('worker', False)):
+            worker = HandlerWorker(handler, log)
+            worker.start()
+            workers.append(worker)
+        else:
+            inline_handlers.append(handler)
+
+    next_stats = time.time() + stats_interval
+
     while(True):
-        metrics = metric_queue.get(block=True, timeout=None)
+        metrics = decode_metrics(metric_queue.get(block=True, timeout=None))
+
+        if workers:
+            # Decode once for all the workers
+            metrics = list(metrics)
+            for worker in workers:
+                worker.submit(metrics)
+
         for metric in metrics:
-            for handler in handlers:
+            for handler in inline_handlers:
                 handler._process(metric)
-        for handler in handlers:
+        for handler in inline_handlers:
             handler._flush()
+
+        if workers and time.time() >= next_stats:
+            next_stats = time.time() + stats_interval
+            for worker in workers:
+                log.info('%s: %d batches queued, lag %0.3f seconds, '
+                         '%d metrics dropped', worker.name,
+                         worker.queue.qsize(), worker.lag, worker.dropped)
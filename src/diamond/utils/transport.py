@@ -0,0 +1,214 @@
+# coding=utf-8
+
+"""
+Transports used to move batches of metrics from the collector processes to
+the handler process.
+
+The RingBufferQueue keeps the metrics in an anonymous shared memory segment
+that is inherited by every forked process, so collectors can hand metrics to
+the handler process without going through the multiprocessing SyncManager.
+
+A process terminated while holding the buffer lock would never release it and
+hang every other process, so SIGTERM is deferred until the lock is released.
+"""
+
+import contextlib
+import ctypes
+import multiprocessing
+import os
+import signal
+import struct
+import threading
+import time
+
+from Queue import Empty, Full
+
+# Default size of the shared memory segment (16 MB)
+DEFAULT_BUFFER_SIZE = 16 * 1024 * 1024
+
+# Every record in the buffer is prefixed with its length
+_HEADER = struct.Struct('!I')
+
+# Indexes into the shared state array
+_HEAD = 0
+_TAIL = 1
+
+
+class RingBufferQueue(object):
+    """
+    A multi producer, single consumer queue of byte strings backed by a
+    shared memory ring buffer. It implements the subset of the Queue interface
+    used by the QueueHandler and handler_process.
+
+    The head and tail are kept as ever increasing 64 bit byte counters, so a
+    single update commits a put or a get. A single lock serializes access to
+    the buffer and a semaphore is used to wake up the consumer. It holds at
+    most one permit, released when the buffer stops being empty and drained
+    when it empties again.
+    """
+
+    def __init__(self, size=DEFAULT_BUFFER_SIZE):
+        self.size = int(size)
+        if self.size <= _HEADER.size:
+            raise ValueError('Ring buffer size %d is too small' % self.size)
+
+        self._buffer = multiprocessing.RawArray(ctypes.c_char, self.size)
+        self._state = multiprocessing.RawArray(ctypes.c_ulonglong, 2)
+        self._lock = multiprocessing.Lock()
+        self._ready = multiprocessing.Semaphore(0)
+
+        # Threads of this process holding or waiting for the lock, and
+        # whether a SIGTERM arrived meanwhile
+        self._busy = set()
+        self._terminating = False
+        # Process the SIGTERM handler was installed in
+        self._sigterm_pid = None
+        self._previous_sigterm = None
+
+    def qsize(self):
+        """
+        Returns the number of bytes waiting in the buffer
+        """
+        return self._state[_HEAD] - self._state[_TAIL]
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def put(self, data, block=True, timeout=None):
+        """
+        Put a byte string into the buffer, waiting for space if block is set
+        """
+        record = _HEADER.pack(len(data)) + data
+
+        if len(record) > self.size:
+            raise Full('Item of %d bytes does not fit in the ring buffer'
+                       % len(record))
+
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            with self._locked():
+                head = self._state[_HEAD]
+                tail = self._state[_TAIL]
+                if self.size - (head - tail) >= len(record):
+                    self._write(head % self.size, record)
+                    self._state[_HEAD] = head + len(record)
+                    # Wake up the consumer when the buffer stops being empty
+                    if head == tail:
+                        self._ready.release()
+                    return
+
+            if not block or (deadline is not None and time.time() > deadline):
+                raise Full()
+            time.sleep(0.01)
+
+    def put_nowait(self, data):
+        return self.put(data, block=False)
+
+    def get(self, block=True, timeout=None):
+        """
+        Remove and return a byte string from the buffer
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        while True:
+            with self._locked():
+                tail = self._state[_TAIL]
+                if self._state[_HEAD] != tail:
+                    length = _HEADER.unpack(
+                        self._read(tail % self.size, _HEADER.size))[0]
+                    data = self._read((tail + _HEADER.size) % self.size,
+                                      length)
+                    tail += _HEADER.size + length
+                    self._state[_TAIL] = tail
+                    # Drop the wake up left by the puts the consumer did not
+                    # have to wait for
+                    if self._state[_HEAD] == tail:
+                        while self._ready.acquire(False):
+                            pass
+                    break
+
+            if not block:
+                raise Empty()
+
+            # The semaphore is only used as a wake up signal, the head and
+            # tail counters are the source of truth
+            if deadline is None:
+                self._ready.acquire(True, 1.0)
+            else:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Empty()
+                self._ready.acquire(True, min(remaining, 1.0))
+
+        return data
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Hold the buffer lock with SIGTERM deferred until it is released
+        """
+        self._defer_sigterm()
+        thread = threading.current_thread()
+        self._busy.add(thread)
+        try:
+            with self._lock:
+                yield
+        finally:
+            self._busy.discard(thread)
+            if self._terminating and not self._busy:
+                self._terminate()
+
+    def _defer_sigterm(self):
+        # Signal handlers can only be installed from the main thread, once
+        # in each process
+        if (self._sigterm_pid == os.getpid() or not isinstance(
+                threading.current_thread(), threading._MainThread)):
+            return
+
+        self._sigterm_pid = os.getpid()
+        self._busy = set()
+        self._terminating = False
+        self._previous_sigterm = signal.signal(signal.SIGTERM,
+                                               self._handle_sigterm)
+
+    def _handle_sigterm(self, signum, frame):
+        if self._busy:
+            self._terminating = True
+        else:
+            self._terminate()
+
+    def _terminate(self):
+        """
+        Deliver the deferred SIGTERM to the previous handler
+        """
+        self._terminating = False
+        previous = self._previous_sigterm
+        if previous is None:
+            previous = signal.SIG_DFL
+        signal.signal(signal.SIGTERM, previous)
+        self._sigterm_pid = None
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def _write(self, offset, data):
+        end = offset + len(data)
+        if end <= self.size:
+            self._buffer[offset:end] = data
+        else:
+            split = self.size - offset
+            self._buffer[offset:self.size] = data[:split]
+            self._buffer[0:end - self.size] = data[split:]
+
+    def _read(self, offset, length):
+        end = offset + length
+        if end <= self.size:
+            return self._buffer[offset:end]
+        return (self._buffer[offset:self.size] +
+                self._buffer[0:end - self.size])